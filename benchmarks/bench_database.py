@@ -0,0 +1,288 @@
+"""
+Database Benchmark
+Microbenchmarks of the DatabaseManager hot paths on temp-file databases
+of increasing size, with a regression check against a stored baseline.
+
+For every size the database is filled once with simulated readings (one
+per second, ending now) and each operation is timed call by call:
+single inserts, batch inserts, get_readings with and without a limit,
+get_readings_since, get_latest_reading and get_stats. Each operation is
+timed in several rounds; the best run's throughput (ops/s) and p50 latency
+and the median p99 latency are reported and written as JSON.
+
+Usage:
+    python benchmarks/bench_database.py [--sizes 10k,1m]
+        [--baseline benchmarks/results/database_baseline.json]
+        [--save-baseline] [--check] [--repeats 5] [--tolerance 0.5]
+        [--p99-tolerance 1.0]
+
+Exits with status 1 if an operation is slower than the baseline by more
+than the tolerance (lower ops/s or higher p50 latency) or its p99 latency
+is above the wider p99 band, or if --check is given and there is no
+baseline. The defaults leave room for run-to-run noise on a shared
+machine; tail latency of a single run is too noisy for a tight gate.
+
+The committed baseline covers the default 10k and 1m sizes (pass e.g.
+--sizes 10k,1m,10m for larger tables). Timings depend on the machine, so
+regenerate it on the machine that runs the check:
+    python benchmarks/bench_database.py --save-baseline
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from database import DatabaseManager, to_epoch_us
+from sensor_simulator import SensorSimulator
+
+DEVICE = 'bench'
+BATCH_ROWS = 1000
+POPULATE_CHUNK = 1_000_000
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000."""
+    text = text.strip().lower()
+    multiplier = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def populate(db, rows, seed):
+    """
+    Fill the database with `rows` readings one second apart, ending now.
+    
+    Returns:
+        int: Epoch microseconds of the next free timestamp
+    """
+    # Only generates blocks; its own database is never written to
+    simulator = SensorSimulator(random_seed=seed, db_path=':memory:')
+    start_us = to_epoch_us(datetime.now()) - rows * 1_000_000
+    try:
+        for offset in range(0, rows, POPULATE_CHUNK):
+            chunk = min(POPULATE_CHUNK, rows - offset)
+            db.bulk_insert(simulator.generate_block(
+                chunk,
+                device_ids=[DEVICE],
+                start=start_us + offset * 1_000_000,
+                as_frame=False
+            ))
+    finally:
+        simulator.db.close()
+    return start_us + rows * 1_000_000
+
+
+def time_calls(function, min_seconds, max_calls, min_calls=3):
+    """
+    Call function repeatedly, timing each call, after one warm-up call.
+    
+    Calls continue until min_seconds have passed (at least min_calls,
+    at most max_calls).
+    
+    Returns:
+        dict: calls, ops_per_second, p50_us, p99_us
+    """
+    function()
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_calls and (len(latencies) < min_calls or time.perf_counter() - started < min_seconds):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    micros = np.asarray(latencies) * 1e6
+    return {
+        'calls': len(latencies),
+        'ops_per_second': len(latencies) / (micros.sum() / 1e6),
+        'p50_us': float(np.percentile(micros, 50)),
+        'p99_us': float(np.percentile(micros, 99)),
+    }
+
+
+def summarize_runs(runs):
+    """
+    Combine the time_calls results of repeated runs of one operation.
+    
+    Like timeit, throughput and p50 come from the best run: interference
+    from other processes only ever slows a run down. p99 is the median
+    across runs.
+    
+    Returns:
+        dict: calls (total over all runs), ops_per_second, p50_us, p99_us
+    """
+    return {
+        'calls': sum(run['calls'] for run in runs),
+        'ops_per_second': max(run['ops_per_second'] for run in runs),
+        'p50_us': min(run['p50_us'] for run in runs),
+        'p99_us': float(np.median([run['p99_us'] for run in runs])),
+    }
+
+
+def bench_size(rows, seed, min_seconds, max_calls, repeats):
+    """Time every operation on a fresh database holding `rows` readings."""
+    directory = tempfile.mkdtemp(prefix='bench-db-')
+    try:
+        db = DatabaseManager(db_path=str(Path(directory) / 'bench.db'))
+        started = time.perf_counter()
+        next_us = populate(db, rows, seed)
+        print(f"   populated {rows:,} rows in {time.perf_counter() - started:.1f} s")
+        
+        rng = np.random.default_rng(seed)
+        clock = {'next_us': next_us}
+        
+        def insert_single():
+            db.save_reading(20.0, 50.0, 1013.0, timestamp=clock['next_us'], device_id=DEVICE)
+            clock['next_us'] += 1
+        
+        def insert_batch():
+            ts = clock['next_us'] + np.arange(BATCH_ROWS, dtype=np.int64)
+            clock['next_us'] += BATCH_ROWS
+            db.bulk_insert({
+                'timestamp': ts,
+                'device_id': np.full(BATCH_ROWS, DEVICE, dtype=object),
+                'temperature': rng.normal(20, 1, BATCH_ROWS),
+                'humidity': rng.normal(50, 5, BATCH_ROWS),
+                'pressure': rng.normal(1013, 1, BATCH_ROWS),
+            })
+        
+        # Full scans are slow on large tables: fewer calls suffice
+        full_scan_calls = max(3, min(max_calls, 10_000_000 // max(rows, 1)))
+        operations = {
+            'get_readings_limit_100': (lambda: db.get_readings(limit=100), max_calls),
+            'get_readings_all': (lambda: db.get_readings(), full_scan_calls),
+            'get_readings_since_1h': (lambda: db.get_readings_since(hours=1), max_calls),
+            'get_latest_reading': (lambda: db.get_latest_reading(), max_calls),
+            'get_stats': (lambda: db.get_stats(), full_scan_calls),
+            'insert_single': (insert_single, max_calls),
+            f'insert_batch_{BATCH_ROWS}': (insert_batch, max_calls),
+        }
+        
+        # Rounds over all operations rather than back-to-back repeats, so a
+        # burst of load on the machine spoils one run of many operations
+        # instead of every run of one. Reads go first, before the inserts
+        # grow the table.
+        runs = {name: [] for name in operations}
+        for group in ([name for name in operations if not name.startswith('insert')],
+                      [name for name in operations if name.startswith('insert')]):
+            for _ in range(repeats):
+                for name in group:
+                    function, calls = operations[name]
+                    runs[name].append(time_calls(function, min_seconds, calls))
+        
+        results = {}
+        for name in operations:
+            results[name] = r = summarize_runs(runs[name])
+            print(f"   {name:<26}{r['ops_per_second']:>12.1f} ops/s"
+                  f"{r['p50_us']:>12.1f} µs p50{r['p99_us']:>12.1f} µs p99")
+        db.close()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance, p99_tolerance):
+    """
+    Regressions of results against a baseline.
+    
+    Throughput and p50 latency must stay within tolerance of the baseline,
+    p99 latency within the wider p99_tolerance.
+    
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    regressions = []
+    for size, operations in results.items():
+        for name, current in operations.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            if current['ops_per_second'] < reference['ops_per_second'] * (1 - tolerance):
+                regressions.append(
+                    f"{size} {name}: {current['ops_per_second']:.1f} ops/s "
+                    f"(baseline {reference['ops_per_second']:.1f})"
+                )
+            if current['p50_us'] > reference['p50_us'] * (1 + tolerance):
+                regressions.append(
+                    f"{size} {name}: p50 {current['p50_us']:.1f} µs "
+                    f"(baseline {reference['p50_us']:.1f})"
+                )
+            if current['p99_us'] > reference['p99_us'] * (1 + p99_tolerance):
+                regressions.append(
+                    f"{size} {name}: p99 {current['p99_us']:.1f} µs "
+                    f"(baseline {reference['p99_us']:.1f})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager hot paths")
+    parser.add_argument('--sizes', default='10k,1m', help="Comma-separated table sizes (k/m suffixes)")
+    parser.add_argument('--min-seconds', type=float, default=1.0, help="Minimum timing per operation")
+    parser.add_argument('--max-calls', type=int, default=1000, help="Maximum timed calls per operation")
+    parser.add_argument('--seed', type=int, default=42, help="Simulator seed")
+    parser.add_argument('--output', default='benchmarks/results/database.json', help="JSON results file")
+    parser.add_argument('--baseline', default='benchmarks/results/database_baseline.json', help="Baseline JSON")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--check', action='store_true', help="Fail if there is no baseline to compare against")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed runs per operation (the best is kept)")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed ops/s and p50 slowdown before failing (0.5 = 50%%)")
+    parser.add_argument('--p99-tolerance', type=float, default=1.0,
+                        help="Allowed p99 latency increase before failing (1.0 = 2x)")
+    args = parser.parse_args()
+    
+    results = {}
+    for size in args.sizes.split(','):
+        rows = parse_size(size)
+        print(f"{rows:,} rows:")
+        results[size.strip().lower()] = bench_size(rows, args.seed, args.min_seconds, args.max_calls, args.repeats)
+    
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    print(f"\n✓ Results written to {output}")
+    
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+        print(f"✓ Baseline saved to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        if args.check:
+            sys.exit(1)
+        return
+    
+    regressions = compare(
+        results, json.loads(baseline_path.read_text())['results'], args.tolerance, args.p99_tolerance
+    )
+    if regressions:
+        print(f"\n✗ Slower than baseline by more than {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        sys.exit(1)
+    print(f"✓ Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
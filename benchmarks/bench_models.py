@@ -0,0 +1,255 @@
+"""
+Model Benchmark
+Measures every anomaly detector and forecaster backend on labelled
+simulator data: accuracy next to throughput, per-reading latency and
+peak memory.
+
+Detectors are scored against the simulator's ground-truth anomaly labels
+(precision, recall, F1). Forecasters are evaluated from rolling origins
+over the test split (mean absolute error per metric). Results are written
+as JSON with sorted keys, so runs can be diffed across versions.
+
+Usage:
+    python benchmarks/bench_models.py [--readings 20000] [--train 2000]
+        [--anomaly-probability 0.02] [--output benchmarks/results/models.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from ml_model import METRICS, TENSORFLOW_AVAILABLE, MonitoringAIModel
+from sensor_simulator import SensorSimulator
+
+DETECTORS = {
+    'isolation_forest': dict(anomaly_mode='batch'),
+    'streaming_ewma': dict(anomaly_mode='streaming'),
+}
+
+FORECASTERS = {
+    'linear_closed_form': (dict(trend_backend='closed_form'), 'linear'),
+    'linear_sklearn': (dict(trend_backend='sklearn'), 'linear'),
+    'lstm': (dict(use_lstm=True), 'lstm'),
+}
+
+
+def make_dataset(n_train, n_test, anomaly_probability, seed):
+    """
+    Labelled readings from the vectorized simulator.
+    
+    Returns:
+        tuple: (train DataFrame, test DataFrame), both with anomaly_label
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        simulator = SensorSimulator(random_seed=seed, db_path=str(Path(scratch) / 'bench.db'))
+        try:
+            data = simulator.generate_block(
+                n_train + n_test,
+                anomaly_probability=anomaly_probability,
+                start='2024-01-01T00:00:00'
+            )
+        finally:
+            simulator.db.close()
+    return data.iloc[:n_train].reset_index(drop=True), data.iloc[n_train:].reset_index(drop=True)
+
+
+def quiet(function, *args, **kwargs):
+    """Call function with its console output (training messages) suppressed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def peak_memory_mb(function):
+    """Peak Python heap allocation while running function, in MiB."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def latency_summary(seconds):
+    """Percentiles of per-call latencies, in microseconds."""
+    micros = np.asarray(seconds) * 1e6
+    return {
+        'p50_us': float(np.percentile(micros, 50)),
+        'p95_us': float(np.percentile(micros, 95)),
+        'p99_us': float(np.percentile(micros, 99)),
+    }
+
+
+def classification_metrics(predicted, actual):
+    """Precision, recall and F1 of boolean predictions."""
+    predicted = np.asarray(predicted, dtype=bool)
+    actual = np.asarray(actual, dtype=bool)
+    true_positives = int((predicted & actual).sum())
+    precision = true_positives / max(int(predicted.sum()), 1)
+    recall = true_positives / max(int(actual.sum()), 1)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'flagged': int(predicted.sum()),
+        'labelled': int(actual.sum()),
+    }
+
+
+def bench_detector(config, train, test, contamination, latency_sample):
+    """
+    Accuracy, throughput, latency and memory of one detector.
+    
+    Throughput is measured on ingest() over the whole test split (score
+    each reading, then learn from it); latency on single-reading score()
+    plus update() calls.
+    """
+    def trained():
+        model = MonitoringAIModel(contamination=contamination, **config)
+        quiet(model.train, train)
+        return model
+    
+    model = trained()
+    start = time.perf_counter()
+    scores = model.ingest(test)
+    elapsed = time.perf_counter() - start
+    
+    model = trained()
+    latencies = []
+    for reading in test.head(latency_sample).to_dict('records'):
+        start = time.perf_counter()
+        model.score(reading)
+        model.update(reading)
+        latencies.append(time.perf_counter() - start)
+    
+    memory_model = trained()
+    return {
+        **classification_metrics(scores['is_anomaly'], test['anomaly_label']),
+        'readings_per_second': len(test) / elapsed,
+        'latency': latency_summary(latencies),
+        'peak_memory_mb': peak_memory_mb(lambda: memory_model.ingest(test)),
+    }
+
+
+def bench_forecaster(config, method, train, test, steps_ahead, origins):
+    """
+    Rolling-origin accuracy, throughput, latency and memory of one forecaster.
+    
+    Before each origin the model is updated with the test readings since
+    the previous one, then forecasts steps_ahead readings past it.
+    """
+    data = pd.concat([train, test], ignore_index=True)
+    actual = data[list(METRICS)].to_numpy(dtype=float)
+    
+    def run(model):
+        errors, latencies = [], []
+        previous = len(train)
+        for origin in origins:
+            model.partial_fit(data.iloc[previous:origin])
+            previous = origin
+            start = time.perf_counter()
+            forecast = model.predict_array(data.iloc[:origin], steps_ahead, method)
+            latencies.append(time.perf_counter() - start)
+            errors.append(np.abs(forecast.T - actual[origin:origin + steps_ahead]))
+        return np.concatenate(errors), latencies
+    
+    def trained():
+        model = MonitoringAIModel(**config)
+        quiet(model.train, train)
+        return model
+    
+    start = time.perf_counter()
+    errors, latencies = run(trained())
+    elapsed = time.perf_counter() - start
+    
+    memory_model = trained()
+    return {
+        'mae': dict(zip(METRICS, errors.mean(axis=0).tolist())),
+        'forecasts_per_second': len(origins) / elapsed,
+        'latency': latency_summary(latencies),
+        'peak_memory_mb': peak_memory_mb(lambda: run(memory_model)),
+    }
+
+
+def rounded(value, digits=4):
+    """Round floats recursively so result files diff cleanly."""
+    if isinstance(value, dict):
+        return {key: rounded(item, digits) for key, item in value.items()}
+    if isinstance(value, float):
+        return round(value, digits)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark anomaly detectors and forecasters")
+    parser.add_argument('--readings', type=int, default=20000, help="Test readings")
+    parser.add_argument('--train', type=int, default=2000, help="Training readings")
+    parser.add_argument('--anomaly-probability', type=float, default=0.02, help="Injected anomaly rate")
+    parser.add_argument('--steps-ahead', type=int, default=5, help="Forecast horizon")
+    parser.add_argument('--origins', type=int, default=500, help="Forecast origins in the test split")
+    parser.add_argument('--latency-sample', type=int, default=2000, help="Readings timed one by one")
+    parser.add_argument('--seed', type=int, default=42, help="Simulator seed")
+    parser.add_argument('--output', default='benchmarks/results/models.json', help="JSON results file")
+    args = parser.parse_args()
+    
+    train, test = make_dataset(args.train, args.readings, args.anomaly_probability, args.seed)
+    last_origin = len(train) + len(test) - args.steps_ahead
+    origins = np.linspace(len(train) + 1, last_origin, min(args.origins, last_origin - len(train))).astype(int)
+    
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        },
+        'detectors': {},
+        'forecasters': {},
+    }
+    
+    for name, config in DETECTORS.items():
+        print(f"Detector {name}...")
+        results['detectors'][name] = bench_detector(
+            config, train, test, args.anomaly_probability, args.latency_sample
+        )
+    
+    for name, (config, method) in FORECASTERS.items():
+        if config.get('use_lstm') and not TENSORFLOW_AVAILABLE:
+            print(f"Forecaster {name}: skipped (TensorFlow not installed)")
+            continue
+        print(f"Forecaster {name}...")
+        results['forecasters'][name] = bench_forecaster(
+            config, method, train, test, args.steps_ahead, origins
+        )
+    
+    results = rounded(results)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    
+    print(f"\n{'detector':<20}{'precision':>10}{'recall':>8}{'f1':>8}{'readings/s':>12}{'p99 µs':>10}{'peak MiB':>10}")
+    for name, r in results['detectors'].items():
+        print(f"{name:<20}{r['precision']:>10.3f}{r['recall']:>8.3f}{r['f1']:>8.3f}"
+              f"{r['readings_per_second']:>12.0f}{r['latency']['p99_us']:>10.1f}{r['peak_memory_mb']:>10.2f}")
+    print(f"\n{'forecaster':<20}{'MAE temp':>10}{'forecasts/s':>12}{'p99 µs':>10}{'peak MiB':>10}")
+    for name, r in results['forecasters'].items():
+        print(f"{name:<20}{r['mae']['temperature']:>10.3f}{r['forecasts_per_second']:>12.0f}"
+              f"{r['latency']['p99_us']:>10.1f}{r['peak_memory_mb']:>10.2f}")
+    print(f"\n✓ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Import-time Budget Check
+Guards startup cost: imports each module in a fresh interpreter under
+``python -X importtime`` and fails if it is over budget or pulls in a
+heavy backend that should only load on first use.
+
+Usage:
+    python benchmarks/import_budget.py [--budget-ms 1000] [--top 10]
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+# Modules whose cold import time is checked
+MODULES = ('ml_model', 'sensor_simulator', 'database')
+
+# Backends that must not be imported just by importing the modules above
+FORBIDDEN = ('tensorflow', 'keras', 'sklearn.ensemble', 'sklearn.linear_model', 'sklearn.preprocessing')
+
+
+def measure(module):
+    """
+    Import a module in a fresh interpreter.
+    
+    Args:
+        module (str): Module name, importable from src/
+    
+    Returns:
+        tuple: (total cumulative microseconds, {module: cumulative microseconds})
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indent><module>"
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative.get(module, 0), cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold import time of the src modules")
+    parser.add_argument('--budget-ms', type=float, default=1000, help="Budget per module (ms)")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+    
+    failures = []
+    for module in MODULES:
+        total_us, cumulative = measure(module)
+        print(f"{module}: {total_us / 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+        for name, us in slowest[1:args.top + 1]:
+            print(f"   {us / 1000:8.1f} ms  {name}")
+        
+        if total_us / 1000 > args.budget_ms:
+            failures.append(f"{module} took {total_us / 1000:.0f} ms")
+        for name in FORBIDDEN:
+            if name in cumulative:
+                failures.append(f"{module} eagerly imports {name}")
+    
+    if failures:
+        print("\n✗ Import budget exceeded:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("\n✓ All imports within budget")
+
+
+if __name__ == "__main__":
+    main()
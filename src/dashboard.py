@@ -9,16 +9,23 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
-import plotly.express as px
 from pathlib import Path
+import os
 import sys
+import threading
+import warnings
 
 # Add src directory to path
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from sensor_simulator import SensorSimulator
-from ml_model import MonitoringAIModel
-from database import DatabaseManager
+from ml_model import MonitoringAIModel, score_key
+from model_registry import ModelRegistry
+from database import DatabaseManager, DEFAULT_DEVICE, to_epoch_us
+from ring_buffer import RingBuffer
+from downsample import MAX_POINTS, downsample, downsample_frame, histogram, load_history
+from live_feed import LiveProducer
+from metrics import REGISTRY, start_http_server, timed, timer
 
 try:
     from weather_api import WeatherAPIProvider, WeatherConfig
@@ -60,15 +67,621 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Initialize session state
-if 'simulator' not in st.session_state:
-    st.session_state.simulator = SensorSimulator(random_seed=42)
-    st.session_state.db = DatabaseManager()
-    st.session_state.data = st.session_state.db.get_readings(limit=100)
-    st.session_state.model = MonitoringAIModel()
+# Process-wide caches shared by every browser session: one database handle,
+# and per device one simulator, one recent-data window and one model, so
+# memory and training cost don't grow with the number of viewers
+CACHE_TTL_SECONDS = 3600
+RECENT_READINGS = 200
 
-if 'num_readings' not in st.session_state:
-    st.session_state.num_readings = len(st.session_state.data)
+
+@st.cache_resource
+def get_database():
+    """Database manager (thread-local connection pool) shared by all sessions."""
+    return DatabaseManager()
+
+
+@st.cache_resource(max_entries=32)
+def get_simulator(device_id):
+    """Simulator feeding one device, shared by all sessions."""
+    return SensorSimulator(random_seed=42, durability='buffered', device_id=device_id)
+
+
+@st.cache_resource
+def get_weather_providers():
+    """Weather providers by device id, registered on initialization and shared by all sessions."""
+    return {}
+
+
+def get_source(device_id):
+    """
+    Object producing a device's new readings.
+    
+    Weather devices are only ever fed by their provider, so simulated
+    readings never mix into real weather history.
+    """
+    return get_weather_providers().get(device_id) or get_simulator(device_id)
+
+
+def reading_kwargs(source, anomaly_probability):
+    """get_next_reading arguments for a source (weather readings take no anomaly injection)."""
+    return {} if source in get_weather_providers().values() else {'anomaly_probability': anomaly_probability}
+
+
+@st.cache_resource(max_entries=32)
+def _live_producer(device_id, source_kind):
+    """Producer for a device; source_kind only keys the cache, see get_live_producer."""
+    return LiveProducer(get_source(device_id), interval=1.0, idle_timeout=60.0)
+
+
+def get_live_producer(device_id):
+    """
+    Background producer feeding one device's source, shared by all sessions.
+    
+    It stops on its own once no live view has polled it for a minute.
+    """
+    source_kind = 'weather' if device_id in get_weather_providers() else 'simulated'
+    return _live_producer(device_id, source_kind)
+
+
+@st.cache_resource
+def get_metrics_server():
+    """
+    Prometheus /metrics endpoint, started once per process when the
+    MONITORING_METRICS_PORT environment variable is set.
+    
+    Returns:
+        ThreadingHTTPServer: The running server, or None if not configured
+    """
+    port = os.environ.get('MONITORING_METRICS_PORT')
+    if not port:
+        return None
+    try:
+        return start_http_server(int(port))
+    except (OSError, ValueError) as e:
+        st.warning(f"Could not start the metrics endpoint on port {port}: {e}")
+        return None
+
+
+class RecentWindow:
+    """
+    A device's latest readings in a fixed-capacity ring buffer.
+    
+    Only readings inserted since the last refresh are fetched (by row id,
+    so late readings with an earlier timestamp are not missed) and
+    appended, instead of re-reading or concatenating the whole window.
+    The DataFrame built from it is shared, read-only, by every session
+    until the data changes.
+    """
+    
+    def __init__(self, device_id, capacity):
+        self.device_id = device_id
+        self.buffer = RingBuffer(capacity)
+        self.data_version = None
+        self.last_id = 0
+        self.frame = None
+        self.lock = threading.Lock()
+    
+    def _reload(self, db, data_version):
+        self.buffer.clear()
+        self.buffer.extend(db.get_readings(limit=self.buffer.capacity, device_id=self.device_id))
+        self.last_id = data_version
+    
+    def refresh(self, db, data_version):
+        """Append new readings if the data changed; returns the current frame."""
+        with self.lock:
+            if data_version != self.data_version:
+                latest = self.buffer.latest()
+                if latest is None:
+                    self._reload(db, data_version)
+                else:
+                    new_rows = db.get_inserted_after(self.last_id, device_id=self.device_id)
+                    if len(new_rows) > 0:
+                        if new_rows['timestamp'].min() <= latest['timestamp']:
+                            # A late reading belongs inside the window: rebuild it in time order
+                            self._reload(db, max(data_version, int(new_rows['id'].iloc[-1])))
+                        else:
+                            self.buffer.extend(new_rows.sort_values('timestamp'))
+                            self.last_id = int(new_rows['id'].iloc[-1])
+                self.frame = self.buffer.to_frame(device_id=self.device_id)
+                self.data_version = data_version
+            return self.frame
+
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=64)
+def get_recent_window(device_id):
+    """Recent-readings window of one device, shared by all sessions."""
+    return RecentWindow(device_id, RECENT_READINGS)
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=64, show_spinner=False)
+def load_scores(device_id, start, data_version, model):
+    """Stored anomaly scores of a device and model from start onwards, keyed like load_summary."""
+    return get_database().get_scores(start=start, device_id=device_id, model=model)
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=64, show_spinner=False)
+def load_summary(device_id, data_version):
+    """
+    All-history statistics of a device.
+    
+    data_version only keys the cache: it changes when a reading is
+    inserted, so the first rerun afterwards reloads and every other
+    session reuses that result.
+    """
+    return get_database().get_summary(device_id=device_id)
+
+
+class SharedModel:
+    """
+    A model shared by all sessions, caught up with new readings under a lock.
+    
+    New readings are fetched by row id, so a reading inserted late with an
+    earlier timestamp is still scored and folded in.
+    """
+    
+    def __init__(self, model, last_id, trained, db, key):
+        self.model = model
+        self.last_id = last_id
+        # Readings inserted while the training data was read are in both;
+        # the first sync skips them
+        self.trained = trained
+        self.db = db
+        self.key = key
+        self.lock = threading.Lock()
+    
+    def sync(self):
+        """
+        Score the readings inserted since the last sync, store their
+        scores, then fold them into the model.
+        """
+        with self.lock:
+            new_rows = self.db.get_inserted_after(self.last_id, device_id=self.model.device_id)
+            if len(new_rows) == 0:
+                return
+            self.last_id = int(new_rows['id'].iloc[-1])
+            if self.trained:
+                seen = new_rows['timestamp'].map(to_epoch_us).isin(self.trained)
+                new_rows = new_rows[~seen]
+                self.trained = set()
+            if len(new_rows) > 0:
+                self.db.save_scores(self.model.ingest(new_rows), device_id=self.model.device_id, model=self.key)
+
+
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=16, show_spinner="Loading model...")
+def get_shared_model(device_id, contamination, anomaly_mode, use_lstm):
+    """
+    Model for a device and configuration, shared by all sessions.
+    
+    Starts from a saved model when one exists instead of retraining;
+    otherwise trains on the device's recent readings and saves the result.
+    """
+    db = get_database()
+    # Taken first: sync() picks up everything inserted from here on
+    last_id = db.data_version()
+    data = db.get_readings(limit=RECENT_READINGS, device_id=device_id)
+    model_config = dict(
+        contamination=contamination,
+        use_lstm=use_lstm,
+        device_id=device_id,
+        anomaly_mode=anomaly_mode
+    )
+    registry = ModelRegistry()
+    model, loaded = registry.load_or_train(data, train=False, **model_config)
+    if not loaded:
+        model = MonitoringAIModel(**model_config)
+        # The LSTM trains in the background; linear predictions
+        # are served until it is ready
+        future = model.train_async(data, epochs=5, verbose=0)
+        version_path = registry.save(model, data)
+        if future is not None:
+            # Sessions fold newer readings into the model meanwhile; only the
+            # LSTM weights are added, so the saved range stays accurate
+            future.add_done_callback(
+                lambda f: f.exception() is None and registry.save_lstm(model, version_path)
+            )
+    # Score readings that arrived before this model existed; scores already
+    # stored at ingest time are kept
+    key = score_key(contamination, anomaly_mode)
+    db.save_scores(model.score_frame(data), device_id=device_id, overwrite=False, model=key)
+    trained = set(data['timestamp'].map(to_epoch_us))
+    return SharedModel(model, last_id, trained, db, key)
+
+
+# Per-session state is limited to small UI choices
+if 'device_id' not in st.session_state:
+    st.session_state.device_id = DEFAULT_DEVICE
+    st.session_state.model_config = dict(contamination=0.1, anomaly_mode='batch', use_lstm=False)
+    st.session_state.live = False
+
+
+
+@timed('dashboard_render_seconds', 'Dashboard render time by phase', phase='load')
+def current_view(device_id):
+    """
+    Latest readings of a device, with the shared model caught up to them.
+    
+    Cheap enough for every live refresh: the window and the model only
+    process readings newer than the ones they already hold.
+    
+    Args:
+        device_id (str): Device to show
+    
+    Returns:
+        tuple: (data version, readings DataFrame, SharedModel or None
+            while there are fewer than two readings)
+    """
+    db = get_database()
+    get_live_producer(device_id).touch()
+    data_version = db.data_version()
+    data = get_recent_window(device_id).refresh(db, data_version)
+    if len(data) < 2:
+        return data_version, data, None
+    shared = get_shared_model(device_id, **st.session_state.model_config)
+    shared.sync()
+    return data_version, data, shared
+
+
+# The panels below run as fragments: in live mode each one reruns on its
+# own timer and redraws only itself, leaving the sidebar, the other panels
+# and the long-range analysis untouched
+
+@timed('dashboard_render_seconds', 'Dashboard render time by phase', phase='status')
+def render_status(device_id):
+    """Reading count, status and time of the last reading."""
+    data_version, data, shared = current_view(device_id)
+    if shared is None:
+        return
+    summary = load_summary(device_id, data_version)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(
+            "Total Readings",
+            int(summary.loc['count', 'temperature']),
+            delta=None
+        )
+    with col2:
+        st.metric(
+            "System Status",
+            "🟢 Live" if get_live_producer(device_id).running else "🟢 Active"
+        )
+    with col3:
+        st.metric(
+            "Last Update",
+            data['timestamp'].iloc[-1].strftime("%H:%M:%S")
+        )
+
+
+@timed('dashboard_render_seconds', 'Dashboard render time by phase', phase='live_data')
+def render_live_data(device_id):
+    """Current readings and the recent time series."""
+    data_version, data, shared = current_view(device_id)
+    if shared is None:
+        return
+    
+    st.subheader("Current Sensor Readings")
+    
+    # Current metrics
+    current = data.iloc[-1]
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>🌡️ Temperature</h3>
+            <h2>{current['temperature']}°C</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>💧 Humidity</h3>
+            <h2>{current['humidity']}%</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>🔘 Pressure</h3>
+            <h2>{current['pressure']} hPa</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Time series plot, downsampled to at most MAX_POINTS per trace
+    st.subheader("Time Series Data")
+    
+    traces = downsample_frame(data, n_out=MAX_POINTS)
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=traces['temperature'][0],
+        y=traces['temperature'][1],
+        mode='lines+markers',
+        name='Temperature (°C)',
+        line=dict(color='red', width=2),
+        marker=dict(size=4)
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=traces['humidity'][0],
+        y=traces['humidity'][1],
+        mode='lines+markers',
+        name='Humidity (%)',
+        line=dict(color='blue', width=2),
+        marker=dict(size=4),
+        yaxis='y2'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=traces['pressure'][0],
+        y=traces['pressure'][1],
+        mode='lines+markers',
+        name='Pressure (hPa)',
+        line=dict(color='green', width=2),
+        marker=dict(size=4),
+        yaxis='y3'
+    ))
+    
+    fig.update_layout(
+        title="Sensor Data Over Time",
+        xaxis_title="Time",
+        yaxis_title="Temperature (°C)",
+        yaxis2=dict(title="Humidity (%)", overlaying="y", side="right"),
+        yaxis3=dict(title="Pressure (hPa)", overlaying="y", side="right", anchor="free", x=1.15),
+        height=500,
+        hovermode='x unified',
+        legend=dict(x=0, y=1),
+        # Keep zoom and pan while live refreshes replace the data
+        uirevision=device_id
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@timed('dashboard_render_seconds', 'Dashboard render time by phase', phase='predictions')
+def render_predictions(device_id, prediction_steps):
+    """Forecasts of the shared model for the next prediction_steps readings."""
+    data_version, data, shared = current_view(device_id)
+    if shared is None:
+        return
+    model = shared.model
+    prediction_method = st.session_state.get('prediction_model_type', 'linear')
+    with shared.lock:
+        predictions = model.predict_next(
+            data,
+            steps_ahead=prediction_steps,
+            method=prediction_method
+        )
+    
+    st.subheader("🤖 AI-Powered Predictions")
+    
+    if prediction_method == 'lstm':
+        if model.lstm_training:
+            st.info("🧠 LSTM is training in the background — showing linear predictions for now.")
+        elif not model.lstm_ready:
+            st.warning("🧠 LSTM unavailable (TensorFlow missing or too little data) — showing linear predictions.")
+    
+    if predictions:
+        # Create prediction visualization
+        future_times = [
+            data['timestamp'].iloc[-1] + timedelta(hours=i)
+            for i in range(1, prediction_steps + 1)
+        ]
+        
+        col1, col2 = st.columns(2)
+        
+        # Temperature prediction
+        with col1:
+            fig_temp = go.Figure()
+            
+            # Historical data
+            fig_temp.add_trace(go.Scatter(
+                x=data['timestamp'].tail(20),
+                y=data['temperature'].tail(20),
+                mode='lines+markers',
+                name='Historical',
+                line=dict(color='red', width=2)
+            ))
+            
+            # Prediction
+            fig_temp.add_trace(go.Scatter(
+                x=future_times,
+                y=predictions['temperature'],
+                mode='lines+markers',
+                name='Prediction',
+                line=dict(color='red', width=2, dash='dash'),
+                marker=dict(size=8)
+            ))
+            
+            fig_temp.update_layout(
+                title="Temperature Prediction",
+                xaxis_title="Time",
+                yaxis_title="Temperature (°C)",
+                height=400,
+                hovermode='x unified'
+            )
+            
+            st.plotly_chart(fig_temp, use_container_width=True)
+        
+        # Humidity prediction
+        with col2:
+            fig_hum = go.Figure()
+            
+            fig_hum.add_trace(go.Scatter(
+                x=data['timestamp'].tail(20),
+                y=data['humidity'].tail(20),
+                mode='lines+markers',
+                name='Historical',
+                line=dict(color='blue', width=2)
+            ))
+            
+            fig_hum.add_trace(go.Scatter(
+                x=future_times,
+                y=predictions['humidity'],
+                mode='lines+markers',
+                name='Prediction',
+                line=dict(color='blue', width=2, dash='dash'),
+                marker=dict(size=8)
+            ))
+            
+            fig_hum.update_layout(
+                title="Humidity Prediction",
+                xaxis_title="Time",
+                yaxis_title="Humidity (%)",
+                height=400,
+                hovermode='x unified'
+            )
+            
+            st.plotly_chart(fig_hum, use_container_width=True)
+        
+        # Pressure prediction
+        fig_pres = go.Figure()
+        
+        fig_pres.add_trace(go.Scatter(
+            x=data['timestamp'].tail(20),
+            y=data['pressure'].tail(20),
+            mode='lines+markers',
+            name='Historical',
+            line=dict(color='green', width=2)
+        ))
+        
+        fig_pres.add_trace(go.Scatter(
+            x=future_times,
+            y=predictions['pressure'],
+            mode='lines+markers',
+            name='Prediction',
+            line=dict(color='green', width=2, dash='dash'),
+            marker=dict(size=8)
+        ))
+        
+        fig_pres.update_layout(
+            title="Pressure Prediction",
+            xaxis_title="Time",
+            yaxis_title="Pressure (hPa)",
+            height=400,
+            hovermode='x unified'
+        )
+        
+        st.plotly_chart(fig_pres, use_container_width=True)
+
+
+@timed('dashboard_render_seconds', 'Dashboard render time by phase', phase='anomalies')
+def render_anomalies(device_id):
+    """Anomaly scores stored at ingest time for the recent window."""
+    data_version, data, shared = current_view(device_id)
+    if shared is None:
+        return
+    
+    # Anomaly scores were computed once per reading at ingest time
+    scores = load_scores(device_id, data['timestamp'].iloc[0], data_version, shared.key)
+    data_with_anomalies = data.merge(scores[['timestamp', 'score', 'is_anomaly']], on='timestamp', how='left')
+    data_with_anomalies['is_anomaly'] = data_with_anomalies['is_anomaly'].fillna(False).astype(bool)
+    
+    st.subheader("⚠️ Anomaly Detection Analysis")
+    
+    num_anomalies = int(data_with_anomalies['is_anomaly'].sum())
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Anomalies", num_anomalies)
+    with col2:
+        st.metric("Anomaly Rate", f"{(num_anomalies/len(data)*100):.1f}%")
+    with col3:
+        st.metric("Normal Readings", len(data) - num_anomalies)
+    
+    # Anomaly timeline
+    st.subheader("Anomaly Timeline")
+    
+    fig = go.Figure()
+    
+    # Normal points
+    normal_data = data_with_anomalies[~data_with_anomalies['is_anomaly']]
+    fig.add_trace(go.Scatter(
+        x=normal_data['timestamp'],
+        y=normal_data['temperature'],
+        mode='markers',
+        name='Normal',
+        marker=dict(color='green', size=8)
+    ))
+    
+    # Anomaly points
+    anomaly_data = data_with_anomalies[data_with_anomalies['is_anomaly']]
+    if len(anomaly_data) > 0:
+        fig.add_trace(go.Scatter(
+            x=anomaly_data['timestamp'],
+            y=anomaly_data['temperature'],
+            mode='markers',
+            name='Anomaly',
+            marker=dict(color='red', size=12, symbol='star')
+        ))
+    
+    fig.update_layout(
+        title="Anomalies Detected in Temperature",
+        xaxis_title="Time",
+        yaxis_title="Temperature (°C)",
+        height=400,
+        hovermode='x unified'
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Anomaly details
+    if num_anomalies > 0:
+        st.subheader("Recent Anomalies")
+        anomaly_records = data_with_anomalies[data_with_anomalies['is_anomaly']].tail(10)
+        st.dataframe(anomaly_records, use_container_width=True)
+
+
+def render_ops():
+    """Hot-path timers and counters of this process."""
+    st.subheader("🛠️ Operations")
+    
+    server = get_metrics_server()
+    if server is not None:
+        host, port = server.server_address[:2]
+        st.caption(f"Prometheus endpoint: http://{host}:{port}/metrics")
+    else:
+        st.caption("Set MONITORING_METRICS_PORT to expose these metrics at /metrics for Prometheus")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        enabled = st.toggle(
+            "Record metrics",
+            value=REGISTRY.enabled,
+            help="Applies to the whole process; disabled timers cost a single flag check"
+        )
+        REGISTRY.set_enabled(enabled)
+    with col2:
+        if st.button("🔄 Reset Metrics"):
+            REGISTRY.reset()
+    
+    rows = REGISTRY.snapshot()
+    timers = pd.DataFrame([
+        {
+            'metric': row['name'],
+            'labels': ', '.join(f"{key}={value}" for key, value in row['labels'].items()),
+            'calls': row['count'],
+            'mean (ms)': row['mean'] * 1000,
+            'max (ms)': row['max'] * 1000,
+            'total (s)': row['sum'],
+        }
+        for row in rows if row['type'] == 'timer'
+    ])
+    counters = pd.DataFrame([
+        {
+            'metric': row['name'],
+            'labels': ', '.join(f"{key}={value}" for key, value in row['labels'].items()),
+            'value': row['value'],
+        }
+        for row in rows if row['type'] == 'counter'
+    ])
+    
+    st.markdown("**Timers**")
+    st.dataframe(timers, use_container_width=True, hide_index=True)
+    st.markdown("**Counters**")
+    st.dataframe(counters, use_container_width=True, hide_index=True)
 
 
 def main():
@@ -82,6 +695,17 @@ def main():
         # Data collection settings
         st.subheader("Data Collection")
         
+        # Device selection: every query below is scoped to this device
+        db = get_database()
+        devices = db.get_devices() or [DEFAULT_DEVICE]
+        device_id = st.selectbox(
+            "Device:",
+            devices,
+            index=devices.index(st.session_state.device_id) if st.session_state.device_id in devices else 0,
+            help="Sensor/device whose readings, predictions and anomalies are shown"
+        )
+        st.session_state.device_id = device_id
+        
         # Data source selection
         if WEATHER_API_AVAILABLE:
             data_source = st.radio(
@@ -130,6 +754,13 @@ def main():
         
         # Model settings
         st.subheader("Model Settings")
+        anomaly_detector = st.radio(
+            "Anomaly detector:",
+            ["🌲 Isolation Forest", "⚡ Streaming (EWMA)"],
+            help="Isolation Forest is refit on initialize | Streaming scores each new reading in constant time without refitting"
+        )
+        anomaly_mode = 'streaming' if "⚡" in anomaly_detector else 'batch'
+        
         contamination = st.slider(
             "Anomaly contamination rate:",
             min_value=0.01,
@@ -161,13 +792,53 @@ def main():
             help="Choose prediction model for dashboard"
         )
         
+        # Live mode: a shared background producer adds readings and the
+        # panels below refresh themselves on a timer, without rerunning
+        # the whole page
+        st.subheader("Live Mode")
+        live = st.toggle(
+            "📡 Live mode",
+            value=st.session_state.live,
+            help="Stream new readings continuously and refresh the panels automatically (wallboard mode)"
+        )
+        refresh_seconds = st.slider(
+            "Refresh every (seconds):",
+            min_value=1,
+            max_value=30,
+            value=2,
+            step=1,
+            help="How often the live panels poll for new readings"
+        )
+        reading_interval = st.slider(
+            "New reading every (seconds):",
+            min_value=0.5,
+            max_value=10.0,
+            value=1.0,
+            step=0.5,
+            help="Rate of the background producer (shared by every viewer of this device)"
+        )
+        
+        producer = get_live_producer(st.session_state.device_id)
+        if live:
+            if db.data_version() > 0:
+                producer.start(interval=reading_interval, **reading_kwargs(producer.source, anomaly_prob))
+                st.caption(f"🟢 Streaming — {producer.produced} readings produced")
+            else:
+                st.warning("Initialize system first!")
+                live = False
+        elif st.session_state.live:
+            # Only the session that switched live mode off stops the feed
+            producer.stop()
+        st.session_state.live = live
+        
         # Action buttons
         st.subheader("Actions")
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("🔄 Initialize System"):
-                st.session_state.db = DatabaseManager()
+                initial_data = pd.DataFrame()
+                init_messages = []
                 
                 # Determine data source
                 if "🌍" in data_source and weather_api_key:
@@ -179,394 +850,194 @@ def main():
                                 api_key=weather_api_key,
                                 city=weather_city
                             )
-                            st.session_state.data = provider.generate_batch(
-                                num_readings=num_initial_readings,
-                                save_to_db=True
-                            )
+                            # The provider reports fetch problems as warnings
+                            with warnings.catch_warnings(record=True) as caught:
+                                warnings.simplefilter('always')
+                                initial_data = provider.generate_batch(
+                                    num_readings=num_initial_readings,
+                                    save_to_db=True
+                                )
+                            init_messages = [str(warning.message) for warning in caught]
                             st.session_state.data_provider = provider
+                            get_weather_providers()[provider.device_id] = provider
+                            st.session_state.device_id = provider.device_id
                             source_name = f"🌍 Real Weather ({weather_city})"
                         except Exception as e:
-                            st.error(f"Failed to fetch weather data: {str(e)}")
-                            st.session_state.data = pd.DataFrame()
+                            init_messages = [str(e)]
                             source_name = "Error"
                 else:
-                    st.session_state.simulator = SensorSimulator(random_seed=42)
-                    st.session_state.data = st.session_state.simulator.generate_batch(
-                        num_readings=num_initial_readings,
-                        anomaly_probability=anomaly_prob,
-                        save_to_db=True
-                    )
+                    if st.session_state.device_id in get_weather_providers():
+                        # Simulated readings never go into a weather device
+                        st.session_state.device_id = DEFAULT_DEVICE
+                        producer = get_live_producer(DEFAULT_DEVICE)
+                    simulator = get_simulator(st.session_state.device_id)
+                    # Hold the live producer off the shared simulator meanwhile
+                    with producer.lock:
+                        initial_data = simulator.generate_batch(
+                            num_readings=num_initial_readings,
+                            anomaly_probability=anomaly_prob,
+                            save_to_db=True
+                        )
+                        # Make the buffered writes visible to every session's next read
+                        simulator.db.flush()
                     source_name = "📊 Simulated"
                 
-                if len(st.session_state.data) > 0:
-                    st.session_state.model = MonitoringAIModel(
+                if len(initial_data) > 0:
+                    # The shared model for this configuration is loaded or
+                    # trained on the next run and caught up with the new readings
+                    st.session_state.model_config = dict(
                         contamination=contamination,
+                        anomaly_mode=anomaly_mode,
                         use_lstm=use_lstm
                     )
-                    st.session_state.model.train(st.session_state.data, epochs=5, verbose=0)
-                    st.session_state.num_readings = len(st.session_state.data)
                     st.session_state.prediction_model_type = 'lstm' if use_lstm and '🧠' in prediction_model else 'linear'
                     st.success(f"✓ System initialized with {source_name} and {'LSTM' if use_lstm else 'Linear Regression'} model!")
+                    st.rerun()
                 else:
-                    st.error("Failed to load initial data. Please try again.")
-                st.rerun()
-                st.session_state.num_readings = len(st.session_state.data)
-                st.success("✓ System initialized!")
-                st.rerun()
+                    # No rerun, so the reason stays on screen
+                    st.error("Failed to load initial data: " + ("; ".join(init_messages) or "please try again."))
         
         with col2:
             if st.button("➕ Add New Reading"):
-                if len(st.session_state.data) > 0:
-                    new_reading = st.session_state.simulator.get_next_reading(anomaly_prob)
-                    new_df = pd.DataFrame([new_reading])
-                    st.session_state.data = pd.concat(
-                        [st.session_state.data, new_df],
-                        ignore_index=True
-                    )
-                    st.session_state.num_readings += 1
+                if db.data_version() > 0:
+                    source = get_source(st.session_state.device_id)
+                    with producer.lock:
+                        source.get_next_reading(**reading_kwargs(source, anomaly_prob))
+                        source.db.flush()
                     st.info("✓ New reading added!")
                     st.rerun()
                 else:
                     st.warning("Initialize system first!")
     
     # Main content area
-    if len(st.session_state.data) == 0:
+    device_id = st.session_state.device_id
+    data_version, data, shared = current_view(device_id)
+    if shared is None:
         st.info("👈 Click 'Initialize System' in the sidebar to start")
         return
     
-    # Display current status
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric(
-            "Total Readings",
-            st.session_state.num_readings,
-            delta=None
-        )
-    with col2:
-        st.metric(
-            "System Status",
-            "🟢 Active"
-        )
-    with col3:
-        st.metric(
-            "Last Update",
-            st.session_state.data['timestamp'].iloc[-1].strftime("%H:%M:%S")
-        )
+    # Live panels refresh on a timer; everything else only on interaction
+    panel = st.fragment(run_every=refresh_seconds if st.session_state.live else None)
+    
+    panel(render_status)(device_id)
     
     st.markdown("---")
     
     # Tabs for different views
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📈 Live Data",
         "🤖 AI Predictions",
         "⚠️ Anomaly Detection",
-        "📊 Analysis"
+        "📊 Analysis",
+        "🛠️ Ops"
     ])
     
     # Tab 1: Live Data Visualization
     with tab1:
-        st.subheader("Current Sensor Readings")
-        
-        # Current metrics
-        current = st.session_state.data.iloc[-1]
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>🌡️ Temperature</h3>
-                <h2>{current['temperature']}°C</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>💧 Humidity</h3>
-                <h2>{current['humidity']}%</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>🔘 Pressure</h3>
-                <h2>{current['pressure']} hPa</h2>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Time series plot
-        st.subheader("Time Series Data")
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=st.session_state.data['timestamp'],
-            y=st.session_state.data['temperature'],
-            mode='lines+markers',
-            name='Temperature (°C)',
-            line=dict(color='red', width=2),
-            marker=dict(size=4)
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=st.session_state.data['timestamp'],
-            y=st.session_state.data['humidity'],
-            mode='lines+markers',
-            name='Humidity (%)',
-            line=dict(color='blue', width=2),
-            marker=dict(size=4),
-            yaxis='y2'
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=st.session_state.data['timestamp'],
-            y=st.session_state.data['pressure'],
-            mode='lines+markers',
-            name='Pressure (hPa)',
-            line=dict(color='green', width=2),
-            marker=dict(size=4),
-            yaxis='y3'
-        ))
-        
-        fig.update_layout(
-            title="Sensor Data Over Time",
-            xaxis_title="Time",
-            yaxis_title="Temperature (°C)",
-            yaxis2=dict(title="Humidity (%)", overlaying="y", side="right"),
-            yaxis3=dict(title="Pressure (hPa)", overlaying="y", side="right", anchor="free", x=1.15),
-            height=500,
-            hovermode='x unified',
-            legend=dict(x=0, y=1)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        panel(render_live_data)(device_id)
     
     # Tab 2: AI Predictions
     with tab2:
-        st.subheader("🤖 AI-Powered Predictions")
-        
-        predictions = st.session_state.model.predict_next(
-            st.session_state.data,
-            steps_ahead=prediction_steps
-        )
-        
-        if predictions:
-            # Create prediction visualization
-            future_times = [
-                st.session_state.data['timestamp'].iloc[-1] + timedelta(hours=i)
-                for i in range(1, prediction_steps + 1)
-            ]
-            
-            col1, col2 = st.columns(2)
-            
-            # Temperature prediction
-            with col1:
-                fig_temp = go.Figure()
-                
-                # Historical data
-                fig_temp.add_trace(go.Scatter(
-                    x=st.session_state.data['timestamp'].tail(20),
-                    y=st.session_state.data['temperature'].tail(20),
-                    mode='lines+markers',
-                    name='Historical',
-                    line=dict(color='red', width=2)
-                ))
-                
-                # Prediction
-                fig_temp.add_trace(go.Scatter(
-                    x=future_times,
-                    y=predictions['temperature'],
-                    mode='lines+markers',
-                    name='Prediction',
-                    line=dict(color='red', width=2, dash='dash'),
-                    marker=dict(size=8)
-                ))
-                
-                fig_temp.update_layout(
-                    title="Temperature Prediction",
-                    xaxis_title="Time",
-                    yaxis_title="Temperature (°C)",
-                    height=400,
-                    hovermode='x unified'
-                )
-                
-                st.plotly_chart(fig_temp, use_container_width=True)
-            
-            # Humidity prediction
-            with col2:
-                fig_hum = go.Figure()
-                
-                fig_hum.add_trace(go.Scatter(
-                    x=st.session_state.data['timestamp'].tail(20),
-                    y=st.session_state.data['humidity'].tail(20),
-                    mode='lines+markers',
-                    name='Historical',
-                    line=dict(color='blue', width=2)
-                ))
-                
-                fig_hum.add_trace(go.Scatter(
-                    x=future_times,
-                    y=predictions['humidity'],
-                    mode='lines+markers',
-                    name='Prediction',
-                    line=dict(color='blue', width=2, dash='dash'),
-                    marker=dict(size=8)
-                ))
-                
-                fig_hum.update_layout(
-                    title="Humidity Prediction",
-                    xaxis_title="Time",
-                    yaxis_title="Humidity (%)",
-                    height=400,
-                    hovermode='x unified'
-                )
-                
-                st.plotly_chart(fig_hum, use_container_width=True)
-            
-            # Pressure prediction
-            fig_pres = go.Figure()
-            
-            fig_pres.add_trace(go.Scatter(
-                x=st.session_state.data['timestamp'].tail(20),
-                y=st.session_state.data['pressure'].tail(20),
-                mode='lines+markers',
-                name='Historical',
-                line=dict(color='green', width=2)
-            ))
-            
-            fig_pres.add_trace(go.Scatter(
-                x=future_times,
-                y=predictions['pressure'],
-                mode='lines+markers',
-                name='Prediction',
-                line=dict(color='green', width=2, dash='dash'),
-                marker=dict(size=8)
-            ))
-            
-            fig_pres.update_layout(
-                title="Pressure Prediction",
-                xaxis_title="Time",
-                yaxis_title="Pressure (hPa)",
-                height=400,
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig_pres, use_container_width=True)
+        panel(render_predictions)(device_id, prediction_steps)
     
     # Tab 3: Anomaly Detection
     with tab3:
-        st.subheader("⚠️ Anomaly Detection Analysis")
+        panel(render_anomalies)(device_id)
+    
+    # Tab 4: Trend Analysis, computed on full reruns only
+    analysis_timer = timer('dashboard_render_seconds', 'Dashboard render time by phase', phase='analysis')
+    with tab4, analysis_timer.time():
+        with shared.lock:
+            trends = shared.model.get_trends(data)
+        summary = load_summary(device_id, data_version)
         
-        anomalies = st.session_state.model.detect_anomalies(st.session_state.data)
-        num_anomalies = sum(anomalies)
+        st.subheader("📊 Trend Analysis")
         
         col1, col2, col3 = st.columns(3)
+        
         with col1:
-            st.metric("Total Anomalies", num_anomalies)
+            st.markdown(f"**Temperature Trend**\n{trends['temperature']}")
+        
         with col2:
-            st.metric("Anomaly Rate", f"{(num_anomalies/len(st.session_state.data)*100):.1f}%")
+            st.markdown(f"**Humidity Trend**\n{trends['humidity']}")
+        
         with col3:
-            st.metric("Normal Readings", len(st.session_state.data) - num_anomalies)
+            st.markdown(f"**Pressure Trend**\n{trends['pressure']}")
         
-        # Anomaly timeline
-        st.subheader("Anomaly Timeline")
+        # Statistics come from the incrementally maintained rollup tables
+        # instead of re-describing the whole in-memory frame on every rerun
+        st.subheader("Statistical Summary (all history)")
         
-        data_with_anomalies = st.session_state.data.copy()
-        data_with_anomalies['is_anomaly'] = anomalies
+        st.dataframe(summary, use_container_width=True)
         
-        fig = go.Figure()
+        # Long-range history from the rollups, capped at MAX_POINTS per trace
+        st.subheader("Long-Range History")
         
-        # Normal points
-        normal_data = data_with_anomalies[~data_with_anomalies['is_anomaly']]
-        fig.add_trace(go.Scatter(
-            x=normal_data['timestamp'],
-            y=normal_data['temperature'],
-            mode='markers',
-            name='Normal',
-            marker=dict(color='green', size=8)
-        ))
+        granularity = st.radio(
+            "Resolution:",
+            ['Auto', '1m', '1h', '1d'],
+            index=0,
+            horizontal=True,
+            help="Auto picks the finest rollup table (or raw readings) that fits the chart"
+        )
+        if granularity == 'Auto':
+            history, granularity = load_history(db, device_id=device_id)
+        else:
+            rollup = db.get_rollup(granularity, device_id=device_id)
+            history = rollup[['timestamp']].assign(
+                **{metric: rollup[f'{metric}_mean'] for metric in ['temperature', 'humidity', 'pressure']}
+            )
         
-        # Anomaly points
-        anomaly_data = data_with_anomalies[data_with_anomalies['is_anomaly']]
-        if len(anomaly_data) > 0:
+        fig = go.Figure()
+        for metric, color, axis in [('temperature', 'red', 'y'), ('humidity', 'blue', 'y2'), ('pressure', 'green', 'y3')]:
+            x, y = downsample(history['timestamp'].to_numpy(), history[metric].to_numpy(), MAX_POINTS)
             fig.add_trace(go.Scatter(
-                x=anomaly_data['timestamp'],
-                y=anomaly_data['temperature'],
-                mode='markers',
-                name='Anomaly',
-                marker=dict(color='red', size=12, symbol='star')
+                x=x,
+                y=y,
+                mode='lines',
+                name=f'{metric.capitalize()} (mean)',
+                line=dict(color=color, width=2),
+                yaxis=axis
             ))
         
         fig.update_layout(
-            title="Anomalies Detected in Temperature",
+            title="Raw Readings" if granularity == 'raw' else f"Per-{granularity} Averages",
             xaxis_title="Time",
             yaxis_title="Temperature (°C)",
+            yaxis2=dict(title="Humidity (%)", overlaying="y", side="right"),
+            yaxis3=dict(title="Pressure (hPa)", overlaying="y", side="right", anchor="free", x=1.15),
             height=400,
-            hovermode='x unified'
+            hovermode='x unified',
+            legend=dict(x=0, y=1)
         )
         
         st.plotly_chart(fig, use_container_width=True)
         
-        # Anomaly details
-        if num_anomalies > 0:
-            st.subheader("Recent Anomalies")
-            anomaly_records = data_with_anomalies[data_with_anomalies['is_anomaly']].tail(10)
-            st.dataframe(anomaly_records, use_container_width=True)
-    
-    # Tab 4: Trend Analysis
-    with tab4:
-        st.subheader("📊 Trend Analysis")
-        
+        # Distribution plots: bins are counted here, only the bars are sent
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            trend = st.session_state.model.get_trend(st.session_state.data, 'temperature')
-            st.markdown(f"**Temperature Trend**\n{trend}")
-        
-        with col2:
-            trend = st.session_state.model.get_trend(st.session_state.data, 'humidity')
-            st.markdown(f"**Humidity Trend**\n{trend}")
-        
-        with col3:
-            trend = st.session_state.model.get_trend(st.session_state.data, 'pressure')
-            st.markdown(f"**Pressure Trend**\n{trend}")
-        
-        # Statistics
-        st.subheader("Statistical Summary")
-        
-        stats_df = st.session_state.data[['temperature', 'humidity', 'pressure']].describe()
-        st.dataframe(stats_df, use_container_width=True)
-        
-        # Distribution plots
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            fig = px.histogram(
-                st.session_state.data,
-                x='temperature',
-                nbins=20,
-                title='Temperature Distribution'
-            )
+            centers, widths, counts = histogram(data['temperature'], bins=20)
+            fig = go.Figure(go.Bar(x=centers, y=counts, width=widths))
+            fig.update_layout(title='Temperature Distribution', xaxis_title='temperature', yaxis_title='count')
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            fig = px.histogram(
-                st.session_state.data,
-                x='humidity',
-                nbins=20,
-                title='Humidity Distribution'
-            )
+            centers, widths, counts = histogram(data['humidity'], bins=20)
+            fig = go.Figure(go.Bar(x=centers, y=counts, width=widths))
+            fig.update_layout(title='Humidity Distribution', xaxis_title='humidity', yaxis_title='count')
             st.plotly_chart(fig, use_container_width=True)
         
         with col3:
-            fig = px.histogram(
-                st.session_state.data,
-                x='pressure',
-                nbins=20,
-                title='Pressure Distribution'
-            )
+            centers, widths, counts = histogram(data['pressure'], bins=20)
+            fig = go.Figure(go.Bar(x=centers, y=counts, width=widths))
+            fig.update_layout(title='Pressure Distribution', xaxis_title='pressure', yaxis_title='count')
             st.plotly_chart(fig, use_container_width=True)
+    
+    # Tab 5: Operations, refreshed with the live panels
+    with tab5:
+        panel(render_ops)()
+
 
 
 if __name__ == "__main__":
@@ -3,11 +3,590 @@ SQLite Database Manager for Persistent Data Storage
 This module handles all database operations for storing and retrieving sensor readings.
 """
 
+import queue
 import sqlite3
+import threading
+import time
+import warnings
+import weakref
+from itertools import repeat
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from metrics import counter, timer
+
+
+# Pragmas applied to every pooled connection. WAL lets dashboard readers run
+# alongside the writer instead of queueing on the database file lock, and
+# synchronous=NORMAL only fsyncs at checkpoints, which is safe in WAL mode.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,  # Negative value = size in KiB
+    'busy_timeout': 5000,
+}
+
+# Durability levels for save_reading:
+# - 'immediate': commit each reading in its own transaction (slowest, safest)
+# - 'group': queue the reading and block until its group transaction commits
+# - 'buffered': queue the reading and return at once; a crash can lose
+#   whatever is still buffered
+DURABILITY_MODES = ('immediate', 'group', 'buffered')
+
+# Bumped whenever init_database() gains a migration
+SCHEMA_VERSION = 6
+
+# Device id given to readings that don't name one (and to all pre-device data)
+DEFAULT_DEVICE = 'default'
+# Scores written without naming the model configuration that produced them
+DEFAULT_MODEL = 'default'
+
+READING_COLUMNS = ('timestamp', 'temperature', 'humidity', 'pressure')
+METRIC_COLUMNS = ('temperature', 'humidity', 'pressure')
+
+_INSERT_READING_SQL = '''
+    INSERT OR IGNORE INTO readings (device_id, ts, temperature, humidity, pressure)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# One anomaly score per reading and model configuration, so models with
+# different settings keep separate scores. The partial index serves
+# "recent anomalies" lookups without scanning the scores of normal readings.
+_ANOMALIES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS anomalies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL DEFAULT 'default',
+        model TEXT NOT NULL DEFAULT 'default',
+        ts INTEGER NOT NULL,
+        reading_id INTEGER,
+        score REAL NOT NULL,
+        is_anomaly INTEGER NOT NULL DEFAULT 0,
+        anomaly_type TEXT,
+        severity REAL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (device_id, model, ts)
+    )
+'''
+_ANOMALIES_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_anomalies_flagged
+    ON anomalies (device_id, model, ts) WHERE is_anomaly = 1
+'''
+_SCORE_VALUES_SQL = '''
+    INTO anomalies (device_id, model, ts, score, is_anomaly)
+    VALUES (?, ?, ?, ?, ?)
+'''
+_ON_SCORE_CONFLICT_SQL = '''
+    ON CONFLICT (device_id, model, ts) DO UPDATE SET
+        score = excluded.score, is_anomaly = excluded.is_anomaly
+'''
+
+# Downsampled rollup tables (readings_1m, readings_1h, readings_1d) and
+# their bucket widths in microseconds
+ROLLUP_GRANULARITIES = {
+    '1m': 60 * 1_000_000,
+    '1h': 3600 * 1_000_000,
+    '1d': 86400 * 1_000_000,
+}
+
+# Reading-insert transactions, by write path (immediate, buffered, bulk)
+_COMMIT_TIMERS = {
+    path: timer('db_commit_seconds', 'Reading insert transaction time', path=path)
+    for path in ('immediate', 'buffered', 'bulk')
+}
+_ROWS_COUNTERS = {
+    path: counter('db_readings_written_total', 'Readings inserted (duplicates excluded)', path=path)
+    for path in ('immediate', 'buffered', 'bulk')
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value):
+    """
+    Convert a timestamp to integer microseconds since the Unix epoch.
+    
+    Stored timestamps are local wall-clock time, the convention of the
+    datetime.now() values the simulator produces and of
+    datetime.fromtimestamp(): naive values are taken as they are, aware
+    ones are converted to the local time of their instant first, so the
+    same instant maps to the same ts either way.
+    
+    Args:
+        value: datetime, pandas Timestamp, np.datetime64, ISO string, or an
+            int that is already in epoch microseconds
+    
+    Returns:
+        int: Epoch microseconds
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, np.datetime64):
+        return int(value.astype('datetime64[us]').astype(np.int64))
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        utc_us = (value.astimezone(timezone.utc).replace(tzinfo=None) - _EPOCH) // _ONE_MICROSECOND
+        return int(utc_to_local_us(utc_us))
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+
+def utc_to_local_us(utc_us):
+    """
+    Convert UTC epoch microseconds to local wall-clock epoch microseconds.
+    
+    The UTC offset is looked up per instant, like datetime.fromtimestamp()
+    does, so values on either side of a DST change each get their own.
+    Offsets only change on quarter-hour boundaries, so one lookup per
+    distinct quarter hour covers a whole array.
+    
+    Args:
+        utc_us: Int or array of UTC epoch microseconds
+    
+    Returns:
+        Local epoch microseconds, same shape as utc_us
+    """
+    utc_us = np.asarray(utc_us, dtype=np.int64)
+    quarters, inverse = np.unique(utc_us // 900_000_000, return_inverse=True)
+    offsets = np.array([time.localtime(int(q) * 900).tm_gmtoff for q in quarters], dtype=np.int64)
+    return utc_us + offsets[inverse].reshape(utc_us.shape) * 1_000_000
+
+
+def from_epoch_us(value):
+    """
+    Convert epoch microseconds back to a naive datetime.
+    
+    Args:
+        value (int): Epoch microseconds
+    
+    Returns:
+        datetime: Naive wall-clock datetime
+    """
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def _as_columns(data):
+    """
+    Extract the reading columns from a tabular container as NumPy arrays.
+    
+    Args:
+        data: pandas DataFrame, pyarrow Table/RecordBatch, NumPy structured
+            array, or a mapping of column name to array-like
+    
+    Returns:
+        dict: Column name -> 1-D NumPy array for each of READING_COLUMNS,
+            plus 'device_id' if the input has that column
+    """
+    if isinstance(data, pd.DataFrame):
+        names, get = data.columns, lambda col: data[col].to_numpy()
+    elif hasattr(data, 'column_names') and hasattr(data, 'column'):
+        # pyarrow.Table / RecordBatch, converted column by column without pandas
+        names, get = data.column_names, lambda col: np.asarray(data.column(col).to_numpy())
+    elif isinstance(data, np.ndarray) and data.dtype.names:
+        names, get = data.dtype.names, lambda col: data[col]
+    elif isinstance(data, Mapping):
+        names, get = data.keys(), lambda col: np.asarray(data[col])
+    else:
+        raise TypeError(f"Unsupported data type for bulk insert: {type(data).__name__}")
+    
+    columns = {col: get(col) for col in READING_COLUMNS}
+    if 'device_id' in names:
+        columns['device_id'] = get('device_id')
+    return columns
+
+
+def _epoch_us_array(values):
+    """Convert a timestamp column to int64 epoch microseconds in one vectorized pass."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int64)
+    if values.dtype.kind != 'M':
+        index = pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601'))
+        if index.tz is not None:
+            # Aware values: local wall-clock time of each instant, as in to_epoch_us()
+            return utc_to_local_us(index.tz_convert(None).to_numpy().astype('datetime64[us]').astype(np.int64))
+        values = index.to_numpy()
+    return values.astype('datetime64[us]').astype(np.int64)
+
+
+def _rollup_table_sql(granularity):
+    """DDL for one rollup table: per-device, per-bucket count, min, max, sum and sum of squares."""
+    metric_columns = ',\n'.join(
+        f'{m}_min REAL, {m}_max REAL, {m}_sum REAL, {m}_sumsq REAL' for m in METRIC_COLUMNS
+    )
+    return f'''
+        CREATE TABLE IF NOT EXISTS readings_{granularity} (
+            device_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            {metric_columns},
+            PRIMARY KEY (device_id, bucket)
+        ) WITHOUT ROWID
+    '''
+
+
+def _rollup_upsert_sql(granularity):
+    """SQL adding one batch's (device_id, bucket, count, per-metric min/max/sum/sumsq) row to a rollup bucket."""
+    columns = ', '.join(f'{m}_min, {m}_max, {m}_sum, {m}_sumsq' for m in METRIC_COLUMNS)
+    placeholders = ', '.join('?' * (3 + 4 * len(METRIC_COLUMNS)))
+    updates = ',\n'.join(
+        f'''{m}_min = MIN({m}_min, excluded.{m}_min),
+            {m}_max = MAX({m}_max, excluded.{m}_max),
+            {m}_sum = {m}_sum + excluded.{m}_sum,
+            {m}_sumsq = {m}_sumsq + excluded.{m}_sumsq''' for m in METRIC_COLUMNS
+    )
+    return f'''
+        INSERT INTO readings_{granularity} (device_id, bucket, count, {columns})
+        VALUES ({placeholders})
+        ON CONFLICT (device_id, bucket) DO UPDATE SET
+            count = count + excluded.count,
+            {updates}
+    '''
+
+
+_ROLLUP_UPSERT_SQL = {granularity: _rollup_upsert_sql(granularity) for granularity in ROLLUP_GRANULARITIES}
+_BATCH_COLUMNS = ('device_id', 'ts', *METRIC_COLUMNS)
+
+
+def _fold_into_rollups(conn, batch):
+    """
+    Add newly inserted readings to every rollup table.
+    
+    The batch is aggregated per device and bucket in NumPy first (sorted,
+    then reduced segment by segment), so it costs one upsert per touched
+    bucket instead of one per reading.
+    
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction
+        batch (DataFrame): device_id, ts and metric columns of the new readings
+    """
+    codes, devices = pd.factorize(batch['device_id'])
+    ts = batch['ts'].to_numpy(dtype=np.int64)
+    values = batch[list(METRIC_COLUMNS)].to_numpy(dtype=float)
+    
+    for granularity, width in ROLLUP_GRANULARITIES.items():
+        buckets = ts - ts % width
+        order = np.lexsort((buckets, codes))
+        group_codes, group_buckets, group_values = codes[order], buckets[order], values[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(group_codes) != 0) | (np.diff(group_buckets) != 0)])
+        counts = np.diff(np.r_[starts, len(order)])
+        # (buckets, metric, [min, max, sum, sumsq]) flattened in column order
+        stats = np.stack([
+            np.minimum.reduceat(group_values, starts),
+            np.maximum.reduceat(group_values, starts),
+            np.add.reduceat(group_values, starts),
+            np.add.reduceat(group_values ** 2, starts),
+        ], axis=2).reshape(len(starts), -1)
+        rows = zip(
+            devices[group_codes[starts]].tolist(),
+            group_buckets[starts].tolist(),
+            counts.tolist(),
+            *stats.T.tolist()
+        )
+        conn.executemany(_ROLLUP_UPSERT_SQL[granularity], rows)
+
+
+def _insert_readings(conn, batch):
+    """
+    Insert readings and fold the ones actually written into the rollups.
+    
+    Must run inside the caller's transaction. If duplicates were skipped,
+    the new rows are read back by id: rows inserted in one transaction get
+    consecutive ids, since the write lock is held from the first insert on.
+    
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction
+        batch (DataFrame): device_id, ts (epoch microseconds) and metric columns
+    
+    Returns:
+        int: Rows inserted (duplicates are skipped)
+    """
+    rows = zip(*(batch[column].tolist() for column in _BATCH_COLUMNS))
+    inserted = conn.executemany(_INSERT_READING_SQL, rows).rowcount
+    if inserted == 0:
+        return 0
+    if inserted < len(batch):
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        batch = pd.DataFrame.from_records(
+            conn.execute(
+                f"SELECT {', '.join(_BATCH_COLUMNS)} FROM readings WHERE id > ?",
+                (last_id - inserted,)
+            ).fetchall(),
+            columns=list(_BATCH_COLUMNS)
+        )
+    _fold_into_rollups(conn, batch)
+    return inserted
+
+
+def _rollup_moments(count, total, sumsq):
+    """Mean and sample standard deviation from count, sum and sum of squares."""
+    count = np.asarray(count, dtype=float)
+    mean = np.divide(total, count, out=np.full_like(count, np.nan), where=count > 0)
+    variance = np.divide(
+        np.asarray(sumsq, dtype=float) - count * mean ** 2, count - 1,
+        out=np.full_like(count, np.nan), where=count > 1
+    )
+    return mean, np.sqrt(np.clip(variance, 0, None))
+
+
+def _frame_from_rows(rows, columns):
+    """Build a readings DataFrame, turning the ts column into datetime timestamps."""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    if 'ts' in df.columns:
+        df.insert(0, 'timestamp', pd.to_datetime(df.pop('ts').astype(np.int64), unit='us'))
+    return df
+
+
+class _ConnectionPool:
+    """
+    Thread-safe pool handing out one long-lived SQLite connection per thread.
+    
+    Connections are opened lazily on first use in a thread and reused for
+    every later call from that thread. Connections owned by threads that
+    have exited are closed the next time a new connection is opened, so
+    short-lived worker threads (e.g. Streamlit script runs) don't leak them.
+    """
+    
+    def __init__(self, db_path, pragmas):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []  # (owner thread, connection) pairs
+        self._generation = 0
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+    
+    def get(self):
+        """Return the calling thread's connection, opening it if needed."""
+        cached = getattr(self._local, 'entry', None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        
+        conn = self._connect()
+        with self._lock:
+            stale = [c for t, c in self._connections if not t.is_alive()]
+            self._connections = [(t, c) for t, c in self._connections if t.is_alive()]
+            self._connections.append((threading.current_thread(), conn))
+            self._local.entry = (self._generation, conn)
+        
+        for stale_conn in stale:
+            stale_conn.close()
+        return conn
+    
+    def close(self):
+        """Close every pooled connection. The pool reopens lazily if used again."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        
+        for _, conn in connections:
+            conn.close()
+
+
+# Errors caused by the contents of a row rather than by the database
+_ROW_ERRORS = (sqlite3.IntegrityError, ValueError, TypeError)
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer that group-commits readings from a background thread.
+    
+    Rows are queued by producers and written with one executemany() per
+    transaction, either when batch_size rows have accumulated or when
+    flush_interval_ms has passed since the first queued row, whichever
+    comes first. The queue is bounded: once max_pending rows are waiting,
+    submit() blocks until the writer catches up.
+    """
+    
+    _FLUSH = object()
+    _WAKE = object()
+    _STOP = object()
+    
+    def __init__(self, pool, batch_size=500, flush_interval_ms=50, max_pending=10000):
+        """
+        Initialize and start the writer thread.
+        
+        Args:
+            pool (_ConnectionPool): Pool the writer thread takes its connection from
+            batch_size (int): Maximum rows per transaction
+            flush_interval_ms (float): Maximum time a row waits before commit
+            max_pending (int): Queue capacity before producers block
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._put_lock = threading.Lock()  # Keeps sequence numbers in queue order
+        self._cond = threading.Condition()  # Guards commit progress
+        self._submitted = 0
+        self._committed = 0
+        self._waiters = 0
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sqlite-write-buffer", daemon=True)
+        self._thread.start()
+    
+    @property
+    def pending(self):
+        """int: Number of submitted rows not yet committed."""
+        return self._submitted - self._committed
+    
+    def submit(self, row, wait=False, timeout=None):
+        """
+        Queue a row for the next group commit.
+        
+        Args:
+            row (tuple): (timestamp, temperature, humidity, pressure)
+            wait (bool): Block until the row's transaction has committed
+            timeout (float): Seconds to wait for queue space (None = forever)
+        
+        Raises:
+            queue.Full: If the buffer stayed full for longer than timeout
+        """
+        with self._put_lock:
+            if self._closed:
+                raise RuntimeError("WriteBuffer is closed")
+            if not self._thread.is_alive():
+                raise RuntimeError("WriteBuffer writer thread has stopped")
+            self._queue.put(row, timeout=timeout)
+            self._submitted += 1
+            seq = self._submitted
+        
+        if wait:
+            self._wait_for(seq)
+    
+    def flush(self):
+        """Commit everything submitted so far and wait for it."""
+        with self._put_lock:
+            target = self._submitted
+        if self._committed < target:
+            self._queue.put(self._FLUSH)
+        self._wait_for(target)
+    
+    def close(self):
+        """Flush pending rows and stop the writer thread."""
+        with self._put_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._raise_pending_error()
+    
+    def _wait_for(self, seq):
+        with self._cond:
+            self._waiters += 1
+        try:
+            # Wake the writer in case it is holding a batch open for more rows
+            self._queue.put_nowait(self._WAKE)
+        except queue.Full:
+            pass  # The writer is busy draining a full queue anyway
+        
+        with self._cond:
+            try:
+                while self._committed < seq and self._thread.is_alive():
+                    # Timed, so a writer thread that died is noticed
+                    self._cond.wait(timeout=1.0)
+            finally:
+                self._waiters -= 1
+        self._raise_pending_error()
+    
+    def _raise_pending_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+    
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            # Wake every waiter, also if the loop died, so none blocks forever
+            with self._cond:
+                self._cond.notify_all()
+    
+    def _drain(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            
+            while True:
+                if item is self._STOP:
+                    stopping = True
+                    break
+                if item is self._FLUSH:
+                    break
+                if item is not self._WAKE:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                try:
+                    # Take whatever is already queued without waiting; only
+                    # hold the batch open if nobody is blocked on the commit.
+                    item = self._queue.get_nowait()
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._waiters:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch):
+        try:
+            conn = self.pool.get()
+            try:
+                with _COMMIT_TIMERS['buffered'].time(), conn:
+                    written = _insert_readings(conn, pd.DataFrame.from_records(batch, columns=list(_BATCH_COLUMNS)))
+            except _ROW_ERRORS:
+                # One bad row must not drop the rows of every other producer
+                written = self._write_rows(conn, batch)
+            _ROWS_COUNTERS['buffered'].inc(written)
+        except Exception as e:
+            warnings.warn(f"Failed to write {len(batch)} buffered readings: {str(e)}")
+            self._error = e
+        finally:
+            with self._cond:
+                self._committed += len(batch)
+                self._cond.notify_all()
+    
+    def _write_rows(self, conn, batch):
+        """Write a batch one row per transaction, dropping the rows that fail."""
+        written = 0
+        for row in batch:
+            try:
+                with conn:
+                    written += _insert_readings(conn, pd.DataFrame.from_records([row], columns=list(_BATCH_COLUMNS)))
+            except _ROW_ERRORS as e:
+                warnings.warn(f"Dropped buffered reading {row!r}: {str(e)}")
+        return written
+
+
+def _shutdown(writer, pool):
+    """Flush the write buffer (if any) before closing the pool's connections."""
+    try:
+        if writer is not None:
+            writer.close()
+    finally:
+        pool.close()
+
 
 class DatabaseManager:
     """
@@ -18,48 +597,115 @@ class DatabaseManager:
     - Saving sensor readings
     - Retrieving historical data
     - Data aggregation and statistics
+    
+    Connections are pooled per thread and kept open for the lifetime of the
+    manager; call close() (or use the manager as a context manager) to
+    release them. They are also closed automatically at interpreter exit,
+    after any buffered readings have been flushed.
     """
     
-    def __init__(self, db_path="data/sensor_data.db"):
+    def __init__(self, db_path="data/sensor_data.db", pragmas=None, durability='immediate',
+                 batch_size=500, flush_interval_ms=50, max_pending=10000):
         """
         Initialize the database manager.
         
         Args:
             db_path (str): Path to SQLite database file
+            pragmas (dict): Overrides for DEFAULT_PRAGMAS on each connection
+            durability (str): Default durability for save_reading, one of DURABILITY_MODES
+            batch_size (int): Maximum readings per group commit
+            flush_interval_ms (float): Maximum delay before a buffered reading is committed
+            max_pending (int): Buffered readings allowed before save_reading blocks
         """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.durability = durability
+        self._pool = _ConnectionPool(self.db_path, self.pragmas)
         self.init_database()
+        
+        self._writer = None
+        if durability != 'immediate':
+            self._writer = WriteBuffer(
+                self._pool,
+                batch_size=batch_size,
+                flush_interval_ms=flush_interval_ms,
+                max_pending=max_pending
+            )
+        self._finalizer = weakref.finalize(self, _shutdown, self._writer, self._pool)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def get_connection(self):
+        """
+        Get the pooled connection for the calling thread.
+        
+        Returns:
+            sqlite3.Connection: Long-lived connection owned by this thread
+        """
+        return self._pool.get()
+    
+    def flush(self):
+        """Commit any readings still held in the write buffer."""
+        if self._writer is not None:
+            self._writer.flush()
+    
+    def close(self):
+        """Flush buffered readings and close all pooled connections."""
+        _shutdown(self._writer, self._pool)
+    
+    def _sync_writes(self):
+        # Give readers read-your-writes consistency with the write buffer
+        if self._writer is not None and self._writer.pending:
+            self._writer.flush()
     
     def init_database(self):
-        """Initialize the database schema if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
+        """
+        Initialize the database schema if it doesn't exist.
+        
+        Databases created by older versions (tracked with PRAGMA user_version)
+        are migrated up to SCHEMA_VERSION first.
+        """
+        conn = self.get_connection()
+        self._migrate(conn)
         cursor = conn.cursor()
         
-        # Create readings table
+        # Create readings table. ts is microseconds since the epoch. The
+        # (device_id, ts) key keeps each device's rows contiguous in its index
+        # so per-device queries never touch other devices' readings;
+        # idx_readings_ts serves queries across all devices.
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS readings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL UNIQUE,
+                device_id TEXT NOT NULL DEFAULT 'default',
+                ts INTEGER NOT NULL,
                 temperature REAL NOT NULL,
                 humidity REAL NOT NULL,
                 pressure REAL NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create anomalies table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS anomalies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reading_id INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                anomaly_type TEXT,
-                severity REAL,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (reading_id) REFERENCES readings(id)
+                UNIQUE (device_id, ts)
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts)')
+        
+        # Rollup tables, updated in the same transaction as every insert into
+        # readings (see _insert_readings). They are not pruned by
+        # clear_old_data(), so long-range views keep working after raw
+        # readings expire.
+        for granularity in ROLLUP_GRANULARITIES:
+            cursor.execute(_rollup_table_sql(granularity))
+        
+        # Create anomalies table: one continuous anomaly score per reading,
+        # written once when the reading is ingested
+        cursor.execute(_ANOMALIES_TABLE_SQL)
+        cursor.execute(_ANOMALIES_INDEX_SQL)
         
         # Create predictions table
         cursor.execute('''
@@ -74,10 +720,172 @@ class DatabaseManager:
             )
         ''')
         
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
-        conn.close()
     
-    def save_reading(self, temperature, humidity, pressure, timestamp=None):
+    def _migrate(self, conn):
+        """Run every migration newer than the database's user_version."""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        has_readings = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'readings'"
+        ).fetchone()
+        if not has_readings:
+            return  # Fresh database, init_database() creates the current schema
+        
+        migrations = [
+            (1, self._migrate_epoch_timestamps),
+            (2, self._migrate_device_partitioning),
+            (3, self._migrate_rollups),
+            (4, self._migrate_anomaly_scores),
+            (5, self._migrate_drop_rollup_triggers),
+            (6, self._migrate_anomaly_models),
+        ]
+        for target, migrate in migrations:
+            if version >= target:
+                continue
+            conn.execute('BEGIN')
+            try:
+                migrate(conn)
+                conn.execute(f'PRAGMA user_version = {target}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            version = target
+    
+    def _migrate_epoch_timestamps(self, conn, chunk_size=50000):
+        """Migration 1: replace ISO TEXT readings.timestamp with integer epoch-microsecond ts."""
+        conn.execute('''
+            CREATE TABLE readings_v1 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL UNIQUE,
+                temperature REAL NOT NULL,
+                humidity REAL NOT NULL,
+                pressure REAL NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor = conn.execute(
+            'SELECT id, timestamp, temperature, humidity, pressure, created_at FROM readings'
+        )
+        skipped = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(
+                rows, columns=['id', 'timestamp', 'temperature', 'humidity', 'pressure', 'created_at']
+            )
+            parsed = pd.to_datetime(chunk['timestamp'], format='ISO8601', errors='coerce')
+            valid = parsed.notna().to_numpy()
+            skipped += int((~valid).sum())
+            chunk = chunk[valid]
+            chunk['timestamp'] = _epoch_us_array(parsed[valid])
+            conn.executemany(
+                '''
+                INSERT OR IGNORE INTO readings_v1 (id, ts, temperature, humidity, pressure, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''',
+                chunk.itertuples(index=False, name=None)
+            )
+        
+        conn.execute('DROP TABLE readings')
+        conn.execute('ALTER TABLE readings_v1 RENAME TO readings')
+        if skipped:
+            warnings.warn(f"Dropped {skipped} readings with unparseable timestamps during migration")
+    
+    def _migrate_device_partitioning(self, conn):
+        """Migration 2: add device_id and key readings by (device_id, ts)."""
+        conn.execute('''
+            CREATE TABLE readings_v2 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT NOT NULL DEFAULT 'default',
+                ts INTEGER NOT NULL,
+                temperature REAL NOT NULL,
+                humidity REAL NOT NULL,
+                pressure REAL NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (device_id, ts)
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO readings_v2 (id, device_id, ts, temperature, humidity, pressure, created_at)
+            SELECT id, ?, ts, temperature, humidity, pressure, created_at FROM readings
+        ''', (DEFAULT_DEVICE,))
+        conn.execute('DROP TABLE readings')
+        conn.execute('ALTER TABLE readings_v2 RENAME TO readings')
+    
+    def _migrate_rollups(self, conn):
+        """Migration 3: create the rollup tables and backfill them from existing readings."""
+        aggregates = ', '.join(
+            f'MIN({m}), MAX({m}), SUM({m}), SUM({m} * {m})' for m in METRIC_COLUMNS
+        )
+        for granularity, width in ROLLUP_GRANULARITIES.items():
+            conn.execute(_rollup_table_sql(granularity))
+            conn.execute(f'''
+                INSERT INTO readings_{granularity}
+                SELECT device_id, ts - ts % {width}, COUNT(*), {aggregates}
+                FROM readings
+                GROUP BY device_id, ts - ts % {width}
+            ''')
+    
+    def _migrate_anomaly_scores(self, conn):
+        """Migration 4: key anomalies by (device_id, ts) and store a continuous score per reading."""
+        has_anomalies = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'anomalies'"
+        ).fetchone()
+        conn.execute(_ANOMALIES_TABLE_SQL.replace('IF NOT EXISTS anomalies', 'anomalies_v4'))
+        
+        if has_anomalies:
+            rows = conn.execute('''
+                SELECT COALESCE(r.device_id, ?), a.reading_id, a.timestamp, a.anomaly_type, a.severity, a.created_at
+                FROM anomalies a LEFT JOIN readings r ON r.id = a.reading_id
+            ''', (DEFAULT_DEVICE,)).fetchall()
+            old = pd.DataFrame.from_records(
+                rows, columns=['device_id', 'reading_id', 'timestamp', 'anomaly_type', 'severity', 'created_at']
+            )
+            parsed = pd.to_datetime(old['timestamp'], format='ISO8601', errors='coerce')
+            valid = parsed.notna().to_numpy()
+            if not valid.all():
+                warnings.warn(f"Dropped {int((~valid).sum())} anomalies with unparseable timestamps during migration")
+            old = old[valid]
+            old['timestamp'] = _epoch_us_array(parsed[valid])
+            old['severity'] = old['severity'].fillna(1.0)
+            conn.executemany('''
+                INSERT OR IGNORE INTO anomalies_v4
+                    (device_id, ts, reading_id, score, is_anomaly, anomaly_type, severity, created_at)
+                VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+            ''', (
+                (row.device_id, row.timestamp, row.reading_id, row.severity,
+                 row.anomaly_type, row.severity, row.created_at)
+                for row in old.itertuples(index=False)
+            ))
+            conn.execute('DROP TABLE anomalies')
+        
+        conn.execute('ALTER TABLE anomalies_v4 RENAME TO anomalies')
+        conn.execute(_ANOMALIES_INDEX_SQL)
+    
+    def _migrate_drop_rollup_triggers(self, conn):
+        """Migration 5: drop the per-row rollup triggers; writers now fold whole batches in."""
+        for granularity in ROLLUP_GRANULARITIES:
+            conn.execute(f'DROP TRIGGER IF EXISTS trg_rollup_{granularity}')
+    
+    def _migrate_anomaly_models(self, conn):
+        """Migration 6: key anomalies by (device_id, model, ts); existing scores go to DEFAULT_MODEL."""
+        conn.execute(_ANOMALIES_TABLE_SQL.replace('IF NOT EXISTS anomalies', 'anomalies_v6'))
+        conn.execute('''
+            INSERT INTO anomalies_v6
+                (id, device_id, ts, reading_id, score, is_anomaly, anomaly_type, severity, created_at)
+            SELECT id, device_id, ts, reading_id, score, is_anomaly, anomaly_type, severity, created_at
+            FROM anomalies
+        ''')
+        conn.execute('DROP TABLE anomalies')
+        conn.execute('ALTER TABLE anomalies_v6 RENAME TO anomalies')
+        conn.execute(_ANOMALIES_INDEX_SQL)
+    
+    def save_reading(self, temperature, humidity, pressure, timestamp=None, durability=None,
+                     device_id=DEFAULT_DEVICE):
         """
         Save a single sensor reading to the database.
         
@@ -85,27 +893,40 @@ class DatabaseManager:
             temperature (float): Temperature in Celsius
             humidity (float): Humidity percentage
             pressure (float): Pressure in hPa
-            timestamp (str): ISO format timestamp (defaults to now)
+            timestamp: ISO string, datetime or epoch microseconds (defaults to now)
+            durability (str): Override the manager's durability for this call
+            device_id (str): Device the reading came from
         
         Returns:
-            int: Reading ID if successful, None if duplicate timestamp
+            int: Reading ID if committed immediately, None if duplicate
+                timestamp or if the reading went through the write buffer
         """
-        if timestamp is None:
-            timestamp = datetime.now().isoformat()
+        ts = to_epoch_us(datetime.now() if timestamp is None else timestamp)
         
+        durability = durability or self.durability
+        if durability != 'immediate':
+            if self._writer is None:
+                raise ValueError("Buffered durability requires a manager created with durability='group' or 'buffered'")
+            self._writer.submit(
+                (device_id, ts, temperature, humidity, pressure),
+                wait=(durability == 'group')
+            )
+            return None
+        
+        conn = self.get_connection()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO readings (timestamp, temperature, humidity, pressure)
-                VALUES (?, ?, ?, ?)
-            ''', (timestamp, temperature, humidity, pressure))
-            
-            reading_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return reading_id
+            with _COMMIT_TIMERS['immediate'].time(), conn:
+                cursor = conn.execute('''
+                    INSERT INTO readings (device_id, ts, temperature, humidity, pressure)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (device_id, ts, temperature, humidity, pressure))
+                for granularity, width in ROLLUP_GRANULARITIES.items():
+                    conn.execute(_ROLLUP_UPSERT_SQL[granularity], (
+                        device_id, ts - ts % width, 1,
+                        *(x for v in (temperature, humidity, pressure) for x in (v, v, v, v * v))
+                    ))
+            _ROWS_COUNTERS['immediate'].inc()
+            return cursor.lastrowid
         
         except sqlite3.IntegrityError:
             # Duplicate timestamp
@@ -121,161 +942,385 @@ class DatabaseManager:
         Returns:
             int: Number of readings successfully saved
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return self.bulk_insert(df)['inserted']
+    
+    def bulk_insert(self, data, chunk_size=50000, device_id=DEFAULT_DEVICE):
+        """
+        Bulk-load readings with vectorized conversion and executemany.
         
-        count = 0
-        for _, row in df.iterrows():
-            try:
-                cursor.execute('''
-                    INSERT INTO readings (timestamp, temperature, humidity, pressure)
-                    VALUES (?, ?, ?, ?)
-                ''', (
-                    row['timestamp'].isoformat() if hasattr(row['timestamp'], 'isoformat') else str(row['timestamp']),
-                    row['temperature'],
-                    row['humidity'],
-                    row['pressure']
-                ))
-                count += 1
-            except sqlite3.IntegrityError:
-                # Skip duplicate timestamps
-                pass
+        Columns are converted once per chunk instead of once per row, and
+        duplicate timestamps are skipped by INSERT OR IGNORE rather than by
+        catching an exception per row. Each chunk is its own transaction.
         
-        conn.commit()
-        conn.close()
-        return count
+        Args:
+            data: pandas DataFrame, pyarrow Table, NumPy structured array or
+                dict of arrays with columns [timestamp, temperature, humidity, pressure]
+                and optionally device_id
+            chunk_size (int): Rows per executemany() call and transaction
+            device_id (str): Device for every row when data has no device_id column
+        
+        Returns:
+            dict: {'inserted': rows written, 'skipped': duplicates or invalid rows}
+        """
+        columns = _as_columns(data)
+        n = len(columns['timestamp'])
+        conn = self.get_connection()
+        
+        inserted = 0
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            batch = pd.DataFrame({
+                'device_id': (
+                    columns['device_id'][start:stop].astype(str)
+                    if 'device_id' in columns else device_id
+                ),
+                'ts': _epoch_us_array(columns['timestamp'][start:stop]),
+                **{m: np.asarray(columns[m][start:stop], dtype=float) for m in METRIC_COLUMNS}
+            })
+            
+            with _COMMIT_TIMERS['bulk'].time(), conn:
+                inserted += _insert_readings(conn, batch)
+        
+        _ROWS_COUNTERS['bulk'].inc(inserted)
+        return {'inserted': inserted, 'skipped': n - inserted}
     
-    def get_readings(self, limit=None, offset=0):
+    def get_readings(self, limit=None, offset=0, device_id=None):
         """
         Retrieve sensor readings from the database.
         
         Args:
             limit (int): Maximum number of readings to retrieve
             offset (int): Number of readings to skip
+            device_id (str): Only return this device's readings (None = all devices)
         
         Returns:
             DataFrame: DataFrame with all readings
         """
-        conn = sqlite3.connect(self.db_path)
+        where, params = self._device_filter(device_id)
         
-        if limit is None:
-            query = 'SELECT timestamp, temperature, humidity, pressure FROM readings ORDER BY timestamp DESC'
-            df = pd.read_sql_query(query, conn)
-        else:
-            query = f'SELECT timestamp, temperature, humidity, pressure FROM readings ORDER BY timestamp DESC LIMIT {limit} OFFSET {offset}'
-            df = pd.read_sql_query(query, conn)
+        self._sync_writes()
+        conn = self.get_connection()
         
-        conn.close()
+        # Newest first so LIMIT/OFFSET walk the index backwards
+        rows = conn.execute(f'''
+            SELECT ts, device_id, temperature, humidity, pressure
+            FROM readings
+            {where}
+            ORDER BY ts DESC
+            LIMIT ? OFFSET ?
+        ''', (*params, -1 if limit is None else int(limit), int(offset))).fetchall()
         
-        if not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp').reset_index(drop=True)
+        rows.reverse()
+        return _frame_from_rows(rows, ['ts', 'device_id', *METRIC_COLUMNS])
+    
+    def get_range(self, start=None, end=None, columns=None, device_id=None):
+        """
+        Get readings in the half-open time window [start, end).
         
-        return df
+        The window is served as a range scan over the (device_id, ts) index,
+        or the ts index across all devices, so the cost depends on the
+        number of rows returned, not the size of the table.
+        
+        Args:
+            start: Inclusive lower bound (datetime, ISO string or epoch microseconds), None for unbounded
+            end: Exclusive upper bound, None for unbounded
+            columns (list): Metric columns to return (defaults to all of METRIC_COLUMNS)
+            device_id (str): Only return this device's readings (None = all devices)
+        
+        Returns:
+            DataFrame: timestamp, device_id and the requested columns, oldest first
+        """
+        columns = list(columns or METRIC_COLUMNS)
+        unknown = set(columns) - set(METRIC_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        
+        conditions, params = [], []
+        if device_id is not None:
+            conditions.append('device_id = ?')
+            params.append(device_id)
+        if start is not None:
+            conditions.append('ts >= ?')
+            params.append(to_epoch_us(start))
+        if end is not None:
+            conditions.append('ts < ?')
+            params.append(to_epoch_us(end))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        self._sync_writes()
+        conn = self.get_connection()
+        rows = conn.execute(
+            f"SELECT ts, device_id, {', '.join(columns)} FROM readings {where} ORDER BY ts",
+            params
+        ).fetchall()
+        
+        return _frame_from_rows(rows, ['ts', 'device_id', *columns])
     
-    def get_readings_since(self, hours=1):
+    def get_inserted_after(self, after_id, device_id=None, start=None, limit=None):
         """
-        Get all readings from the last N hours.
+        Get readings inserted after a given row id, in insertion order.
+        
+        Row ids only grow, so following them sees every new reading exactly
+        once, including readings inserted late with an earlier timestamp.
         
         Args:
-            hours (int): Number of hours to look back
+            after_id (int): Return readings with a larger id (e.g. a
+                previous data_version())
+            device_id (str): Only return this device's readings (None = all devices)
+            start: Only readings at or after this time (None = any time)
+            limit (int): Maximum number of readings (None = all)
         
         Returns:
-            DataFrame: Readings from the specified time period
+            DataFrame: timestamp, id, device_id and the metric columns,
+                in id order
         """
-        conn = sqlite3.connect(self.db_path)
+        conditions, params = ['id > ?'], [int(after_id)]
+        if device_id is not None:
+            conditions.append('device_id = ?')
+            params.append(device_id)
+        if start is not None:
+            conditions.append('ts >= ?')
+            params.append(to_epoch_us(start))
         
-        query = '''
-            SELECT timestamp, temperature, humidity, pressure 
-            FROM readings 
-            WHERE datetime(timestamp) >= datetime('now', ? || ' hours')
-            ORDER BY timestamp
-        '''
+        self._sync_writes()
+        conn = self.get_connection()
+        rows = conn.execute(f'''
+            SELECT ts, id, device_id, {', '.join(METRIC_COLUMNS)}
+            FROM readings
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id
+            LIMIT ?
+        ''', (*params, -1 if limit is None else int(limit))).fetchall()
         
-        df = pd.read_sql_query(query, conn, params=(-hours,))
-        conn.close()
+        return _frame_from_rows(rows, ['ts', 'id', 'device_id', *METRIC_COLUMNS])
+    
+    def get_readings_since(self, hours=1, device_id=None):
+        """
+        Get all readings from the last N hours.
         
-        if not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        Args:
+            hours (int): Number of hours to look back
+            device_id (str): Only return this device's readings (None = all devices)
         
-        return df
+        Returns:
+            DataFrame: Readings from the specified time period
+        """
+        return self.get_range(start=datetime.now() - timedelta(hours=hours), device_id=device_id)
     
-    def get_latest_reading(self):
+    def get_latest_reading(self, device_id=None):
         """
         Get the most recent sensor reading.
         
+        Args:
+            device_id (str): Latest reading of this device (None = any device)
+        
         Returns:
             dict: Latest reading or None if no data exists
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        where, params = self._device_filter(device_id)
         
-        cursor.execute('''
-            SELECT timestamp, temperature, humidity, pressure 
+        self._sync_writes()
+        conn = self.get_connection()
+        
+        row = conn.execute(f'''
+            SELECT ts, device_id, temperature, humidity, pressure 
             FROM readings 
-            ORDER BY timestamp DESC 
+            {where}
+            ORDER BY ts DESC 
             LIMIT 1
-        ''')
-        
-        row = cursor.fetchone()
-        conn.close()
+        ''', params).fetchone()
         
         if row:
             return {
-                'timestamp': row[0],
-                'temperature': row[1],
-                'humidity': row[2],
-                'pressure': row[3]
+                'timestamp': from_epoch_us(row[0]).isoformat(),
+                'device_id': row[1],
+                'temperature': row[2],
+                'humidity': row[3],
+                'pressure': row[4]
             }
         return None
     
-    def save_anomaly(self, reading_id, timestamp, anomaly_type='unknown', severity=1.0):
+    def get_devices(self):
+        """
+        List the devices that have stored readings.
+        
+        Read from the daily rollups (one row per device-day, walked in
+        primary-key order) rather than the readings table, so the cost
+        doesn't grow with the number of readings. Devices whose raw
+        readings were all purged by clear_old_data() are still listed.
+        
+        Returns:
+            list: Sorted device ids
+        """
+        self._sync_writes()
+        conn = self.get_connection()
+        rows = conn.execute('SELECT DISTINCT device_id FROM readings_1d ORDER BY device_id').fetchall()
+        return [row[0] for row in rows]
+    
+    def data_version(self):
+        """
+        Cheap change marker for caches built on top of the readings table.
+        
+        The value grows whenever a reading is inserted (it is the largest
+        row id, an O(1) lookup), so it can key cached query results that
+        must be refreshed once new data arrives.
+        
+        Returns:
+            int: Current data version (0 for an empty table)
+        """
+        self._sync_writes()
+        conn = self.get_connection()
+        return conn.execute('SELECT MAX(id) FROM readings').fetchone()[0] or 0
+    
+    @staticmethod
+    def _device_filter(device_id):
+        """Build an optional WHERE clause restricting a query to one device."""
+        if device_id is None:
+            return '', ()
+        return 'WHERE device_id = ?', (device_id,)
+    
+    @staticmethod
+    def _anomaly_filter(device_id, model):
+        """Build a WHERE clause selecting one model's flagged readings, optionally of one device."""
+        if device_id is None:
+            return 'WHERE model = ? AND is_anomaly = 1', (model,)
+        return 'WHERE device_id = ? AND model = ? AND is_anomaly = 1', (device_id, model)
+    
+    def save_anomaly(self, reading_id, timestamp, anomaly_type='unknown', severity=1.0, model=DEFAULT_MODEL):
         """
         Save detected anomaly to database.
         
+        The reading is flagged with severity as its score, replacing any
+        score already stored for it.
+        
         Args:
             reading_id (int): ID of the reading with anomaly
             timestamp (str): Timestamp of the anomaly
             anomaly_type (str): Type of anomaly detected
             severity (float): Severity score 0-1
+            model (str): Model configuration the score belongs to
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self.get_connection()
+        row = conn.execute('SELECT device_id FROM readings WHERE id = ?', (reading_id,)).fetchone()
+        device_id = row[0] if row else DEFAULT_DEVICE
         
-        cursor.execute('''
-            INSERT INTO anomalies (reading_id, timestamp, anomaly_type, severity)
-            VALUES (?, ?, ?, ?)
-        ''', (reading_id, timestamp, anomaly_type, severity))
+        with conn:
+            conn.execute('''
+                INSERT INTO anomalies (device_id, model, ts, reading_id, score, is_anomaly, anomaly_type, severity)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT (device_id, model, ts) DO UPDATE SET
+                    reading_id = excluded.reading_id, score = excluded.score, is_anomaly = 1,
+                    anomaly_type = excluded.anomaly_type, severity = excluded.severity
+            ''', (device_id, model, to_epoch_us(timestamp), reading_id, severity, anomaly_type, severity))
+    
+    def save_scores(self, scores, device_id=DEFAULT_DEVICE, overwrite=True, model=DEFAULT_MODEL):
+        """
+        Store anomaly scores, one per reading, in a single transaction.
         
-        conn.commit()
-        conn.close()
+        Args:
+            scores (DataFrame): Columns timestamp, score, is_anomaly and
+                optionally device_id (else the device_id argument is used)
+            device_id (str): Device for rows without a device_id column
+            overwrite (bool): Replace scores already stored for the same
+                readings (False keeps the existing ones)
+            model (str): Model configuration that produced the scores;
+                each one keeps its own score per reading
+        
+        Returns:
+            int: Number of scores written
+        """
+        if len(scores) == 0:
+            return 0
+        
+        devices = (
+            scores['device_id'].astype(str).tolist()
+            if 'device_id' in scores.columns else repeat(device_id)
+        )
+        rows = zip(
+            devices,
+            repeat(model),
+            _epoch_us_array(scores['timestamp']).tolist(),
+            scores['score'].astype(float).tolist(),
+            scores['is_anomaly'].astype(int).tolist(),
+        )
+        
+        if overwrite:
+            sql = 'INSERT' + _SCORE_VALUES_SQL + _ON_SCORE_CONFLICT_SQL
+        else:
+            sql = 'INSERT OR IGNORE' + _SCORE_VALUES_SQL
+        
+        conn = self.get_connection()
+        with conn:
+            return conn.executemany(sql, rows).rowcount
     
-    def get_anomalies(self, limit=100):
+    def get_scores(self, start=None, end=None, device_id=None, only_anomalies=False, limit=None,
+                   model=DEFAULT_MODEL):
         """
-        Get recent anomalies.
+        Get stored anomaly scores in the half-open time window [start, end).
         
         Args:
-            limit (int): Maximum number of anomalies to retrieve
+            start: Inclusive lower bound (datetime, ISO string or epoch microseconds), None for unbounded
+            end: Exclusive upper bound, None for unbounded
+            device_id (str): Only this device's scores (None = all devices)
+            only_anomalies (bool): Only readings flagged as anomalous
+            limit (int): Keep only the newest `limit` rows
+            model (str): Model configuration whose scores to return
         
         Returns:
-            DataFrame: Recent anomalies
+            DataFrame: timestamp, device_id, score and is_anomaly, oldest first
         """
-        conn = sqlite3.connect(self.db_path)
+        clauses, params = ['model = ?'], [model]
+        if device_id is not None:
+            clauses.append('device_id = ?')
+            params.append(device_id)
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(to_epoch_us(start))
+        if end is not None:
+            clauses.append('ts < ?')
+            params.append(to_epoch_us(end))
+        if only_anomalies:
+            clauses.append('is_anomaly = 1')
+        where = f"WHERE {' AND '.join(clauses)}"
         
-        query = '''
-            SELECT timestamp, anomaly_type, severity 
-            FROM anomalies 
-            ORDER BY timestamp DESC 
+        conn = self.get_connection()
+        rows = conn.execute(f'''
+            SELECT ts, device_id, score, is_anomaly
+            FROM anomalies
+            {where}
+            ORDER BY ts DESC
             LIMIT ?
-        '''
+        ''', (*params, -1 if limit is None else int(limit))).fetchall()
         
-        df = pd.read_sql_query(query, conn, params=(limit,))
-        conn.close()
+        rows.reverse()
+        df = _frame_from_rows(rows, ['ts', 'device_id', 'score', 'is_anomaly'])
+        df['is_anomaly'] = df['is_anomaly'].astype(bool)
+        return df
+    
+    def get_anomalies(self, limit=100, device_id=None, model=DEFAULT_MODEL):
+        """
+        Get recent anomalies.
         
-        if not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        Args:
+            limit (int): Maximum number of anomalies to retrieve
+            device_id (str): Only this device's anomalies (None = all devices)
+            model (str): Model configuration whose anomalies to return
         
-        return df
+        Returns:
+            DataFrame: Recent anomalies, newest first
+        """
+        where, params = self._anomaly_filter(device_id, model)
+        conn = self.get_connection()
+        
+        rows = conn.execute(f'''
+            SELECT ts, device_id, anomaly_type, severity, score
+            FROM anomalies
+            {where}
+            ORDER BY ts DESC
+            LIMIT ?
+        ''', (*params, int(limit))).fetchall()
+        
+        return _frame_from_rows(rows, ['ts', 'device_id', 'anomaly_type', 'severity', 'score'])
     
     def save_prediction(self, timestamp, metric, prediction_value, steps_ahead=5, model_type='linear'):
         """
@@ -288,83 +1333,164 @@ class DatabaseManager:
             steps_ahead (int): Steps predicted ahead
             model_type (str): Type of model used (linear, lstm, etc)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self.get_connection()
         
-        cursor.execute('''
-            INSERT INTO predictions (timestamp, metric, prediction_value, steps_ahead, model_type)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (timestamp, metric, prediction_value, steps_ahead, model_type))
+        with conn:
+            conn.execute('''
+                INSERT INTO predictions (timestamp, metric, prediction_value, steps_ahead, model_type)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (timestamp, metric, prediction_value, steps_ahead, model_type))
+    
+    def get_rollup(self, granularity='1h', start=None, end=None, device_id=None, columns=None):
+        """
+        Get downsampled statistics from a rollup table.
         
-        conn.commit()
-        conn.close()
+        Args:
+            granularity (str): Bucket size, one of ROLLUP_GRANULARITIES ('1m', '1h', '1d')
+            start: Inclusive lower bound on bucket start, None for unbounded
+            end: Exclusive upper bound on bucket start, None for unbounded
+            device_id (str): Only this device's buckets (None = buckets merged across devices)
+            columns (list): Metric columns to summarize (defaults to all of METRIC_COLUMNS)
+        
+        Returns:
+            DataFrame: One row per bucket with timestamp, count and
+                <metric>_min/_max/_mean/_std columns, oldest first
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"granularity must be one of {list(ROLLUP_GRANULARITIES)}")
+        columns = list(columns or METRIC_COLUMNS)
+        unknown = set(columns) - set(METRIC_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        
+        conditions, params = [], []
+        if device_id is not None:
+            conditions.append('device_id = ?')
+            params.append(device_id)
+        if start is not None:
+            conditions.append('bucket >= ?')
+            params.append(to_epoch_us(start))
+        if end is not None:
+            conditions.append('bucket < ?')
+            params.append(to_epoch_us(end))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        aggregates = ', '.join(
+            f'MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_sumsq)' for m in columns
+        )
+        
+        self._sync_writes()
+        conn = self.get_connection()
+        rows = conn.execute(f'''
+            SELECT bucket, SUM(count), {aggregates}
+            FROM readings_{granularity}
+            {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', params).fetchall()
+        
+        raw = np.array(rows, dtype=float).reshape(len(rows), 2 + 4 * len(columns))
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(raw[:, 0].astype(np.int64), unit='us'),
+            'count': raw[:, 1].astype(np.int64)
+        })
+        for i, metric in enumerate(columns):
+            low, high, total, sumsq = raw[:, 2 + 4 * i: 6 + 4 * i].T
+            mean, std = _rollup_moments(raw[:, 1], total, sumsq)
+            df[f'{metric}_min'] = low
+            df[f'{metric}_max'] = high
+            df[f'{metric}_mean'] = mean
+            df[f'{metric}_std'] = std
+        return df
+    
+    def get_summary(self, device_id=None):
+        """
+        Summarize all ingested history from the daily rollups.
+        
+        Reads one row per device-day instead of scanning readings, so the
+        cost doesn't grow with the number of stored readings.
+        
+        Args:
+            device_id (str): Restrict to one device (None = all devices)
+        
+        Returns:
+            DataFrame: count, mean, std, min and max (rows) for each metric (columns)
+        """
+        where, params = self._device_filter(device_id)
+        aggregates = ', '.join(
+            f'MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_sumsq)' for m in METRIC_COLUMNS
+        )
+        
+        self._sync_writes()
+        conn = self.get_connection()
+        row = conn.execute(
+            f'SELECT COALESCE(SUM(count), 0), {aggregates} FROM readings_1d {where}', params
+        ).fetchone()
+        
+        count = row[0]
+        summary = {}
+        for i, metric in enumerate(METRIC_COLUMNS):
+            low, high, total, sumsq = row[1 + 4 * i: 5 + 4 * i]
+            mean, std = _rollup_moments([count], [total or 0.0], [sumsq or 0.0])
+            summary[metric] = [count, mean[0], std[0], low, high]
+        return pd.DataFrame(summary, index=['count', 'mean', 'std', 'min', 'max'])
     
-    def get_stats(self):
+    def get_stats(self, device_id=None, model=DEFAULT_MODEL):
         """
         Get statistics about stored data.
         
+        Statistics come from the rollup tables, so they cover all ingested
+        history, including readings already purged by clear_old_data().
+        
+        Args:
+            device_id (str): Restrict reading statistics to one device (None = all devices)
+            model (str): Model configuration whose anomalies are counted
+        
         Returns:
             dict: Statistics including count, temperature range, etc
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM readings')
-        count = cursor.fetchone()[0]
+        summary = self.get_summary(device_id=device_id)
+        count = int(summary.loc['count', 'temperature'])
         
         if count > 0:
-            cursor.execute('''
-                SELECT 
-                    MIN(temperature) as temp_min,
-                    MAX(temperature) as temp_max,
-                    AVG(temperature) as temp_avg,
-                    MIN(humidity) as humidity_min,
-                    MAX(humidity) as humidity_max,
-                    AVG(humidity) as humidity_avg
-                FROM readings
-            ''')
-            stats_row = cursor.fetchone()
-            
-            cursor.execute('SELECT COUNT(*) FROM anomalies')
-            anomaly_count = cursor.fetchone()[0]
+            conn = self.get_connection()
+            where, params = self._anomaly_filter(device_id, model)
+            anomaly_count = conn.execute(f'SELECT COUNT(*) FROM anomalies {where}', params).fetchone()[0]
             
-            conn.close()
-            
-            return {
-                'total_readings': count,
-                'anomalies_detected': anomaly_count,
-                'temperature_range': (stats_row[0], stats_row[1]),
-                'temperature_avg': stats_row[2],
-                'humidity_range': (stats_row[3], stats_row[4]),
-                'humidity_avg': stats_row[5]
-            }
+            stats = {'total_readings': count, 'anomalies_detected': anomaly_count}
+            for metric in METRIC_COLUMNS:
+                stats[f'{metric}_range'] = (
+                    float(summary.loc['min', metric]),
+                    float(summary.loc['max', metric])
+                )
+                stats[f'{metric}_avg'] = float(summary.loc['mean', metric])
+            return stats
         
-        conn.close()
         return {'total_readings': 0}
     
-    def clear_old_data(self, days=30):
+    def clear_old_data(self, days=30, device_id=None):
         """
         Delete readings older than specified days.
         
         Args:
             days (int): Number of days to keep
+            device_id (str): Only purge this device's readings (None = all devices)
         
         Returns:
             int: Number of rows deleted
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self._sync_writes()
+        conn = self.get_connection()
         
-        cursor.execute('''
-            DELETE FROM readings 
-            WHERE datetime(timestamp) < datetime('now', ? || ' days')
-        ''', (-days,))
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        query, params = 'DELETE FROM readings WHERE ts < ?', [to_epoch_us(datetime.now() - timedelta(days=days))]
+        if device_id is not None:
+            query += ' AND device_id = ?'
+            params.append(device_id)
+        with conn:
+            cursor = conn.execute(query, params)
+            # Scores of purged readings go with them
+            conn.execute(query.replace('readings', 'anomalies', 1), params)
         
-        return deleted_count
+        return cursor.rowcount
 
 
 if __name__ == "__main__":
@@ -383,3 +1509,5 @@ if __name__ == "__main__":
     # Get stats
     stats = db.get_stats()
     print(f"✓ Database stats: {stats}")
+    
+    db.close()
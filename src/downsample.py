@@ -0,0 +1,223 @@
+"""
+Visual Downsampling
+Reduces time series to a few thousand points before they are sent to the
+browser, keeping the shape a chart would show.
+
+Features:
+- Largest-Triangle-Three-Buckets (LTTB): keeps the visually significant points
+- Min/max bucketing: keeps every bucket's extremes, so spikes never vanish
+- Rollup-backed history: long ranges are read from the pre-aggregated
+  1m/1h/1d tables instead of raw readings
+- Server-side histograms: only bin counts reach the browser
+"""
+
+import numpy as np
+import pandas as pd
+
+from database import METRIC_COLUMNS, ROLLUP_GRANULARITIES, to_epoch_us
+
+# Points per chart trace the dashboard renders comfortably
+MAX_POINTS = 2000
+
+
+def _as_float(x):
+    """Numeric x positions; datetimes become epoch microseconds."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[us]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, n_out=MAX_POINTS):
+    """
+    Pick points with Largest-Triangle-Three-Buckets.
+    
+    The first and last points are kept; every bucket in between contributes
+    the point forming the largest triangle with the previously kept point
+    and the average of the next bucket.
+    
+    Args:
+        x (array-like): Increasing x positions (numbers or datetimes)
+        y (array-like): Values
+        n_out (int): Number of points to keep
+    
+    Returns:
+        ndarray: Sorted indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    
+    # Bucket i covers [edges[i], edges[i + 1]) over the points between the ends
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / counts
+    avg_y = np.add.reduceat(y, edges) / counts
+    
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Twice the triangle area for every candidate in the bucket
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax_indices(y, n_out=MAX_POINTS):
+    """
+    Keep the minimum and maximum of each of n_out / 2 equal buckets.
+    
+    Args:
+        y (array-like): Values
+        n_out (int): Approximate number of points to keep
+    
+    Returns:
+        ndarray: Sorted, unique indices (first and last point included)
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    
+    size = -(-n // (n_out // 2))  # ceil division
+    padded = np.full(size * (-(-n // size)), np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(-1, size)
+    offsets = np.arange(len(buckets)) * size
+    
+    valid = ~np.isnan(buckets).all(axis=1)
+    filled_low = np.where(np.isnan(buckets), np.inf, buckets)
+    filled_high = np.where(np.isnan(buckets), -np.inf, buckets)
+    lows = offsets[valid] + filled_low[valid].argmin(axis=1)
+    highs = offsets[valid] + filled_high[valid].argmax(axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(x, y, n_out=MAX_POINTS, method='lttb'):
+    """
+    Downsample one trace.
+    
+    Args:
+        x (array-like): x positions
+        y (array-like): Values
+        n_out (int): Points to keep
+        method (str): 'lttb' or 'minmax'
+    
+    Returns:
+        tuple: (x, y) arrays with at most about n_out points
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == 'lttb':
+        keep = lttb_indices(x, y, n_out)
+    elif method == 'minmax':
+        keep = minmax_indices(y, n_out)
+    else:
+        raise ValueError("method must be 'lttb' or 'minmax'")
+    return x[keep], y[keep]
+
+
+def downsample_frame(data, columns=METRIC_COLUMNS, n_out=MAX_POINTS, method='lttb', x='timestamp'):
+    """
+    Downsample every metric of a readings frame, each as its own trace.
+    
+    Args:
+        data (DataFrame): Readings, oldest first
+        columns (tuple): Metric columns to downsample
+        n_out (int): Points to keep per trace
+        method (str): 'lttb' or 'minmax'
+        x (str): Column holding the x positions
+    
+    Returns:
+        dict: Column -> (x, y) arrays
+    """
+    x_values = data[x].to_numpy()
+    return {
+        column: downsample(x_values, data[column].to_numpy(), n_out, method)
+        for column in columns
+    }
+
+
+def load_history(db, device_id=None, start=None, end=None, max_points=MAX_POINTS,
+                 columns=METRIC_COLUMNS):
+    """
+    Readings over a time range at a resolution suited to plotting.
+    
+    Uses the finest rollup table whose bucket count over the range fits in
+    max_points. If the range holds no more than max_points readings, the
+    raw readings are returned instead. If even the daily rollup is too
+    dense, its means are LTTB-downsampled.
+    
+    Args:
+        db (DatabaseManager): Database to read from
+        device_id (str): Device to plot (None = all devices merged)
+        start: Inclusive lower bound (None = first reading)
+        end: Exclusive upper bound (None = after the last reading)
+        max_points (int): Target points per trace
+        columns (tuple): Metric columns
+    
+    Returns:
+        tuple: (DataFrame with timestamp and one column per metric, plus
+            <metric>_min/<metric>_max envelopes when read from a rollup;
+            source label: 'raw' or the rollup granularity)
+    """
+    daily = db.get_rollup('1d', start=start, end=end, device_id=device_id, columns=columns)
+    if len(daily) == 0:
+        return pd.DataFrame(columns=['timestamp', *columns]), 'raw'
+    
+    if daily['count'].sum() <= max_points:
+        raw = db.get_range(start=start, end=end, columns=columns, device_id=device_id)
+        return raw.drop(columns='device_id'), 'raw'
+    
+    first_us = to_epoch_us(daily['timestamp'].iloc[0]) if start is None else to_epoch_us(start)
+    last_us = (to_epoch_us(daily['timestamp'].iloc[-1]) + ROLLUP_GRANULARITIES['1d']
+               if end is None else to_epoch_us(end))
+    span_us = max(last_us - first_us, 1)
+    
+    # Granularities finest first
+    granularity = '1d'
+    for name, width_us in sorted(ROLLUP_GRANULARITIES.items(), key=lambda item: item[1]):
+        if span_us / width_us <= max_points:
+            granularity = name
+            break
+    
+    rollup = daily if granularity == '1d' else db.get_rollup(
+        granularity, start=start, end=end, device_id=device_id, columns=columns
+    )
+    series = pd.DataFrame({'timestamp': rollup['timestamp']})
+    for column in columns:
+        series[column] = rollup[f'{column}_mean']
+        series[f'{column}_min'] = rollup[f'{column}_min']
+        series[f'{column}_max'] = rollup[f'{column}_max']
+    
+    if len(series) > max_points:
+        keep = lttb_indices(series['timestamp'].to_numpy(), series[columns[0]].to_numpy(), max_points)
+        series = series.iloc[keep].reset_index(drop=True)
+    return series, granularity
+
+
+def histogram(values, bins=20):
+    """
+    Bin counts computed server-side, so only `bins` bars reach the browser.
+    
+    Args:
+        values (array-like): Values to bin (NaNs are ignored)
+        bins (int): Number of bins
+    
+    Returns:
+        tuple: (bin centers, bin widths, counts)
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    return (edges[:-1] + edges[1:]) / 2, np.diff(edges), counts
@@ -0,0 +1,116 @@
+"""
+Live Feed
+Background producer that keeps adding readings at a fixed interval, so the
+dashboard can run as a wallboard instead of waiting for button clicks.
+
+One producer per device is shared by every viewer. Readings go to the
+source's database and ring buffer; dashboards pick them up by polling
+DatabaseManager.data_version() at their own refresh rate.
+"""
+
+import threading
+import time
+import warnings
+
+from metrics import timer
+
+_INGEST_TIMER = timer('live_ingest_seconds', 'Time to produce and store one live reading')
+
+
+class LiveProducer:
+    """
+    Daemon thread calling source.get_next_reading() every `interval` seconds.
+    
+    The producer stops by itself once no viewer has called touch() for
+    `idle_timeout` seconds, so a closed browser tab doesn't keep filling
+    the database. Anything else driving the same source (initialization,
+    manual readings) should hold `lock` while doing so.
+    """
+    
+    def __init__(self, source, interval=1.0, idle_timeout=60.0, **reading_kwargs):
+        """
+        Initialize a stopped producer.
+        
+        Args:
+            source: Object with get_next_reading() and a db (SensorSimulator,
+                WeatherAPIProvider)
+            interval (float): Seconds between readings
+            idle_timeout (float): Seconds without touch() before stopping
+                (None = never stop on its own)
+            **reading_kwargs: Passed to get_next_reading (e.g. anomaly_probability)
+        """
+        self.source = source
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.reading_kwargs = reading_kwargs
+        self.produced = 0
+        self.lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_touch = time.monotonic()
+    
+    @property
+    def running(self):
+        """True while the producer thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def touch(self):
+        """Record that a viewer is still watching."""
+        self._last_touch = time.monotonic()
+    
+    def start(self, interval=None, **reading_kwargs):
+        """
+        Start producing, or update the settings of a running producer.
+        
+        Args:
+            interval (float): New seconds between readings (None = keep)
+            **reading_kwargs: Updated get_next_reading arguments
+        """
+        if interval is not None:
+            self.interval = interval
+        self.reading_kwargs.update(reading_kwargs)
+        self.touch()
+        with self.lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"live-producer-{getattr(self.source, 'device_id', '')}",
+                daemon=True
+            )
+            self._thread.start()
+    
+    def stop(self, timeout=None):
+        """
+        Stop producing and wait for the current reading to finish.
+        
+        Args:
+            timeout (float): Seconds to wait for the thread (None = no limit)
+        """
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+    
+    def _idle(self):
+        return self.idle_timeout is not None and time.monotonic() - self._last_touch > self.idle_timeout
+    
+    def _run(self):
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            if self._idle():
+                break
+            try:
+                with self.lock, _INGEST_TIMER.time():
+                    self.source.get_next_reading(**self.reading_kwargs)
+                    # Buffered writes become visible to readers right away
+                    self.source.db.flush()
+                self.produced += 1
+            except Exception as e:
+                warnings.warn(f"Live producer failed to add a reading: {e}")
+            
+            # Fixed rate: a slow reading shortens the next wait instead of
+            # adding to it
+            next_at = max(next_at + self.interval, time.monotonic())
+            self._stop.wait(next_at - time.monotonic())
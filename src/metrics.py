@@ -0,0 +1,340 @@
+"""
+Metrics
+In-process counters and timers for the hot paths, with a Prometheus
+text-format endpoint.
+
+Features:
+- Counters and timers (histograms of durations), optionally labelled
+- One process-wide registry (REGISTRY) shared by every module
+- /metrics HTTP endpoint in a background thread, for Prometheus scraping
+- Near-zero cost when disabled: every call returns after one flag check
+
+Metrics are on by default; set MONITORING_METRICS=0 to disable them, or
+call REGISTRY.set_enabled(False).
+
+Usage:
+    from metrics import counter, timer, timed
+    
+    with timer('db_commit_seconds', 'Write-buffer commit time').time():
+        ...
+    counter('weather_cache_hits_total', 'Cached API responses served').inc()
+    
+    @timed('model_train_seconds', 'Model training time')
+    def train(...):
+        ...
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the timer histogram buckets; hot paths take
+# microseconds to milliseconds, training and full scans up to seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class _NoopTiming:
+    """Context manager returned by Timer.time() while metrics are disabled."""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_TIMING = _NoopTiming()
+
+
+class Counter:
+    """Monotonically increasing count."""
+    
+    def __init__(self, registry):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.value = 0
+    
+    def inc(self, amount=1):
+        """Add amount (default 1) to the counter."""
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+    
+    def reset(self):
+        with self._lock:
+            self.value = 0
+    
+    def snapshot(self):
+        return {'value': self.value}
+
+
+class _Timing:
+    __slots__ = ('timer', 'start')
+    
+    def __init__(self, timer):
+        self.timer = timer
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Timer:
+    """Histogram of durations in seconds, with count, sum and maximum."""
+    
+    def __init__(self, registry, buckets=DEFAULT_BUCKETS):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds):
+        """Record one duration."""
+        if not self._registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+    
+    def time(self):
+        """
+        Context manager timing its block.
+        
+        Returns:
+            Context manager (a shared no-op one while metrics are disabled)
+        """
+        if not self._registry.enabled:
+            return _NOOP_TIMING
+        return _Timing(self)
+    
+    def reset(self):
+        with self._lock:
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'sum': self.sum,
+                'max': self.max,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'buckets': list(zip(self.buckets + (float('inf'),), self.bucket_counts)),
+            }
+
+
+class MetricsRegistry:
+    """
+    Named metric families, each holding one metric per label set.
+    """
+    
+    def __init__(self, enabled=True):
+        """
+        Initialize an empty registry.
+        
+        Args:
+            enabled (bool): Record observations (False = every call is a no-op)
+        """
+        self.enabled = enabled
+        self._families = {}
+        self._lock = threading.Lock()
+    
+    def set_enabled(self, enabled):
+        """Turn recording on or off; values recorded so far are kept."""
+        self.enabled = bool(enabled)
+    
+    def _get(self, kind, name, help_text, labels):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is None or key not in family['metrics']:
+            with self._lock:
+                family = self._families.setdefault(name, {'type': kind, 'help': help_text, 'metrics': {}})
+                if family['type'] != kind:
+                    raise ValueError(f"Metric {name} is already registered as a {family['type']}")
+                if key not in family['metrics']:
+                    family['metrics'][key] = Counter(self) if kind == 'counter' else Timer(self)
+                if help_text and not family['help']:
+                    family['help'] = help_text
+        return family['metrics'][key]
+    
+    def counter(self, name, help_text='', **labels):
+        """
+        Get or create a counter.
+        
+        Args:
+            name (str): Metric name (by convention ending in _total)
+            help_text (str): Description shown by the endpoint
+            **labels: Label values distinguishing this counter within its family
+        
+        Returns:
+            Counter: The counter
+        """
+        return self._get('counter', name, help_text, labels)
+    
+    def timer(self, name, help_text='', **labels):
+        """
+        Get or create a timer.
+        
+        Args:
+            name (str): Metric name (by convention ending in _seconds)
+            help_text (str): Description shown by the endpoint
+            **labels: Label values distinguishing this timer within its family
+        
+        Returns:
+            Timer: The timer
+        """
+        return self._get('timer', name, help_text, labels)
+    
+    def reset(self):
+        """Zero every metric (metrics stay registered, so handles held by modules keep working)."""
+        with self._lock:
+            metrics = [metric for family in self._families.values() for metric in family['metrics'].values()]
+        for metric in metrics:
+            metric.reset()
+    
+    def snapshot(self):
+        """
+        Current values of every metric.
+        
+        Returns:
+            list: One dict per metric with name, type, labels and its values
+        """
+        with self._lock:
+            families = [(name, dict(family), dict(family['metrics'])) for name, family in self._families.items()]
+        rows = []
+        for name, family, metrics in sorted(families, key=lambda item: item[0]):
+            for key, metric in metrics.items():
+                rows.append({'name': name, 'type': family['type'], 'labels': dict(key), **metric.snapshot()})
+        return rows
+    
+    def render_prometheus(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        
+        Returns:
+            str: Exposition text; timers are rendered as histograms
+        """
+        lines = []
+        last_name = None
+        for row in self.snapshot():
+            name = row['name']
+            if name != last_name:
+                family = self._families[name]
+                if family['help']:
+                    lines.append(f"# HELP {name} {family['help']}")
+                lines.append(f"# TYPE {name} {'counter' if row['type'] == 'counter' else 'histogram'}")
+                last_name = name
+            labels = row['labels']
+            if row['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(labels)} {row['value']}")
+                continue
+            cumulative = 0
+            for bound, count in row['buckets']:
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {row['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {row['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+# Process-wide registry used by every module
+REGISTRY = MetricsRegistry(enabled=os.environ.get('MONITORING_METRICS', '1') != '0')
+
+
+def counter(name, help_text='', **labels):
+    """Counter in the process-wide registry, see MetricsRegistry.counter."""
+    return REGISTRY.counter(name, help_text, **labels)
+
+
+def timer(name, help_text='', **labels):
+    """Timer in the process-wide registry, see MetricsRegistry.timer."""
+    return REGISTRY.timer(name, help_text, **labels)
+
+
+def timed(name, help_text='', **labels):
+    """
+    Decorator timing every call of a function with a process-wide timer.
+    
+    Args:
+        name (str): Timer name
+        help_text (str): Description shown by the endpoint
+        **labels: Label values of the timer
+    """
+    def decorator(function):
+        metric = timer(name, help_text, **labels)
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def start_http_server(port=9464, host='127.0.0.1', registry=None):
+    """
+    Serve /metrics in a daemon thread.
+    
+    Args:
+        port (int): Port to listen on (0 = any free port)
+        host (str): Interface to bind (localhost only by default)
+        registry (MetricsRegistry): Registry to expose (None = REGISTRY)
+    
+    Returns:
+        ThreadingHTTPServer: The running server (server_address holds the
+            bound port; call shutdown() to stop it)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    registry = registry or REGISTRY
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -4,26 +4,556 @@ This module provides AI-powered predictions and anomaly detection capabilities.
 
 Features:
 - Isolation Forest for unsupervised anomaly detection
-- Linear Regression for traditional trend prediction
+- Streaming EWMA control limits for constant-cost online anomaly detection
+- Closed-form rolling linear trend (or scikit-learn Linear Regression) for trend prediction
 - LSTM neural network for advanced time-series forecasting
+
+TensorFlow and scikit-learn are imported on first use, so importing this
+module (and starting the dashboard) stays cheap when they aren't needed.
 """
 
+import importlib.util
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
-from sklearn.linear_model import LinearRegression
 import warnings
 
-try:
+from metrics import counter, timed
+
+# Checked without importing: TensorFlow alone takes seconds to load
+TENSORFLOW_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+
+
+def _tensorflow():
+    """Import TensorFlow on first use."""
     import tensorflow as tf
-    from tensorflow import keras
-    from tensorflow.keras.models import Sequential
-    from tensorflow.keras.layers import LSTM, Dense, Dropout
-    TENSORFLOW_AVAILABLE = True
-except ImportError:
-    TENSORFLOW_AVAILABLE = False
-    warnings.warn("TensorFlow not installed. LSTM model will be unavailable.")
+    return tf
+
+
+METRICS = ('temperature', 'humidity', 'pressure')
+
+_INGESTED = counter('model_ingested_readings_total', 'Readings scored and folded into a model by ingest()')
+
+# Physically plausible range each forecast is clipped to, in METRICS order
+CLIP_BOUNDS = {
+    'temperature': (-10, 50),
+    'humidity': (0, 100),
+    'pressure': (950, 1050),
+}
+_CLIP_LOW, _CLIP_HIGH = np.array([CLIP_BOUNDS[m] for m in METRICS], dtype=float).T
+
+
+def score_key(contamination, anomaly_mode):
+    """Name under which the anomaly scores of a model configuration are stored."""
+    return f"{anomaly_mode}-{contamination:g}"
+
+
+def forecast_linear(slopes, intercepts, start, steps_ahead):
+    """
+    Evaluate linear forecasts for any number of models in one array operation.
+    
+    Args:
+        slopes (ndarray): Shape (..., n_metrics)
+        intercepts (ndarray): Shape (..., n_metrics)
+        start (int or ndarray): x of the first forecast step, scalar or shape (...)
+        steps_ahead (int): Number of future steps
+    
+    Returns:
+        ndarray: Shape (..., n_metrics, steps_ahead), clipped to CLIP_BOUNDS
+            and rounded to 2 decimals
+    """
+    x = np.asarray(start, dtype=float)[..., None] + np.arange(steps_ahead)
+    return _clip_forecast(intercepts[..., None] + slopes[..., None] * x[..., None, :])
+
+
+def _clip_forecast(values):
+    """Clip (..., n_metrics, steps) forecasts to CLIP_BOUNDS and round to 2 decimals."""
+    values = np.asarray(values, dtype=float)
+    np.clip(values, _CLIP_LOW[:, None], _CLIP_HIGH[:, None], out=values)
+    return np.round(values, 2, out=values)
+
+
+class StreamingAnomalyDetector:
+    """
+    Online anomaly detector using EWMA control limits.
+    
+    Keeps an exponentially weighted mean and variance per metric and scores
+    a reading by its largest absolute z-score against them. Scoring and
+    updating cost O(number of metrics) per reading, with no refitting, and
+    the running estimates follow slow drift in the sensors.
+    """
+    
+    def __init__(self, metrics=METRICS, alpha=0.05, threshold=3.0, warmup=10):
+        """
+        Initialize the detector.
+        
+        Args:
+            metrics (tuple): Metric names read from each reading
+            alpha (float): EWMA smoothing factor (higher adapts faster)
+            threshold (float): Z-score above which a reading is anomalous
+            warmup (int): Readings to observe before scores are reported
+        """
+        self.metrics = tuple(metrics)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.count = 0
+        self.mean = [0.0] * len(self.metrics)
+        self.var = [0.0] * len(self.metrics)
+    
+    def _update_values(self, values):
+        if self.count == 0:
+            self.mean = list(values)
+        else:
+            alpha = self.alpha
+            for i, x in enumerate(values):
+                diff = x - self.mean[i]
+                increment = alpha * diff
+                self.mean[i] += increment
+                self.var[i] = (1 - alpha) * (self.var[i] + diff * increment)
+        self.count += 1
+    
+    def _score_values(self, values):
+        if self.count < self.warmup:
+            return 0.0
+        return max(
+            abs(x - mean) / (var ** 0.5 + 1e-9)
+            for x, mean, var in zip(values, self.mean, self.var)
+        )
+    
+    def update(self, reading):
+        """
+        Fold one reading into the running estimates.
+        
+        Args:
+            reading (dict): Reading with a value for each metric
+        """
+        self._update_values([float(reading[m]) for m in self.metrics])
+    
+    def score(self, reading):
+        """
+        Score one reading against the current estimates without updating them.
+        
+        Args:
+            reading (dict): Reading with a value for each metric
+        
+        Returns:
+            float: Largest absolute z-score across metrics (0.0 during warmup)
+        """
+        return self._score_values([float(reading[m]) for m in self.metrics])
+    
+    def score_and_update(self, reading):
+        """
+        Score a reading, then learn from it.
+        
+        Returns:
+            float: Anomaly score of the reading before it was absorbed
+        """
+        values = [float(reading[m]) for m in self.metrics]
+        score = self._score_values(values)
+        self._update_values(values)
+        return score
+    
+    def partial_fit(self, data):
+        """
+        Update the running estimates with a batch of readings, in order.
+        
+        Args:
+            data (DataFrame): Readings with a column per metric
+        
+        Returns:
+            StreamingAnomalyDetector: self
+        """
+        values = data[list(self.metrics)].to_numpy(dtype=float)
+        if len(values) == 0:
+            return self
+        
+        if self.count == 0:
+            # Same recursion as _update_values, vectorized by pandas
+            ewm = data[list(self.metrics)].astype(float).ewm(alpha=self.alpha, adjust=False)
+            self.mean = ewm.mean().iloc[-1].tolist()
+            self.var = ewm.var(bias=True).iloc[-1].fillna(0.0).tolist()
+            self.count = len(values)
+        else:
+            for row in values.tolist():
+                self._update_values(row)
+        return self
+    
+    def replay_scores(self, data):
+        """
+        Score a series as if each reading had been streamed in order.
+        
+        Every reading is scored against the estimates built from this
+        detector's current state plus the readings before it in data, so a
+        trained detector carries its baseline into the series. A copy is
+        advanced; this object's own state is not modified.
+        
+        Args:
+            data (DataFrame): Readings with a column per metric
+        
+        Returns:
+            ndarray: Anomaly score per row
+        """
+        frame = data[list(self.metrics)].astype(float)
+        if self.count > 0:
+            replica = StreamingAnomalyDetector(self.metrics, self.alpha, self.threshold, self.warmup)
+            replica.count, replica.mean, replica.var = self.count, list(self.mean), list(self.var)
+            scores = []
+            for values in frame.to_numpy().tolist():
+                scores.append(replica._score_values(values))
+                replica._update_values(values)
+            return np.asarray(scores, dtype=float)
+        
+        # Empty detector: the same recursion, vectorized by pandas
+        ewm = frame.ewm(alpha=self.alpha, adjust=False)
+        prev_mean = ewm.mean().shift(1).to_numpy()
+        prev_std = np.sqrt(ewm.var(bias=True).shift(1).to_numpy())
+        
+        z = np.abs(frame.to_numpy() - prev_mean) / (prev_std + 1e-9)
+        scores = np.nan_to_num(z, nan=0.0).max(axis=1) if len(frame) else np.zeros(0)
+        scores[:self.warmup] = 0.0
+        return scores
+
+
+class RollingTrend:
+    """
+    Incremental least-squares line fit for several series at once.
+    
+    Points are placed at x = 0..n-1 within the current window. Only the
+    running sums Σy and Σxy are stored per series; Σx and Σx² follow in
+    closed form from n. Appending a point, sliding the window and reading
+    the slope, intercept or a forecast are all O(1) in the window length.
+    """
+    
+    def __init__(self, n_series=len(METRICS), window=None):
+        """
+        Initialize an empty trend.
+        
+        Args:
+            n_series (int): Number of series fitted side by side (e.g. one per metric)
+            window (int): Number of most recent points to fit (None = all points seen)
+        """
+        self.n_series = n_series
+        self.window = window
+        self.reset()
+    
+    def reset(self):
+        """Forget every point."""
+        self.n = 0       # Points in the current window
+        self.total = 0   # Points seen since the last reset
+        self.sum_y = np.zeros(self.n_series)
+        self.sum_xy = np.zeros(self.n_series)
+        self._buffer = np.zeros((self.window, self.n_series)) if self.window else None
+        self._head = 0   # Buffer slot of the oldest point
+        self._slides = 0
+    
+    def fit(self, values):
+        """
+        Reset and fit to a batch of points in one vectorized pass.
+        
+        Args:
+            values (array-like): Shape (n_points, n_series), oldest first
+        
+        Returns:
+            RollingTrend: self
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, self.n_series)
+        self.reset()
+        self.total = len(values)
+        if self.window:
+            values = values[-self.window:]
+            self._buffer[:len(values)] = values
+        self.n = len(values)
+        self.sum_y = values.sum(axis=0)
+        self.sum_xy = np.arange(self.n) @ values
+        return self
+    
+    def update(self, values):
+        """
+        Append one point per series, evicting the oldest if the window is full.
+        
+        Args:
+            values (array-like): Shape (n_series,)
+        """
+        y = np.asarray(values, dtype=float)
+        if self.window is None or self.n < self.window:
+            self.sum_xy += self.n * y
+            self.sum_y += y
+            if self._buffer is not None:
+                self._buffer[(self._head + self.n) % self.window] = y
+            self.n += 1
+        else:
+            # Dropping the oldest point shifts every remaining x down by one
+            oldest = self._buffer[self._head]
+            self.sum_xy += (self.window - 1) * y - (self.sum_y - oldest)
+            self.sum_y += y - oldest
+            self._buffer[self._head] = y
+            self._head = (self._head + 1) % self.window
+            self._slides += 1
+            if self._slides >= self.window:
+                self._resync()
+        self.total += 1
+    
+    def _resync(self):
+        # Recompute the sums exactly once per window to stop rounding drift
+        ordered = np.roll(self._buffer, -self._head, axis=0)
+        self.sum_y = ordered.sum(axis=0)
+        self.sum_xy = np.arange(self.window) @ ordered
+        self._slides = 0
+    
+    def coefficients(self):
+        """
+        Current least-squares line per series.
+        
+        Returns:
+            tuple: (slope, intercept) arrays of shape (n_series,), with x = 0
+                at the oldest point in the window
+        """
+        n = self.n
+        if n < 2:
+            return np.zeros(self.n_series), self.sum_y / max(n, 1)
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        slope = (n * self.sum_xy - sum_x * self.sum_y) / (n * sum_xx - sum_x ** 2)
+        intercept = (self.sum_y - slope * sum_x) / n
+        return slope, intercept
+    
+    def forecast(self, steps, offset=0):
+        """
+        Extrapolate each series past the newest point.
+        
+        Args:
+            steps (int): Number of future points
+            offset (int): Extra points to skip before the first forecast
+        
+        Returns:
+            ndarray: Shape (n_series, steps)
+        """
+        slope, intercept = self.coefficients()
+        x = self.n + offset + np.arange(steps)
+        return intercept[:, None] + slope[:, None] * x[None, :]
+
+
+def linear_trend_slopes(values):
+    """
+    Least-squares slope of evenly spaced points, in closed form.
+    
+    Args:
+        values (array-like): Shape (n_points,) or (n_points, n_series)
+    
+    Returns:
+        float or ndarray: Slope per series
+    """
+    values = np.asarray(values, dtype=float)
+    x = np.arange(len(values)) - (len(values) - 1) / 2
+    return (x @ (values - values.mean(axis=0))) / (x @ x)
+
+
+def _trend_label(slope):
+    if slope > 0.5:
+        return '📈 Increasing'
+    elif slope < -0.5:
+        return '📉 Decreasing'
+    else:
+        return '➡️ Stable'
+
+
+def sliding_windows(values, lookback_window):
+    """
+    Build supervised (window, next value) pairs from a multivariate series.
+    
+    Args:
+        values (ndarray): Shape (n_points, n_features), oldest first
+        lookback_window (int): Points per input window
+    
+    Returns:
+        tuple: (X, y) with X of shape (n_points - lookback_window,
+            lookback_window, n_features) and y of shape
+            (n_points - lookback_window, n_features). X is a strided view.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(values, lookback_window, axis=0)
+    return windows[:-1].transpose(0, 2, 1), values[lookback_window:]
+
+
+class LSTMForecaster:
+    """
+    Multi-step LSTM forecaster over all metrics at once.
+    
+    The network maps a normalized window of lookback_window readings to the
+    next reading; longer horizons are rolled out recursively. Inference goes
+    through a single tf.function traced once for any batch size and horizon,
+    so forecasting many devices is one batched call.
+    """
+    
+    def __init__(self, lookback_window=20, n_features=len(METRICS), units=32, weights_path=None):
+        """
+        Initialize the forecaster.
+        
+        Args:
+            lookback_window (int): Readings per input window
+            n_features (int): Metrics per reading
+            units (int): LSTM hidden units
+            weights_path (str): Where weights are saved after training and
+                loaded from on startup (None = don't persist)
+        """
+        if not TENSORFLOW_AVAILABLE:
+            raise ImportError("TensorFlow is required for the LSTM forecaster")
+        
+        self.lookback_window = lookback_window
+        self.n_features = n_features
+        self.units = units
+        self.weights_path = weights_path
+        self.mean = np.zeros(n_features, dtype=np.float32)
+        self.std = np.ones(n_features, dtype=np.float32)
+        self.network = None
+        self._rollout = None
+        self.is_fitted = False
+    
+    def _build(self):
+        """Create the Keras network and its compiled rollout function."""
+        tf = _tensorflow()
+        keras = tf.keras
+        network = keras.Sequential([
+            keras.Input(shape=(self.lookback_window, self.n_features)),
+            keras.layers.LSTM(self.units),
+            keras.layers.Dropout(0.1),
+            keras.layers.Dense(self.n_features),
+        ])
+        network.compile(optimizer='adam', loss='mse')
+        
+        @tf.function(input_signature=[
+            tf.TensorSpec(shape=(None, self.lookback_window, self.n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(), dtype=tf.int32),
+        ])
+        def rollout(windows, steps):
+            outputs = tf.TensorArray(tf.float32, size=steps)
+            for i in tf.range(steps):
+                step = network(windows, training=False)
+                outputs = outputs.write(i, step)
+                windows = tf.concat([windows[:, 1:, :], step[:, None, :]], axis=1)
+            # (steps, batch, features) -> (batch, features, steps)
+            return tf.transpose(outputs.stack(), [1, 2, 0])
+        
+        # Trace once up front so the first dashboard forecast is already warm
+        rollout(tf.zeros((1, self.lookback_window, self.n_features)), tf.constant(1))
+        return network, rollout
+    
+    def fit(self, series, epochs=5, verbose=0, batch_size=32):
+        """
+        Train on one or more series.
+        
+        Windows never cross series boundaries, so readings from several
+        devices can be trained into one shared network.
+        
+        Args:
+            series (list): Arrays of shape (n_points, n_features), oldest first
+            epochs (int): Training epochs
+            verbose (int): Keras verbosity
+            batch_size (int): Training batch size
+        
+        Returns:
+            bool: True if there was enough data to train
+        """
+        series = [np.asarray(s, dtype=np.float32) for s in series]
+        series = [s for s in series if len(s) > self.lookback_window]
+        if not series:
+            return False
+        
+        stacked = np.concatenate(series)
+        mean = stacked.mean(axis=0)
+        std = stacked.std(axis=0)
+        std[std == 0] = 1.0
+        
+        pairs = [sliding_windows((s - mean) / std, self.lookback_window) for s in series]
+        X = np.concatenate([x for x, _ in pairs])
+        y = np.concatenate([t for _, t in pairs])
+        
+        network, rollout = self._build()
+        if self.network is not None:
+            # Warm start from the previous (or loaded) weights
+            network.set_weights(self.network.get_weights())
+        network.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=verbose)
+        
+        # Swap in the trained network in one step so concurrent forecasts
+        # keep using the previous one until training has finished
+        self.network, self._rollout, self.mean, self.std = network, rollout, mean, std
+        self.is_fitted = True
+        self.save()
+        return True
+    
+    def predict(self, windows, steps_ahead=5):
+        """
+        Forecast a batch of windows.
+        
+        Args:
+            windows (ndarray): Shape (batch, lookback_window, n_features), raw values
+            steps_ahead (int): Number of future steps
+        
+        Returns:
+            ndarray: Shape (batch, n_features, steps_ahead)
+        """
+        tf = _tensorflow()
+        network, rollout, mean, std = self.network, self._rollout, self.mean, self.std
+        scaled = (np.asarray(windows, dtype=np.float32) - mean) / std
+        forecast = rollout(tf.constant(scaled), tf.constant(steps_ahead, dtype=tf.int32)).numpy()
+        return forecast * std[:, None] + mean[:, None]
+    
+    @staticmethod
+    def _stats_path(weights_path):
+        return os.path.splitext(weights_path)[0] + '.npz'
+    
+    def save(self, path=None):
+        """
+        Save weights and normalization stats.
+        
+        Args:
+            path (str): Weights file, ending in .weights.h5 (None = weights_path)
+        """
+        path = path or self.weights_path
+        if path is None or not self.is_fitted:
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.network.save_weights(path)
+        np.savez(self._stats_path(path), mean=self.mean, std=self.std)
+    
+    def load(self, path=None):
+        """
+        Load weights saved by an earlier run.
+        
+        Args:
+            path (str): Weights file (None = weights_path)
+        
+        Returns:
+            bool: True if weights were found and loaded
+        """
+        path = path or self.weights_path
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            network, rollout = self._build()
+            network.load_weights(path)
+            with np.load(self._stats_path(path)) as stats:
+                mean, std = stats['mean'], stats['std']
+        except (OSError, ValueError, KeyError) as e:
+            warnings.warn(f"Could not load LSTM weights from {path}: {e}")
+            return False
+        self.network, self._rollout, self.mean, self.std = network, rollout, mean, std
+        self.is_fitted = True
+        return True
+
+
+def _training_executor():
+    """Single background worker that runs LSTM training off the UI thread."""
+    global _TRAINING_EXECUTOR
+    if _TRAINING_EXECUTOR is None:
+        _TRAINING_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lstm-train')
+    return _TRAINING_EXECUTOR
+
+
+_TRAINING_EXECUTOR = None
 
 
 class MonitoringAIModel:
@@ -31,64 +561,333 @@ class MonitoringAIModel:
     AI model for real-time monitoring with prediction and anomaly detection.
     
     This class uses:
-    - Isolation Forest for unsupervised anomaly detection
-    - Linear Regression for trend prediction
+    - Isolation Forest (anomaly_mode='batch') or a streaming EWMA detector
+      (anomaly_mode='streaming') for unsupervised anomaly detection
+    - A closed-form rolling linear trend (trend_backend='closed_form') or
+      scikit-learn Linear Regression (trend_backend='sklearn') for prediction
+    - An optional LSTM forecaster (use_lstm=True), trained in the foreground
+      with train() or in the background with train_async()
+    
+    A model belongs to one device. When it is given data containing a
+    device_id column, only that device's rows are used.
     """
     
-    def __init__(self, contamination=0.1, lookback_window=20):
+    def __init__(self, contamination=0.1, lookback_window=20, device_id=None,
+                 anomaly_mode='batch', anomaly_threshold=3.0,
+                 trend_backend='closed_form', trend_window=None, use_lstm=False,
+                 lstm_weights_path=None):
         """
         Initialize the AI model.
         
         Args:
             contamination (float): Expected proportion of anomalies (0.0-0.5)
             lookback_window (int): Number of historical points for prediction
+            device_id (str): Device this model is trained for (None = use all rows as given)
+            anomaly_mode (str): 'batch' (Isolation Forest) or 'streaming' (EWMA, no refits)
+            anomaly_threshold (float): Z-score threshold for the streaming detector
+            trend_backend (str): 'closed_form' (incremental, O(1) updates) or 'sklearn'
+            trend_window (int): Points the closed-form trend is fitted over (None = all history)
+            use_lstm (bool): Also train an LSTM forecaster (requires TensorFlow)
+            lstm_weights_path (str): Where LSTM weights are persisted
+                (None = data/models/lstm_<device>.weights.h5)
         """
+        if anomaly_mode not in ('batch', 'streaming'):
+            raise ValueError("anomaly_mode must be 'batch' or 'streaming'")
+        if trend_backend not in ('closed_form', 'sklearn'):
+            raise ValueError("trend_backend must be 'closed_form' or 'sklearn'")
+        
         self.contamination = contamination
         self.lookback_window = lookback_window
+        self.device_id = device_id
+        self.anomaly_mode = anomaly_mode
+        self.trend_backend = trend_backend
+        self.streaming_detector = StreamingAnomalyDetector(threshold=anomaly_threshold)
+        self.trend = RollingTrend(len(METRICS), window=trend_window)
         
-        # Initialize anomaly detector
-        self.anomaly_detector = IsolationForest(
-            contamination=contamination,
-            random_state=42
-        )
+        # Isolation Forest and its scaler are created by train() in batch mode
+        self.anomaly_detector = None
+        self.scaler = None
         
-        # Initialize predictors for each metric
-        self.predictors = {
-            'temperature': LinearRegression(),
-            'humidity': LinearRegression(),
-            'pressure': LinearRegression()
-        }
+        # Initialize per-metric predictors for the scikit-learn backend
+        self.predictors = None
+        if trend_backend == 'sklearn':
+            from sklearn.linear_model import LinearRegression
+            self.predictors = {metric: LinearRegression() for metric in METRICS}
         
-        self.scaler = StandardScaler()
+        self.n_train = 0
         self.is_fitted = False
+        
+        # Optional LSTM forecaster; weights from an earlier run are reused
+        if use_lstm and not TENSORFLOW_AVAILABLE:
+            warnings.warn("TensorFlow not installed. Falling back to linear predictions.")
+            use_lstm = False
+        self.use_lstm = use_lstm
+        self.lstm = None
+        self.training_future = None
+        if use_lstm:
+            if lstm_weights_path is None:
+                lstm_weights_path = os.path.join(
+                    'data', 'models', f"lstm_{device_id or 'all'}.weights.h5"
+                )
+            self.lstm = LSTMForecaster(lookback_window, weights_path=lstm_weights_path)
+            self.lstm.load()
+    
+    @property
+    def score_key(self):
+        """str: Name this model's anomaly scores are stored under (see score_key())."""
+        return score_key(self.contamination, self.anomaly_mode)
+    
+    def get_config(self):
+        """
+        Constructor arguments that reproduce this model's setup.
+        
+        Returns:
+            dict: Keyword arguments for MonitoringAIModel()
+        """
+        return {
+            'contamination': self.contamination,
+            'lookback_window': self.lookback_window,
+            'device_id': self.device_id,
+            'anomaly_mode': self.anomaly_mode,
+            'anomaly_threshold': self.streaming_detector.threshold,
+            'trend_backend': self.trend_backend,
+            'trend_window': self.trend.window,
+            'use_lstm': self.use_lstm,
+        }
+    
+    @classmethod
+    def for_devices(cls, data, **kwargs):
+        """
+        Train one model per device found in the data.
+        
+        Args:
+            data (DataFrame): Readings with a device_id column
+            **kwargs: Constructor arguments shared by every model
+        
+        Returns:
+            dict: device_id -> trained MonitoringAIModel
+        """
+        models = {}
+        for device_id, device_data in data.groupby('device_id', sort=False):
+            model = cls(device_id=device_id, **kwargs)
+            model.train(device_data)
+            models[device_id] = model
+        return models
     
-    def train(self, data):
+    def _device_rows(self, data):
+        """Restrict data to this model's device when it carries a device_id column."""
+        if self.device_id is None or 'device_id' not in data.columns:
+            return data
+        return data[data['device_id'] == self.device_id]
+    
+    @timed('model_train_seconds', 'Model training time', call='train')
+    def train(self, data, epochs=5, verbose=0, lstm=True):
         """
         Train the model on historical data.
         
         Args:
             data (DataFrame): DataFrame with columns [temperature, humidity, pressure]
+            epochs (int): LSTM training epochs
+            verbose (int): LSTM (Keras) training verbosity
+            lstm (bool): Also train the LSTM forecaster when use_lstm is set
         """
+        data = self._device_rows(data)
         if len(data) < 2:
             raise ValueError("Need at least 2 data points to train")
         
-        # Prepare features for anomaly detection
-        features = data[['temperature', 'humidity', 'pressure']].values
-        self.scaler.fit(features)
-        scaled_features = self.scaler.transform(features)
-        
-        # Train anomaly detector
-        self.anomaly_detector.fit(scaled_features)
+        if self.anomaly_mode == 'streaming':
+            # Seed the online detector; later readings go through update()
+            self.streaming_detector = StreamingAnomalyDetector(
+                threshold=self.streaming_detector.threshold
+            ).partial_fit(data)
+        else:
+            from sklearn.ensemble import IsolationForest
+            from sklearn.preprocessing import StandardScaler
+            
+            # Prepare features for anomaly detection
+            features = data[['temperature', 'humidity', 'pressure']].values
+            self.scaler = StandardScaler().fit(features)
+            scaled_features = self.scaler.transform(features)
+            
+            # Train anomaly detector
+            self.anomaly_detector = IsolationForest(
+                contamination=self.contamination,
+                random_state=42
+            )
+            self.anomaly_detector.fit(scaled_features)
         
         # Train prediction models
-        X = np.arange(len(data)).reshape(-1, 1)
-        for column in ['temperature', 'humidity', 'pressure']:
-            y = data[column].values
-            self.predictors[column].fit(X, y)
+        self.n_train = len(data)
+        if self.trend_backend == 'sklearn':
+            X = np.arange(len(data)).reshape(-1, 1)
+            for column in METRICS:
+                y = data[column].values
+                self.predictors[column].fit(X, y)
+        else:
+            self.trend.fit(data[list(METRICS)].to_numpy())
         
         self.is_fitted = True
+        
+        if lstm and self.use_lstm:
+            self._fit_lstm(data, epochs, verbose)
         print("✓ Model trained successfully")
     
+    def train_async(self, data, epochs=5, verbose=0):
+        """
+        Train the fast models now and the LSTM in a background thread.
+        
+        Anomaly detection and linear predictions are usable as soon as this
+        returns; predictions switch to the LSTM once its training finishes.
+        
+        Args:
+            data (DataFrame): DataFrame with columns [temperature, humidity, pressure]
+            epochs (int): LSTM training epochs
+            verbose (int): LSTM (Keras) training verbosity
+        
+        Returns:
+            Future: Completes when the LSTM is trained (None if use_lstm is off)
+        """
+        self.train(data, lstm=False)
+        if not self.use_lstm:
+            return None
+        snapshot = self._device_rows(data).copy()
+        self.training_future = _training_executor().submit(self._fit_lstm, snapshot, epochs, verbose)
+        return self.training_future
+    
+    @property
+    def lstm_ready(self):
+        """Whether LSTM predictions are available."""
+        return self.lstm is not None and self.lstm.is_fitted
+    
+    @property
+    def lstm_training(self):
+        """Whether a background LSTM training run is still in progress."""
+        return self.training_future is not None and not self.training_future.done()
+    
+    @timed('model_train_seconds', 'Model training time', call='lstm')
+    def _fit_lstm(self, data, epochs, verbose):
+        """Train the LSTM on each device's series separately."""
+        if 'device_id' in data.columns:
+            series = [group[list(METRICS)].to_numpy() for _, group in data.groupby('device_id', sort=False)]
+        else:
+            series = [data[list(METRICS)].to_numpy()]
+        if not self.lstm.fit(series, epochs=epochs, verbose=verbose):
+            warnings.warn(
+                f"Need more than {self.lookback_window} readings to train the LSTM; "
+                "using linear predictions"
+            )
+    
+    def partial_fit(self, data):
+        """
+        Incrementally update the streaming anomaly detector and the
+        closed-form trend with new readings.
+        
+        Args:
+            data (DataFrame): New readings, oldest first
+        """
+        data = self._device_rows(data)
+        self.streaming_detector.partial_fit(data)
+        for values in data[list(METRICS)].to_numpy(dtype=float):
+            self.trend.update(values)
+    
+    def update(self, reading):
+        """
+        Fold a single new reading into the streaming anomaly detector and
+        the closed-form trend, in constant time.
+        
+        Args:
+            reading (dict): Reading with temperature, humidity and pressure
+        """
+        self.streaming_detector.update(reading)
+        self.trend.update([reading[m] for m in METRICS])
+    
+    def score(self, reading):
+        """
+        Anomaly score for a single reading (higher = more anomalous).
+        
+        In streaming mode this is the EWMA z-score, computed in constant
+        time without touching the detector's state.
+        
+        Args:
+            reading (dict): Reading with temperature, humidity and pressure
+        
+        Returns:
+            float: Anomaly score
+        """
+        if self.anomaly_mode == 'streaming':
+            return self.streaming_detector.score(reading)
+        
+        if not self.is_fitted:
+            return 0.0
+        features = np.array([[reading[m] for m in METRICS]], dtype=float)
+        return float(-self.anomaly_detector.score_samples(self.scaler.transform(features))[0])
+    
+    @timed('model_detect_seconds', 'Anomaly detection time', call='score_frame')
+    def score_frame(self, data):
+        """
+        Anomaly score and flag for every reading, without changing the model.
+        
+        In streaming mode each reading is scored against the trained EWMA
+        estimates updated with the readings before it in data; in batch
+        mode by the Isolation Forest (higher = more anomalous in both).
+        
+        Args:
+            data (DataFrame): Readings with timestamp and metric columns
+        
+        Returns:
+            DataFrame: timestamp (and device_id if present), score, is_anomaly
+        """
+        data = self._device_rows(data)
+        result = data[[c for c in ('timestamp', 'device_id') if c in data.columns]].copy()
+        
+        if self.anomaly_mode == 'streaming':
+            scores = self.streaming_detector.replay_scores(data)
+            flags = scores > self.streaming_detector.threshold
+        elif not self.is_fitted or len(data) == 0:
+            scores = np.zeros(len(data))
+            flags = np.zeros(len(data), dtype=bool)
+        else:
+            scaled = self.scaler.transform(data[list(METRICS)].values)
+            scores = -self.anomaly_detector.score_samples(scaled)
+            flags = self.anomaly_detector.predict(scaled) == -1
+        
+        result['score'] = scores
+        result['is_anomaly'] = flags
+        return result
+    
+    @timed('model_ingest_seconds', 'Scoring and learning time of new readings')
+    def ingest(self, data):
+        """
+        Score new readings as they arrive, then fold them into the model.
+        
+        Each reading is scored once, against the model as it was just before
+        that reading, so stored scores never need recomputing.
+        
+        Args:
+            data (DataFrame): New readings, oldest first
+        
+        Returns:
+            DataFrame: timestamp (and device_id if present), score, is_anomaly
+        """
+        data = self._device_rows(data)
+        _INGESTED.inc(len(data))
+        if self.anomaly_mode != 'streaming':
+            result = self.score_frame(data)
+            self.partial_fit(data)
+            return result
+        
+        result = data[[c for c in ('timestamp', 'device_id') if c in data.columns]].copy()
+        detector = self.streaming_detector
+        scores = []
+        for values in data[list(METRICS)].to_numpy(dtype=float).tolist():
+            scores.append(detector._score_values(values))
+            detector._update_values(values)
+            self.trend.update(values)
+        result['score'] = np.asarray(scores, dtype=float)
+        result['is_anomaly'] = result['score'] > detector.threshold
+        return result
+    
+    @timed('model_detect_seconds', 'Anomaly detection time', call='detect_anomalies')
     def detect_anomalies(self, data):
         """
         Detect anomalies in current data.
@@ -99,6 +898,10 @@ class MonitoringAIModel:
         Returns:
             list: Boolean list indicating anomalies (True = anomaly detected)
         """
+        data = self._device_rows(data)
+        if self.anomaly_mode == 'streaming':
+            return self.streaming_detector.replay_scores(data) > self.streaming_detector.threshold
+        
         if not self.is_fitted:
             return [False] * len(data)
         
@@ -109,42 +912,130 @@ class MonitoringAIModel:
         # Convert predictions: -1 (anomaly) -> True, 1 (normal) -> False
         return predictions == -1
     
-    def predict_next(self, data, steps_ahead=5):
+    def _linear_coefficients(self):
+        """Slope and intercept per metric, and the x of the next unseen point."""
+        if self.trend_backend == 'sklearn':
+            slopes = np.array([self.predictors[m].coef_[0] for m in METRICS])
+            intercepts = np.array([self.predictors[m].intercept_ for m in METRICS])
+            return slopes, intercepts, self.n_train
+        slopes, intercepts = self.trend.coefficients()
+        return slopes, intercepts, self.trend.n
+    
+    def _resolve_method(self, method):
+        if method is None:
+            return 'lstm' if self.lstm_ready else 'linear'
+        if method not in ('linear', 'lstm'):
+            raise ValueError("method must be 'linear' or 'lstm'")
+        if method == 'lstm' and not self.lstm_ready:
+            return 'linear'
+        return method
+    
+    @timed('model_predict_seconds', 'Forecast time')
+    def predict_array(self, data, steps_ahead=5, method=None):
         """
-        Predict future values for each metric.
+        Forecast every metric and horizon step as one matrix.
         
         Args:
             data (DataFrame): Historical data
             steps_ahead (int): Number of steps to predict into the future
+            method (str): 'linear' or 'lstm' (None = LSTM once trained, else
+                linear; 'lstm' falls back to linear until it is trained)
         
         Returns:
-            dict: Predictions for temperature, humidity, and pressure
+            ndarray: Shape (len(METRICS), steps_ahead), or None if the model
+                isn't fitted or there is too little data
         """
+        data = self._device_rows(data)
         if not self.is_fitted or len(data) < 2:
             return None
         
-        predictions = {}
-        n = len(data)
+        if self._resolve_method(method) == 'lstm' and len(data) >= self.lookback_window:
+            window = data[list(METRICS)].tail(self.lookback_window).to_numpy()
+            return _clip_forecast(self.lstm.predict(window[None], steps_ahead)[0])
         
-        for metric in ['temperature', 'humidity', 'pressure']:
-            # Create X values for prediction
-            X_train = np.arange(n).reshape(-1, 1)
-            X_future = np.arange(n, n + steps_ahead).reshape(-1, 1)
-            
-            # Get predictions
-            future_values = self.predictors[metric].predict(X_future)
-            
-            # Keep predictions in reasonable ranges
-            if metric == 'temperature':
-                future_values = np.clip(future_values, -10, 50)
-            elif metric == 'humidity':
-                future_values = np.clip(future_values, 0, 100)
-            else:  # pressure
-                future_values = np.clip(future_values, 950, 1050)
-            
-            predictions[metric] = [round(v, 2) for v in future_values]
+        slopes, intercepts, next_x = self._linear_coefficients()
+        if self.trend_backend == 'sklearn':
+            start = len(data)
+        else:
+            # Forecast past the end of data, skipping any readings in it that
+            # the trend hasn't been updated with yet
+            start = next_x + max(len(data) - self.trend.total, 0)
+        return forecast_linear(slopes, intercepts, start, steps_ahead)
+    
+    def predict_next(self, data, steps_ahead=5, method=None):
+        """
+        Predict future values for each metric.
+        
+        Args:
+            data (DataFrame): Historical data
+            steps_ahead (int): Number of steps to predict into the future
+            method (str): 'linear' or 'lstm', see predict_array
+        
+        Returns:
+            dict: Metric -> array of steps_ahead predictions for temperature,
+                humidity, and pressure
+        """
+        forecasts = self.predict_array(data, steps_ahead, method)
+        if forecasts is None:
+            return None
+        return dict(zip(METRICS, forecasts))
+    
+    @staticmethod
+    def predict_batch(models, steps_ahead=5):
+        """
+        Forecast many fitted models (e.g. one per device) in one array operation.
+        
+        Each model is extrapolated from just past the newest reading it has
+        been trained or updated with.
+        
+        Args:
+            models (list): Fitted MonitoringAIModel instances
+            steps_ahead (int): Number of steps to predict into the future
+        
+        Returns:
+            ndarray: Shape (len(models), len(METRICS), steps_ahead)
+        """
+        if not models:
+            return np.empty((0, len(METRICS), steps_ahead))
+        slopes, intercepts, starts = zip(*(model._linear_coefficients() for model in models))
+        return forecast_linear(np.array(slopes), np.array(intercepts), np.array(starts), steps_ahead)
+    
+    def predict_devices(self, data, steps_ahead=5, method=None):
+        """
+        Forecast every device in the data with one batched inference call.
+        
+        Intended for a model trained across devices (device_id=None): the
+        latest lookback_window readings of each device are stacked into one
+        batch for the LSTM. With the linear method each window gets its own
+        closed-form fit, also evaluated as one array operation.
+        
+        Args:
+            data (DataFrame): Readings with a device_id column, oldest first
+            steps_ahead (int): Number of steps to predict into the future
+            method (str): 'linear' or 'lstm', see predict_array
         
-        return predictions
+        Returns:
+            dict: device_id -> ndarray of shape (len(METRICS), steps_ahead),
+                for devices with at least lookback_window readings
+        """
+        windows, devices = [], []
+        for device_id, group in data.groupby('device_id', sort=False):
+            if len(group) >= self.lookback_window:
+                windows.append(group[list(METRICS)].tail(self.lookback_window).to_numpy(dtype=float))
+                devices.append(device_id)
+        if not windows:
+            return {}
+        windows = np.stack(windows)
+        
+        if self._resolve_method(method) == 'lstm':
+            forecasts = _clip_forecast(self.lstm.predict(windows, steps_ahead))
+        else:
+            # OLS over x = 0..lookback_window-1 for every (device, metric) at once
+            columns = windows.transpose(1, 0, 2).reshape(self.lookback_window, -1)
+            slopes = linear_trend_slopes(columns).reshape(len(devices), -1)
+            intercepts = windows.mean(axis=1) - slopes * (self.lookback_window - 1) / 2
+            forecasts = forecast_linear(slopes, intercepts, self.lookback_window, steps_ahead)
+        return dict(zip(devices, forecasts))
     
     def get_trend(self, data, metric='temperature'):
         """
@@ -157,18 +1048,28 @@ class MonitoringAIModel:
         Returns:
             str: 'increasing', 'decreasing', or 'stable'
         """
+        data = self._device_rows(data)
         if len(data) < 2:
             return 'stable'
         
-        recent = data[metric].tail(10).values
-        trend = np.polyfit(np.arange(len(recent)), recent, 1)[0]
+        return _trend_label(linear_trend_slopes(data[metric].tail(10).values))
+    
+    def get_trends(self, data):
+        """
+        Calculate trend direction for every metric in one pass.
         
-        if trend > 0.5:
-            return '📈 Increasing'
-        elif trend < -0.5:
-            return '📉 Decreasing'
-        else:
-            return '➡️ Stable'
+        Args:
+            data (DataFrame): Historical data
+        
+        Returns:
+            dict: Metric -> trend label, as returned by get_trend
+        """
+        data = self._device_rows(data)
+        if len(data) < 2:
+            return {metric: 'stable' for metric in METRICS}
+        
+        slopes = linear_trend_slopes(data[list(METRICS)].tail(10).to_numpy())
+        return {metric: _trend_label(slope) for metric, slope in zip(METRICS, slopes)}
 
 
 if __name__ == "__main__":
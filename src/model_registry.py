@@ -0,0 +1,337 @@
+"""
+Model Registry
+Versioned on-disk store for trained MonitoringAIModel instances.
+
+Each saved model is a version directory keyed by device and by the time
+range of the readings it was trained on:
+
+    data/models/<device>/<start_us>-<end_us>-<config hash>/
+        meta.json        configuration, training range, scalar state
+        state.npz        streaming detector and closed-form trend arrays
+        sklearn.joblib   scaler, Isolation Forest and regressors (memory-mapped on load)
+        lstm.weights.h5  LSTM weights and lstm.weights.npz stats (if trained)
+
+Loading a version takes milliseconds, so dashboard sessions and workers
+can start from a ready model instead of retraining from raw readings.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+from database import to_epoch_us, from_epoch_us
+from ml_model import MonitoringAIModel, StreamingAnomalyDetector
+
+REGISTRY_FORMAT = 1
+_ALL_DEVICES = '_all'
+
+
+def _config_hash(config):
+    """Short stable hash of a model configuration."""
+    payload = json.dumps(config, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()[:8]
+
+
+def _device_dir_name(device_id):
+    if device_id is None:
+        return _ALL_DEVICES
+    return re.sub(r'[^\w.-]', '_', str(device_id))
+
+
+class ModelRegistry:
+    """
+    Save, list and load trained models by device and training range.
+    """
+
+    def __init__(self, root="data/models"):
+        """
+        Initialize the registry.
+
+        Args:
+            root (str): Directory holding one subdirectory per device
+        """
+        self.root = root
+
+    def _device_dir(self, device_id):
+        return os.path.join(self.root, _device_dir_name(device_id))
+
+    def save(self, model, data):
+        """
+        Save a trained model as a new version.
+
+        Saving the same device, training range and configuration again
+        replaces that version atomically.
+
+        Args:
+            model (MonitoringAIModel): Trained model
+            data (DataFrame): Readings the model was trained on (with timestamp)
+
+        Returns:
+            str: Path of the version directory
+        """
+        if not model.is_fitted:
+            raise ValueError("Only trained models can be saved")
+
+        data = model._device_rows(data)
+        config = model.get_config()
+        start_us = to_epoch_us(data['timestamp'].min())
+        end_us = to_epoch_us(data['timestamp'].max())
+        version = f"{start_us}-{end_us}-{_config_hash(config)}"
+
+        device_dir = self._device_dir(model.device_id)
+        os.makedirs(device_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=device_dir)
+        try:
+            self._write_version(staging, model, config, version, start_us, end_us, len(data))
+            target = os.path.join(device_dir, version)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return target
+
+    def save_lstm(self, model, path):
+        """
+        Add a model's LSTM to a version saved before its training finished.
+
+        Only the weights are written: the rest of the version keeps the
+        state of the readings it was saved with, even if the model has
+        ingested newer readings since.
+
+        Args:
+            model (MonitoringAIModel): Model whose LSTM is trained
+            path (str): Version directory returned by save()
+        """
+        if not model.lstm_ready:
+            return
+        model.lstm.save(os.path.join(path, 'lstm.weights.h5'))
+
+        # Flip the flag only once the weights are in place
+        meta_path = os.path.join(path, 'meta.json')
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta['lstm'] = True
+        staging = meta_path + '.tmp'
+        with open(staging, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(staging, meta_path)
+
+    def _write_version(self, path, model, config, version, start_us, end_us, rows):
+        trend = model.trend
+        detector = model.streaming_detector
+
+        arrays = {
+            'trend_sum_y': trend.sum_y,
+            'trend_sum_xy': trend.sum_xy,
+            'detector_mean': np.asarray(detector.mean, dtype=float),
+            'detector_var': np.asarray(detector.var, dtype=float),
+        }
+        if trend._buffer is not None:
+            arrays['trend_buffer'] = trend._buffer
+        np.savez(os.path.join(path, 'state.npz'), **arrays)
+
+        estimators = {
+            'scaler': model.scaler,
+            'anomaly_detector': model.anomaly_detector,
+            'predictors': model.predictors,
+        }
+        has_sklearn = any(value is not None for value in estimators.values())
+        if has_sklearn:
+            import joblib
+            # Uncompressed so the tree arrays can be memory-mapped on load
+            joblib.dump(estimators, os.path.join(path, 'sklearn.joblib'))
+
+        has_lstm = model.lstm_ready
+        if has_lstm:
+            model.lstm.save(os.path.join(path, 'lstm.weights.h5'))
+
+        meta = {
+            'format': REGISTRY_FORMAT,
+            'version': version,
+            'device_id': model.device_id,
+            'config': config,
+            'start_us': start_us,
+            'end_us': end_us,
+            'start': from_epoch_us(start_us).isoformat(),
+            'end': from_epoch_us(end_us).isoformat(),
+            'rows': rows,
+            'created_at': datetime.now().isoformat(),
+            'n_train': model.n_train,
+            'trend': {
+                'n': trend.n,
+                'total': trend.total,
+                'head': trend._head,
+                'slides': trend._slides,
+            },
+            'detector': {
+                'count': detector.count,
+                'alpha': detector.alpha,
+                'warmup': detector.warmup,
+            },
+            'sklearn': has_sklearn,
+            'lstm': has_lstm,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def list_versions(self, device_id=None):
+        """
+        Metadata of every saved version for a device, oldest training range first.
+
+        Args:
+            device_id (str): Device the models were trained for (None = cross-device models)
+
+        Returns:
+            list: meta.json contents, each with an added 'path'
+        """
+        device_dir = self._device_dir(device_id)
+        if not os.path.isdir(device_dir):
+            return []
+
+        versions = []
+        for name in os.listdir(device_dir):
+            meta_path = os.path.join(device_dir, name, 'meta.json')
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                warnings.warn(f"Skipping unreadable model version {name}: {e}")
+                continue
+            if meta.get('format') != REGISTRY_FORMAT:
+                continue
+            meta['path'] = os.path.join(device_dir, name)
+            versions.append(meta)
+        return sorted(versions, key=lambda meta: (meta['end_us'], meta['start_us'], meta['created_at']))
+
+    def find(self, device_id=None, before=None, **config):
+        """
+        Newest version matching a device and configuration.
+
+        Args:
+            device_id (str): Device the model was trained for
+            before: Only consider models trained on readings up to this time
+                (datetime, ISO string or epoch microseconds)
+            **config: Constructor arguments the model must have been created with
+
+        Returns:
+            dict: Version metadata, or None if nothing matches
+        """
+        before_us = None if before is None else to_epoch_us(before)
+        for meta in reversed(self.list_versions(device_id)):
+            if before_us is not None and meta['end_us'] > before_us:
+                continue
+            if all(meta['config'].get(key) == value for key, value in config.items()):
+                return meta
+        return None
+
+    def load(self, device_id=None, version=None, mmap=True, **config):
+        """
+        Load a saved model.
+
+        Args:
+            device_id (str): Device the model was trained for
+            version (str): Version to load (None = newest matching config)
+            mmap (bool): Memory-map the scikit-learn arrays instead of reading them
+            **config: Constructor arguments the model must match (see find)
+
+        Returns:
+            MonitoringAIModel: Ready-to-use model, or None if nothing matches
+        """
+        if version is None:
+            meta = self.find(device_id, **config)
+            if meta is None:
+                return None
+        else:
+            path = os.path.join(self._device_dir(device_id), version)
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            meta['path'] = path
+        return self._read_version(meta, mmap)
+
+    def _read_version(self, meta, mmap):
+        path = meta['path']
+        model = MonitoringAIModel(**meta['config'])
+
+        with np.load(os.path.join(path, 'state.npz')) as state:
+            # Copies: the trend and detector update these in place
+            trend = model.trend
+            trend.sum_y = state['trend_sum_y'].copy()
+            trend.sum_xy = state['trend_sum_xy'].copy()
+            if 'trend_buffer' in state:
+                trend._buffer = state['trend_buffer'].copy()
+            detector = StreamingAnomalyDetector(
+                alpha=meta['detector']['alpha'],
+                threshold=meta['config']['anomaly_threshold'],
+                warmup=meta['detector']['warmup'],
+            )
+            detector.mean = state['detector_mean'].tolist()
+            detector.var = state['detector_var'].tolist()
+
+        trend.n = meta['trend']['n']
+        trend.total = meta['trend']['total']
+        trend._head = meta['trend']['head']
+        trend._slides = meta['trend']['slides']
+        detector.count = meta['detector']['count']
+        model.streaming_detector = detector
+
+        if meta['sklearn']:
+            import joblib
+            estimators = joblib.load(os.path.join(path, 'sklearn.joblib'), mmap_mode='r' if mmap else None)
+            model.scaler = estimators['scaler']
+            model.anomaly_detector = estimators['anomaly_detector']
+            model.predictors = estimators['predictors']
+
+        if meta['lstm'] and model.lstm is not None:
+            model.lstm.load(os.path.join(path, 'lstm.weights.h5'))
+
+        model.n_train = meta['n_train']
+        model.is_fitted = True
+        return model
+
+    def load_or_train(self, data, train=True, **config):
+        """
+        Load the newest matching model and catch it up, or train a new one.
+
+        A loaded model is brought up to date by folding in the readings
+        newer than its training range (streaming detector and trend), so
+        only those rows are processed. Otherwise a model is trained on the
+        data and saved as a new version.
+
+        Args:
+            data (DataFrame): Readings, oldest first, with a timestamp column
+            train (bool): Train and save a model if none is found
+            **config: Constructor arguments for MonitoringAIModel
+
+        Returns:
+            tuple: (MonitoringAIModel or None, bool loaded)
+        """
+        device_id = config.get('device_id')
+        rows = data
+        if device_id is not None and 'device_id' in data.columns:
+            rows = data[data['device_id'] == device_id]
+        before = rows['timestamp'].max() if len(rows) > 0 else None
+        meta = self.find(before=before, **config)
+        if meta is not None:
+            model = self._read_version(meta, mmap=True)
+            newer = rows[rows['timestamp'] > from_epoch_us(meta['end_us'])]
+            if len(newer) > 0:
+                model.partial_fit(newer)
+            return model, True
+
+        if not train:
+            return None, False
+        model = MonitoringAIModel(**config)
+        model.train(data)
+        self.save(model, data)
+        return model, False
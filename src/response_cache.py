@@ -0,0 +1,214 @@
+"""
+HTTP Response Cache
+TTL cache for JSON API responses, in memory and on disk.
+
+Features:
+- Keyed by endpoint and request parameters (the API key is hashed, never stored)
+- Per-call TTLs checked at read time; a server's Cache-Control max-age takes precedence
+- Conditional revalidation with ETag / Last-Modified once an entry expires
+- Request coalescing: concurrent callers of the same key share one fetch
+- Stale entries are served, with a warning, when revalidation fails
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import warnings
+from concurrent.futures import Future
+
+import requests
+
+from metrics import counter, timer
+
+# Parameters that identify the caller rather than the resource
+_SECRET_PARAMS = ('appid', 'api_key', 'key')
+
+
+def cache_key(url, params=None):
+    """
+    Stable key of a request.
+    
+    Args:
+        url (str): Endpoint URL
+        params (dict): Query parameters
+    
+    Returns:
+        str: Hex digest of the URL and the sorted parameters
+    """
+    payload = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _max_age(response):
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else None
+
+
+class ResponseCache:
+    """
+    Thread-safe cache of decoded JSON responses.
+    
+    Entries are dicts with the body, validators (etag, last_modified), the
+    fetch time and the server's max-age, if any. Memory is checked first, then the cache
+    directory, so a restarted process starts warm.
+    """
+    
+    def __init__(self, ttl_seconds=600, cache_dir="data/http_cache", max_entries=1024):
+        """
+        Initialize the cache.
+        
+        Args:
+            ttl_seconds (float): Default time-to-live of a response
+            cache_dir (str): Directory for the on-disk copy (None = memory only)
+            max_entries (int): Entries kept in memory before the oldest are dropped
+        """
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'coalesced': 0, 'stale': 0}
+        self._counters = {
+            result: counter('http_cache_requests_total', 'Cached API requests by result', result=result)
+            for result in self.stats
+        }
+        self._fetch_timer = timer('http_fetch_seconds', 'Weather API request time', client='cache')
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+    
+    def _count(self, result):
+        self.stats[result] += 1
+        self._counters[result].inc()
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None and self.cache_dir is not None:
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._store(key, entry, persist=False)
+        return entry
+    
+    def _store(self, key, entry, persist=True):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                # Dicts keep insertion order: drop the least recently stored
+                self._entries.pop(next(iter(self._entries)))
+        if persist and self.cache_dir is not None:
+            path = self._path(key)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                warnings.warn(f"Failed to write cached response: {str(e)}")
+    
+    def clear(self):
+        """Drop every cached response, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir is not None:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, name))
+    
+    def get_json(self, session, url, params=None, ttl=None, timeout=5):
+        """
+        Decoded JSON of a GET request, from the cache while it is fresh.
+        
+        Args:
+            session (requests.Session): Session used for fetches
+            url (str): Endpoint URL
+            params (dict): Query parameters (part of the key)
+            ttl (float): Maximum age of a cached response to reuse (None = cache default)
+            timeout (float): Request timeout in seconds
+        
+        Returns:
+            Decoded JSON body
+        
+        Raises:
+            requests.exceptions.RequestException: If the fetch fails and
+                nothing, not even a stale entry, is cached
+        """
+        key = cache_key(url, params)
+        entry = self._lookup(key)
+        if entry is not None and self._fresh(entry, ttl):
+            self._count('hits')
+            return entry['body']
+        
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        
+        if not leader:
+            self._count('coalesced')
+            return future.result()
+        
+        try:
+            body = self._fetch(session, url, params, key, entry, timeout)
+            future.set_result(body)
+            return body
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+    
+    def _fresh(self, entry, ttl):
+        lifetime = entry['max_age']
+        if lifetime is None:
+            lifetime = self.ttl_seconds if ttl is None else ttl
+        return time.time() - entry['fetched_at'] < lifetime
+    
+    def _fetch(self, session, url, params, key, entry, timeout):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        try:
+            with self._fetch_timer.time():
+                response = session.get(url, params=params, headers=headers, timeout=timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if entry is None:
+                raise
+            self._count('stale')
+            warnings.warn(f"Serving stale cached response after failed refresh: {str(e)}")
+            return entry['body']
+        
+        if response.status_code == 304:
+            # Unchanged: keep the body, extend its lifetime
+            self._count('revalidated')
+            entry = {**entry, 'fetched_at': time.time(), 'max_age': _max_age(response)}
+        else:
+            self._count('misses')
+            entry = {
+                'url': url,
+                'params': {k: v for k, v in (params or {}).items() if k not in _SECRET_PARAMS},
+                'body': response.json(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'max_age': _max_age(response)
+            }
+        self._store(key, entry)
+        return entry['body']
@@ -0,0 +1,182 @@
+"""
+Ring Buffer
+Fixed-capacity, columnar in-memory window of the most recent readings.
+
+Each column is a preallocated NumPy array of twice the capacity, and every
+value is written to two slots, i and i + capacity. The newest `capacity`
+values are therefore always one contiguous slice, so appends are O(1) and
+reading the window is a zero-copy view rather than a concatenation.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from database import METRIC_COLUMNS, to_epoch_us
+
+
+class RingBuffer:
+    """
+    Thread-safe sliding window of timestamped readings.
+    
+    Appending never reallocates: once the buffer is full, the oldest
+    reading is overwritten. Views returned by view() and timestamps() are
+    valid until the next append; use snapshot() or to_frame() for a copy
+    that is safe to keep while other threads keep appending.
+    """
+    
+    def __init__(self, capacity=1000, columns=METRIC_COLUMNS):
+        """
+        Initialize an empty buffer.
+        
+        Args:
+            capacity (int): Maximum number of readings kept
+            columns (tuple): Numeric columns stored alongside the timestamp
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._ts = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = {column: np.zeros(2 * capacity) for column in self.columns}
+        self._start = 0   # Slot of the oldest reading, always < capacity
+        self._size = 0
+        self.total = 0    # Readings appended since creation
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return self._size
+    
+    def _write(self, slot, ts, values):
+        # Mirror every value so the window never wraps
+        self._ts[slot] = self._ts[slot + self.capacity] = ts
+        for column, value in zip(self.columns, values):
+            self._values[column][slot] = self._values[column][slot + self.capacity] = value
+    
+    def append(self, reading):
+        """
+        Add one reading in O(1), evicting the oldest when full.
+        
+        Args:
+            reading (dict): Reading with a timestamp and a value per column
+        """
+        ts = to_epoch_us(reading['timestamp'])
+        values = [float(reading[column]) for column in self.columns]
+        with self._lock:
+            if self._size < self.capacity:
+                self._write(self._start + self._size, ts, values)
+                self._size += 1
+            else:
+                self._write(self._start, ts, values)
+                self._start = (self._start + 1) % self.capacity
+            self.total += 1
+    
+    def extend(self, data):
+        """
+        Add many readings, oldest first, with vectorized writes.
+        
+        Args:
+            data (DataFrame): Readings with a timestamp column and a column per metric
+        """
+        n = len(data)
+        if n == 0:
+            return
+        ts = pd.to_datetime(data['timestamp']).to_numpy(dtype='datetime64[us]').astype(np.int64)
+        values = {column: data[column].to_numpy(dtype=float) for column in self.columns}
+        
+        # Only the last `capacity` readings can survive
+        skip = max(n - self.capacity, 0)
+        with self._lock:
+            end = self._start + self._size + skip
+            slots = (end + np.arange(n - skip)) % self.capacity
+            self._ts[slots] = self._ts[slots + self.capacity] = ts[skip:]
+            for column in self.columns:
+                column_values = values[column][skip:]
+                self._values[column][slots] = self._values[column][slots + self.capacity] = column_values
+            
+            size = self._size + n
+            if size > self.capacity:
+                self._start = (self._start + size - self.capacity) % self.capacity
+                self._size = self.capacity
+            else:
+                self._size = size
+            self.total += n
+    
+    def clear(self):
+        """Drop every reading."""
+        with self._lock:
+            self._start = 0
+            self._size = 0
+    
+    def view(self, column):
+        """
+        Zero-copy, oldest-first view of one column.
+        
+        Args:
+            column (str): Column name
+        
+        Returns:
+            ndarray: Read-only view, valid until the next append
+        """
+        window = self._values[column][self._start:self._start + self._size]
+        window.flags.writeable = False
+        return window
+    
+    def timestamps(self):
+        """
+        Zero-copy, oldest-first view of the timestamps.
+        
+        Returns:
+            ndarray: datetime64[us] read-only view, valid until the next append
+        """
+        window = self._ts[self._start:self._start + self._size].view('datetime64[us]')
+        window.flags.writeable = False
+        return window
+    
+    def latest(self):
+        """
+        Most recent reading.
+        
+        Returns:
+            dict: Reading with timestamp and every column, or None if empty
+        """
+        with self._lock:
+            if self._size == 0:
+                return None
+            slot = self._start + self._size - 1
+            reading = {'timestamp': pd.Timestamp(self._ts[slot], unit='us')}
+            reading.update({column: float(self._values[column][slot]) for column in self.columns})
+            return reading
+    
+    def snapshot(self):
+        """
+        Consistent copy of the window, safe to use while others append.
+        
+        Returns:
+            tuple: (timestamps as datetime64[us] array, dict of column arrays)
+        """
+        with self._lock:
+            window = slice(self._start, self._start + self._size)
+            ts = self._ts[window].view('datetime64[us]').copy()
+            values = {column: self._values[column][window].copy() for column in self.columns}
+        return ts, values
+    
+    def to_frame(self, device_id=None):
+        """
+        Copy the window into a DataFrame for plotting or model input.
+        
+        Args:
+            device_id (str): Value for a device_id column (None = no column)
+        
+        Returns:
+            DataFrame: Readings oldest first, columns timestamp and the metrics
+        """
+        ts, values = self.snapshot()
+        frame = pd.DataFrame({'timestamp': pd.to_datetime(ts.view(np.int64), unit='us')})
+        if device_id is not None:
+            frame['device_id'] = device_id
+        for column in self.columns:
+            frame[column] = values[column]
+        return frame
@@ -8,7 +8,13 @@ Readings are automatically persisted to SQLite database.
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from database import DatabaseManager
+from database import DatabaseManager, DEFAULT_DEVICE, METRIC_COLUMNS, to_epoch_us
+
+# Starting point, per-step drift (standard deviation) and valid range of each metric
+INITIAL_STATE = np.array([20.0, 50.0, 1013.0])  # °C, %, hPa
+STEP_SCALE = np.array([0.5, 2.0, 0.3])
+LOWER_BOUNDS = np.array([-10.0, 0.0, 950.0])
+UPPER_BOUNDS = np.array([50.0, 100.0, 1050.0])
 
 
 class SensorSimulator:
@@ -18,21 +24,31 @@ class SensorSimulator:
     This class generates time-series data that mimics real sensor readings
     for temperature, humidity, and pressure measurements.
     Readings are automatically saved to the SQLite database.
+    
+    get_next_reading() produces one reading at a time; generate_block()
+    produces whole blocks for many devices at once for load generation.
     """
     
-    def __init__(self, random_seed=42, db_path="data/sensor_data.db"):
+    def __init__(self, random_seed=42, db_path="data/sensor_data.db", durability='immediate',
+                 device_id=DEFAULT_DEVICE):
         """
         Initialize the sensor simulator.
         
         Args:
             random_seed (int): Seed for reproducible random data
             db_path (str): Path to SQLite database
+            durability (str): Write durability passed to DatabaseManager
+                ('immediate', 'group' or 'buffered')
+            device_id (str): Device id the simulated readings are tagged with
         """
-        np.random.seed(random_seed)
+        self.rng = np.random.default_rng(random_seed)
+        self.device_id = device_id
         self.temperature = 20.0  # Celsius
         self.humidity = 50.0     # Percentage
         self.pressure = 1013.0   # hPa (hectopascals)
-        self.db = DatabaseManager(db_path=db_path)
+        self.db = DatabaseManager(db_path=db_path, durability=durability)
+        self._block_state = {}     # Device -> last [temperature, humidity, pressure] of generate_block
+        self._block_next_us = None  # Timestamp continuing the last synthetic block
     
     def get_next_reading(self, anomaly_probability=0.05, save_to_db=True):
         """
@@ -43,12 +59,13 @@ class SensorSimulator:
             save_to_db (bool): Whether to save reading to database
         
         Returns:
-            dict: Dictionary with temperature, humidity, pressure, and timestamp
+            dict: Dictionary with temperature, humidity, pressure, timestamp, device_id
+                and anomaly_label (True if an anomaly was injected into this reading)
         """
         # Small random walk to simulate natural sensor variations
-        self.temperature += np.random.normal(0, 0.5)  # Drift ±0.5°C
-        self.humidity += np.random.normal(0, 2)       # Drift ±2%
-        self.pressure += np.random.normal(0, 0.3)     # Drift ±0.3 hPa
+        self.temperature += self.rng.normal(0, 0.5)  # Drift ±0.5°C
+        self.humidity += self.rng.normal(0, 2)       # Drift ±2%
+        self.pressure += self.rng.normal(0, 0.3)     # Drift ±0.3 hPa
         
         # Keep values in realistic ranges
         self.temperature = np.clip(self.temperature, -10, 50)
@@ -56,17 +73,20 @@ class SensorSimulator:
         self.pressure = np.clip(self.pressure, 950, 1050)
         
         # Randomly introduce anomalies (sensor malfunctions, extreme conditions)
-        if np.random.random() < anomaly_probability:
-            if np.random.random() < 0.5:
-                self.temperature += np.random.uniform(5, 15)  # Spike
+        anomaly_label = bool(self.rng.random() < anomaly_probability)
+        if anomaly_label:
+            if self.rng.random() < 0.5:
+                self.temperature += self.rng.uniform(5, 15)  # Spike
             else:
-                self.humidity += np.random.uniform(20, 40)    # Spike
+                self.humidity += self.rng.uniform(20, 40)    # Spike
         
         reading = {
             'timestamp': datetime.now(),
+            'device_id': self.device_id,
             'temperature': round(self.temperature, 2),
             'humidity': round(self.humidity, 2),
-            'pressure': round(self.pressure, 2)
+            'pressure': round(self.pressure, 2),
+            'anomaly_label': anomaly_label
         }
         
         # Save to database if requested
@@ -75,15 +95,89 @@ class SensorSimulator:
                 temperature=reading['temperature'],
                 humidity=reading['humidity'],
                 pressure=reading['pressure'],
-                timestamp=reading['timestamp'].isoformat()
+                timestamp=reading['timestamp'],
+                device_id=self.device_id
             )
         
         return reading
     
+    def generate_block(self, num_readings, anomaly_probability=0.05, device_ids=None, start=None,
+                       interval_seconds=1.0, save_to_db=False, as_frame=True):
+        """
+        Generate a block of readings for one or more devices in vectorized form.
+        
+        Each device's random walk is a cumulative sum of all its steps at
+        once, clipped to the valid ranges, and continues from where the
+        device's previous block ended. Anomalies are transient spikes added
+        on top of the walk. Unlike get_next_reading, the walk is clipped
+        after summing, so it can stay pinned at a bound for a while.
+        
+        Args:
+            num_readings (int): Readings per device
+            anomaly_probability (float): Probability of an anomaly per reading
+            device_ids (list): Devices to simulate (None = this simulator's device)
+            start: Timestamp of the first reading (datetime, ISO string or
+                epoch microseconds; None = continue after the previous block,
+                or now for the first one)
+            interval_seconds (float): Spacing of the synthetic timestamps
+            save_to_db (bool): Bulk-insert the block into the database
+            as_frame (bool): Return a DataFrame instead of a dict of arrays
+        
+        Returns:
+            DataFrame or dict: Columns timestamp, device_id, temperature,
+                humidity, pressure and anomaly_label (ground truth: True where
+                a spike was injected); time-major, devices interleaved
+        """
+        device_ids = [self.device_id] if device_ids is None else list(device_ids)
+        n_devices = len(device_ids)
+        
+        # Steps, walks and clipping for every device at once: (devices, readings, metrics)
+        steps = self.rng.normal(0.0, STEP_SCALE, size=(n_devices, num_readings, 3))
+        initial = np.array([self._block_state.get(device, INITIAL_STATE) for device in device_ids])
+        walks = np.clip(initial[:, None, :] + np.cumsum(steps, axis=1), LOWER_BOUNDS, UPPER_BOUNDS)
+        for device, last in zip(device_ids, walks[:, -1, :]):
+            self._block_state[device] = last
+        
+        # Transient spikes: half in temperature (+5..15 °C), half in humidity (+20..40 %)
+        spiked = self.rng.random((n_devices, num_readings)) < anomaly_probability
+        in_humidity = self.rng.random((n_devices, num_readings)) < 0.5
+        walks[..., 0] += np.where(spiked & ~in_humidity, self.rng.uniform(5, 15, spiked.shape), 0.0)
+        walks[..., 1] += np.where(spiked & in_humidity, self.rng.uniform(20, 40, spiked.shape), 0.0)
+        values = np.round(walks, 2)
+        
+        # Deterministic timestamps: start + i * interval, shared by all devices
+        if start is not None:
+            start_us = to_epoch_us(start)
+        elif self._block_next_us is not None:
+            start_us = self._block_next_us
+        else:
+            start_us = to_epoch_us(datetime.now())
+        interval_us = int(round(interval_seconds * 1e6))
+        ts_us = start_us + np.arange(num_readings, dtype=np.int64) * interval_us
+        self._block_next_us = int(start_us + num_readings * interval_us)
+        
+        # Time-major rows: reading i of every device, then reading i + 1
+        columns = {
+            'timestamp': np.repeat(ts_us, n_devices).astype('datetime64[us]'),
+            'device_id': np.tile(np.asarray(device_ids, dtype=object), num_readings),
+        }
+        for i, metric in enumerate(METRIC_COLUMNS):
+            columns[metric] = values[:, :, i].T.reshape(-1)
+        columns['anomaly_label'] = spiked.T.reshape(-1)
+        
+        if save_to_db:
+            self.db.bulk_insert(columns)
+        
+        return pd.DataFrame(columns) if as_frame else columns
+    
     def generate_batch(self, num_readings=100, anomaly_probability=0.05, save_to_db=True):
         """
         Generate a batch of sensor readings.
         
+        The batch is generated as one vectorized block ending now, with
+        readings one microsecond apart, and continues this simulator's
+        own random walk.
+        
         Args:
             num_readings (int): Number of readings to generate
             anomaly_probability (float): Probability of anomalies
@@ -92,11 +186,17 @@ class SensorSimulator:
         Returns:
             DataFrame: Pandas DataFrame with all readings
         """
-        readings = []
-        for _ in range(num_readings):
-            readings.append(self.get_next_reading(anomaly_probability, save_to_db=save_to_db))
-        
-        return pd.DataFrame(readings)
+        self._block_state[self.device_id] = np.array([self.temperature, self.humidity, self.pressure])
+        data = self.generate_block(
+            num_readings,
+            anomaly_probability=anomaly_probability,
+            start=to_epoch_us(datetime.now()) - num_readings + 1,
+            interval_seconds=1e-6,
+            save_to_db=save_to_db
+        )
+        self.temperature, self.humidity, self.pressure = self._block_state[self.device_id]
+        data['timestamp'] = data['timestamp'].astype('datetime64[ns]')
+        return data
 
 
 if __name__ == "__main__":
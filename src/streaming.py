@@ -0,0 +1,382 @@
+"""
+Streaming Sources and Pipelines
+One interface for every reading source, and lazy stages that consume it.
+
+A source is an iterable (and async iterable) of columnar micro-batches:
+DataFrames with timestamp, device_id and one column per metric, oldest
+first. Stages are callables that take an iterator of batches and return
+another, so a pipeline only pulls a batch when the one before it has gone
+through every stage:
+
+    pipeline = Pipeline(
+        ReplaySource("day.parquet", speed=None),
+        ScoreStage(model),
+        PersistStage(db),
+        ForecastStage(model, steps_ahead=5),
+    )
+    stats = pipeline.run()
+
+Sources:
+- SimulatorSource: vectorized SensorSimulator blocks
+- WeatherSource: new observations from a WeatherAPIProvider
+- ReplaySource: CSV or Parquet files replayed as fast as possible or at N× speed
+- SQLiteTailSource: readings appended to the database after it started
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from database import DEFAULT_DEVICE, DEFAULT_MODEL, METRIC_COLUMNS, to_epoch_us
+from ring_buffer import RingBuffer
+
+BATCH_COLUMNS = ('timestamp', 'device_id', *METRIC_COLUMNS)
+
+
+class StreamSource:
+    """
+    Base class of reading sources.
+    
+    Subclasses implement __iter__ as a generator of micro-batches; iterating
+    asynchronously runs each blocking step in a worker thread.
+    """
+    
+    def __iter__(self):
+        raise NotImplementedError
+    
+    async def __aiter__(self):
+        iterator = iter(self)
+        while True:
+            batch = await asyncio.to_thread(next, iterator, None)
+            if batch is None:
+                return
+            yield batch
+
+
+class SimulatorSource(StreamSource):
+    """Blocks from SensorSimulator.generate_block, for load and regression tests."""
+    
+    def __init__(self, simulator, batch_size=1000, batches=None, device_ids=None,
+                 anomaly_probability=0.05, start=None, interval_seconds=1.0):
+        """
+        Initialize the source.
+        
+        Args:
+            simulator (SensorSimulator): Simulator to draw from
+            batch_size (int): Readings per device in each batch
+            batches (int): Number of batches (None = endless)
+            device_ids (list): Devices to simulate (None = the simulator's device)
+            anomaly_probability (float): Probability of an anomaly per reading
+            start: Timestamp of the first reading (None = now)
+            interval_seconds (float): Spacing of the synthetic timestamps
+        """
+        self.simulator = simulator
+        self.batch_size = batch_size
+        self.batches = batches
+        self.device_ids = device_ids
+        self.anomaly_probability = anomaly_probability
+        self.start = start
+        self.interval_seconds = interval_seconds
+    
+    def __iter__(self):
+        produced = 0
+        start = self.start
+        while self.batches is None or produced < self.batches:
+            yield self.simulator.generate_block(
+                self.batch_size,
+                anomaly_probability=self.anomaly_probability,
+                device_ids=self.device_ids,
+                start=start,
+                interval_seconds=self.interval_seconds
+            )
+            # Later blocks continue where the previous one ended
+            start = None
+            produced += 1
+
+
+class WeatherSource(StreamSource):
+    """One-reading batches, each a new observation from a WeatherAPIProvider."""
+    
+    def __init__(self, provider, poll_interval=600, polls=None):
+        """
+        Initialize the source.
+        
+        Args:
+            provider (WeatherAPIProvider): Provider to poll (responses are cached)
+            poll_interval (float): Seconds between polls
+            polls (int): Number of polls (None = endless)
+        """
+        self.provider = provider
+        self.poll_interval = poll_interval
+        self.polls = polls
+    
+    def __iter__(self):
+        last = None
+        done = 0
+        while self.polls is None or done < self.polls:
+            reading = self.provider.get_next_reading(save_to_db=False)
+            done += 1
+            if reading is not None and reading['timestamp'] != last:
+                last = reading['timestamp']
+                yield pd.DataFrame([{column: reading[column] for column in BATCH_COLUMNS}])
+            if self.polls is None or done < self.polls:
+                time.sleep(self.poll_interval)
+
+
+class ReplaySource(StreamSource):
+    """
+    Recorded readings from a CSV or Parquet file.
+    
+    With speed=None batches are yielded as fast as they are consumed; with
+    speed=N each batch is held back until its last reading is due at N
+    times the recorded pace, so a day replays in 24 h / N.
+    """
+    
+    def __init__(self, path, batch_size=1000, speed=None, device_id=DEFAULT_DEVICE):
+        """
+        Initialize the source.
+        
+        Args:
+            path (str): .csv or .parquet file with timestamp and metric columns
+            batch_size (int): Readings per batch
+            speed (float): Replay speed-up over the recorded pace (None = no pacing)
+            device_id (str): Device for files without a device_id column
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.speed = speed
+        self.device_id = device_id
+    
+    def _chunks(self):
+        if os.path.splitext(self.path)[1].lower() in ('.parquet', '.pq'):
+            import pyarrow.parquet as pq
+            for record_batch in pq.ParquetFile(self.path).iter_batches(batch_size=self.batch_size):
+                yield record_batch.to_pandas()
+        else:
+            yield from pd.read_csv(self.path, chunksize=self.batch_size)
+    
+    def __iter__(self):
+        first_us = None
+        started = time.monotonic()
+        for chunk in self._chunks():
+            if len(chunk) == 0:
+                continue
+            chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], format='ISO8601')
+            if 'device_id' not in chunk.columns:
+                chunk['device_id'] = self.device_id
+            batch = chunk[list(BATCH_COLUMNS)].reset_index(drop=True)
+            
+            if self.speed is not None:
+                last_us = to_epoch_us(batch['timestamp'].iloc[-1])
+                if first_us is None:
+                    first_us = to_epoch_us(batch['timestamp'].iloc[0])
+                delay = started + (last_us - first_us) / 1e6 / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield batch
+
+
+class SQLiteTailSource(StreamSource):
+    """
+    Readings inserted into the database, like `tail -f` on the readings table.
+    
+    The table is followed by row id, so readings inserted late with an
+    earlier timestamp than ones already seen are still delivered.
+    """
+    
+    def __init__(self, db, device_id=None, start=None, poll_interval=1.0, batch_size=1000, idle_polls=None):
+        """
+        Initialize the source.
+        
+        Args:
+            db (DatabaseManager): Database to follow
+            device_id (str): Device to follow (None = all devices)
+            start: Only readings from this time on, including ones already
+                stored (None = readings inserted after the first poll)
+            poll_interval (float): Seconds between polls that found nothing
+            batch_size (int): Maximum readings per batch
+            idle_polls (int): Stop after this many empty polls in a row (None = never)
+        """
+        self.db = db
+        self.device_id = device_id
+        self.start = start
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.idle_polls = idle_polls
+    
+    def __iter__(self):
+        last_id = 0 if self.start is not None else self.db.data_version()
+        
+        idle = 0
+        while self.idle_polls is None or idle < self.idle_polls:
+            rows = self.db.get_inserted_after(
+                last_id, device_id=self.device_id, start=self.start, limit=self.batch_size
+            )
+            if len(rows) == 0:
+                idle += 1
+                time.sleep(self.poll_interval)
+                continue
+            idle = 0
+            last_id = int(rows['id'].iloc[-1])
+            yield rows[list(BATCH_COLUMNS)]
+
+
+def _per_device(models):
+    """(device_id, model) pairs from one model or a dict of device_id -> model."""
+    if isinstance(models, dict):
+        return list(models.items())
+    return [(models.device_id, models)]
+
+
+class ScoreStage:
+    """
+    Adds score and is_anomaly columns, scoring each reading once as it
+    passes and then folding it into the model (MonitoringAIModel.ingest).
+    
+    A score_model column records the score key of the model that scored
+    each reading, so PersistStage stores scores per model configuration.
+    """
+    
+    def __init__(self, models):
+        """
+        Args:
+            models: MonitoringAIModel, or dict of device_id -> model
+        """
+        self.models = _per_device(models)
+    
+    def __call__(self, batches):
+        for batch in batches:
+            batch = batch.assign(score=np.nan, is_anomaly=False, score_model=None)
+            for _, model in self.models:
+                scores = model.ingest(batch[list(BATCH_COLUMNS)])
+                batch.loc[scores.index, 'score'] = scores['score'].to_numpy()
+                batch.loc[scores.index, 'is_anomaly'] = scores['is_anomaly'].to_numpy()
+                batch.loc[scores.index, 'score_model'] = model.score_key
+            yield batch
+
+
+class PersistStage:
+    """Bulk-inserts each batch and, when present, its anomaly scores."""
+    
+    def __init__(self, db, readings=True, scores=True, model=None):
+        """
+        Args:
+            db (DatabaseManager): Database to write to
+            readings (bool): Insert the readings (duplicates are skipped)
+            scores (bool): Store the scores added by ScoreStage
+            model (str): Score key to store every score under (None = the
+                scoring model's, from the score_model column, else DEFAULT_MODEL)
+        """
+        self.db = db
+        self.readings = readings
+        self.scores = scores
+        self.model = model
+    
+    def __call__(self, batches):
+        for batch in batches:
+            if self.readings:
+                self.db.bulk_insert(batch)
+            if self.scores and 'score' in batch.columns:
+                scored = batch[batch['score'].notna()]
+                if self.model is None and 'score_model' in scored.columns:
+                    groups = scored.groupby('score_model', sort=False)
+                else:
+                    groups = [(self.model or DEFAULT_MODEL, scored)]
+                for key, rows in groups:
+                    self.db.save_scores(rows[['timestamp', 'device_id', 'score', 'is_anomaly']], model=key)
+            yield batch
+
+
+class ForecastStage:
+    """
+    Forecasts after every batch from a rolling window of recent readings.
+    
+    The latest forecast of each device is kept in `forecasts` and attached
+    to the batch as batch.attrs['forecasts'] (device_id -> dict of metric
+    -> array of steps_ahead values).
+    """
+    
+    def __init__(self, models, steps_ahead=5, method=None, window=200):
+        """
+        Args:
+            models: MonitoringAIModel, or dict of device_id -> model
+            steps_ahead (int): Number of steps to predict
+            method (str): 'linear' or 'lstm', see MonitoringAIModel.predict_array
+            window (int): Recent readings kept per device
+        """
+        self.models = _per_device(models)
+        self.steps_ahead = steps_ahead
+        self.method = method
+        self.windows = {device_id: RingBuffer(window) for device_id, _ in self.models}
+        self.forecasts = {}
+    
+    def __call__(self, batches):
+        for batch in batches:
+            for device_id, model in self.models:
+                rows = batch if device_id is None else batch[batch['device_id'] == device_id]
+                if len(rows) == 0:
+                    continue
+                window = self.windows[device_id]
+                window.extend(rows)
+                forecast = model.predict_next(window.to_frame(), self.steps_ahead, self.method)
+                if forecast is not None:
+                    self.forecasts[device_id] = forecast
+            batch.attrs['forecasts'] = dict(self.forecasts)
+            yield batch
+
+
+class Pipeline:
+    """
+    A source followed by stages, evaluated lazily batch by batch.
+    
+    Iterate over the pipeline (or `async for` over it) to receive each
+    batch after the last stage, or call run() to drain it.
+    """
+    
+    def __init__(self, source, *stages):
+        """
+        Args:
+            source: StreamSource, or any iterable of batches
+            *stages: Callables taking and returning an iterator of batches
+        """
+        self.source = source
+        self.stages = stages
+    
+    def __iter__(self):
+        batches = iter(self.source)
+        for stage in self.stages:
+            batches = stage(batches)
+        return iter(batches)
+    
+    async def __aiter__(self):
+        iterator = iter(self)
+        while True:
+            batch = await asyncio.to_thread(next, iterator, None)
+            if batch is None:
+                return
+            yield batch
+    
+    def run(self, max_batches=None):
+        """
+        Pull batches through every stage.
+        
+        Args:
+            max_batches (int): Stop after this many batches (None = until the source ends)
+        
+        Returns:
+            dict: batches, readings and anomalies seen, and elapsed seconds
+        """
+        stats = {'batches': 0, 'readings': 0, 'anomalies': 0}
+        started = time.perf_counter()
+        for batch in self:
+            stats['batches'] += 1
+            stats['readings'] += len(batch)
+            if 'is_anomaly' in batch.columns:
+                stats['anomalies'] += int(batch['is_anomaly'].sum())
+            if max_batches is not None and stats['batches'] >= max_batches:
+                break
+        stats['seconds'] = time.perf_counter() - started
+        return stats
@@ -6,11 +6,74 @@ Replaces the sensor simulator for production use with actual environmental data.
 
 import requests
 import pandas as pd
+import time
 from datetime import datetime, timedelta
-import numpy as np
-from database import DatabaseManager
+from database import DatabaseManager, utc_to_local_us
+from response_cache import ResponseCache
 import warnings
 
+# Points in one 5-day forecast response (three-hourly, the API maximum)
+FORECAST_POINTS = 40
+
+
+def parse_weather_list(payload, device_id):
+    """
+    Parse the 'list' of a forecast or history response in one vectorized pass.
+    
+    Args:
+        payload (dict): Decoded JSON response with a 'list' of observations
+        device_id (str): Device id for every row
+    
+    Returns:
+        DataFrame: timestamp, device_id, temperature, humidity, pressure and
+            description columns, oldest first
+    """
+    items = pd.json_normalize(payload['list'])
+    if len(items) == 0:
+        return pd.DataFrame(columns=['timestamp', 'device_id', 'temperature', 'humidity', 'pressure', 'description'])
+    
+    # Naive local wall-clock time, like datetime.fromtimestamp, with each
+    # point's own UTC offset (forecasts can cross a DST change)
+    timestamps = pd.to_datetime(utc_to_local_us(items['dt'].to_numpy(dtype='int64') * 1_000_000), unit='us')
+    frame = pd.DataFrame({
+        'timestamp': timestamps,
+        'device_id': device_id,
+        'temperature': items['main.temp'].astype(float).round(2),
+        'humidity': items['main.humidity'].astype(float).round(2),
+        'pressure': items['main.pressure'].astype(float).round(2),
+        'description': items['weather'].str[0].str['main'] if 'weather' in items else None
+    })
+    return frame.sort_values('timestamp', ignore_index=True)
+
+
+def parse_current_weather(payload, device_id):
+    """
+    Turn a current-weather response into a reading.
+    
+    The timestamp is the observation time reported by the API (`dt`), so
+    polling an unchanged observation again is skipped as a duplicate; it
+    falls back to now when the response has none.
+    
+    Args:
+        payload (dict): Decoded JSON response
+        device_id (str): Device id for the reading
+    
+    Returns:
+        dict: Reading with timestamp, device_id, the three metrics and,
+            when the response has them, description, city and country
+    """
+    observed = payload.get('dt')
+    return {
+        'timestamp': datetime.fromtimestamp(observed) if observed is not None else datetime.now(),
+        'device_id': device_id,
+        'temperature': round(payload['main']['temp'], 2),
+        'humidity': round(payload['main']['humidity'], 2),
+        'pressure': round(payload['main']['pressure'], 2),
+        'description': payload['weather'][0]['main'] if payload.get('weather') else None,
+        'city': payload.get('name'),
+        'country': payload.get('sys', {}).get('country')
+    }
+
 
 class WeatherAPIProvider:
     """
@@ -20,7 +83,10 @@ class WeatherAPIProvider:
     enabling the monitoring system to work with actual environmental conditions.
     """
     
-    def __init__(self, api_key, city="London", db_path="data/sensor_data.db"):
+    def __init__(self, api_key, city="London", db_path="data/sensor_data.db", durability='immediate',
+                 device_id=None, base_url="https://api.openweathermap.org/data/2.5",
+                 cache_ttl_seconds=600, cache_dir="data/http_cache",
+                 history_base_url="https://history.openweathermap.org/data/2.5"):
         """
         Initialize Weather API provider.
         
@@ -28,18 +94,36 @@ class WeatherAPIProvider:
             api_key (str): OpenWeatherMap API key
             city (str): City name for weather data
             db_path (str): Path to SQLite database
+            durability (str): Write durability passed to DatabaseManager
+                ('immediate', 'group' or 'buffered')
+            device_id (str): Device id readings are stored under (defaults to the city name)
+            base_url (str): API root (e.g. a local stub server for tests)
+            cache_ttl_seconds (float): How long current-weather responses are reused
+            cache_dir (str): Directory of the on-disk response cache (None = memory only)
+            history_base_url (str): Root of the hourly history API (paid plans)
         """
         self.api_key = api_key
         self.city = city
-        self.db = DatabaseManager(db_path=db_path)
-        self.base_url = "https://api.openweathermap.org/data/2.5/weather"
-        self.forecast_url = "https://api.openweathermap.org/data/2.5/forecast"
+        self.device_id = device_id or city
+        self.db = DatabaseManager(db_path=db_path, durability=durability)
+        self.base_url = f"{base_url.rstrip('/')}/weather"
+        self.forecast_url = f"{base_url.rstrip('/')}/forecast"
+        self.history_url = f"{history_base_url.rstrip('/')}/history/city"
+        self.session = requests.Session()  # Keep-alive across calls
+        self.cache = ResponseCache(ttl_seconds=cache_ttl_seconds, cache_dir=cache_dir)
         self.last_reading_time = None
     
-    def get_current_weather(self):
+    def get_current_weather(self, max_age_seconds=None):
         """
         Fetch current weather data from API.
         
+        Responses are cached per city; the timestamp is the observation
+        time reported by the API.
+        
+        Args:
+            max_age_seconds (float): Reuse a cached response up to this age
+                (None = the provider's cache TTL)
+        
         Returns:
             dict: Current weather with temperature, humidity, pressure
         """
@@ -50,20 +134,8 @@ class WeatherAPIProvider:
                 'units': 'metric'  # Use Celsius
             }
             
-            response = requests.get(self.base_url, params=params, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            return {
-                'timestamp': datetime.now(),
-                'temperature': round(data['main']['temp'], 2),
-                'humidity': round(data['main']['humidity'], 2),
-                'pressure': round(data['main']['pressure'], 2),
-                'description': data['weather'][0]['main'],
-                'city': data['name'],
-                'country': data['sys']['country']
-            }
+            data = self.cache.get_json(self.session, self.base_url, params, ttl=max_age_seconds)
+            return parse_current_weather(data, self.device_id)
         
         except requests.exceptions.RequestException as e:
             warnings.warn(f"Failed to fetch weather data: {str(e)}")
@@ -87,25 +159,14 @@ class WeatherAPIProvider:
                 'q': self.city,
                 'appid': self.api_key,
                 'units': 'metric',
-                'cnt': min(steps_ahead, 40)  # API max is 40
+                'cnt': FORECAST_POINTS  # The full response is shared with backfill()
             }
             
-            response = requests.get(self.forecast_url, params=params, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
-            forecasts = []
-            
-            for item in data['list'][:steps_ahead]:
-                forecasts.append({
-                    'timestamp': datetime.fromtimestamp(item['dt']),
-                    'temperature': round(item['main']['temp'], 2),
-                    'humidity': round(item['main']['humidity'], 2),
-                    'pressure': round(item['main']['pressure'], 2),
-                    'description': item['weather'][0]['main']
-                })
+            # The forecast is recomputed every 3 hours upstream
+            data = self.cache.get_json(self.session, self.forecast_url, params, ttl=1800)
+            forecasts = parse_weather_list(data, self.device_id).head(steps_ahead)
             
-            return forecasts
+            return forecasts.drop(columns='device_id').to_dict('records')
         
         except requests.exceptions.RequestException as e:
             warnings.warn(f"Failed to fetch forecast data: {str(e)}")
@@ -114,102 +175,123 @@ class WeatherAPIProvider:
             warnings.warn(f"Invalid forecast response format: {str(e)}")
             return []
     
-    def get_next_reading(self, save_to_db=True, cache_minutes=10):
+    def get_next_reading(self, save_to_db=True, cache_minutes=None):
         """
-        Get next reading with caching to avoid excessive API calls.
+        Get next reading, calling the API only when the cached response expired.
+        
+        A reading is stored only when it is a new observation; while the
+        API still reports the same one, it is returned without being stored
+        again.
         
         Args:
             save_to_db (bool): Whether to save reading to database
-            cache_minutes (int): Cache results for N minutes to avoid rate limits
+            cache_minutes (int): Reuse responses up to this age (None = provider default)
         
         Returns:
-            dict: Current weather reading
+            dict: Current weather reading, or None if unavailable
         """
-        # Check if we should use cached data
-        if (self.last_reading_time is not None and
-            (datetime.now() - self.last_reading_time).total_seconds() < cache_minutes * 60):
-            # Return simulated variation on last reading to simulate real-time changes
-            last = self.get_latest_from_db()
-            if last:
-                return self._add_slight_variation(last, cache_minutes)
-        
-        reading = self.get_current_weather()
+        reading = self.get_current_weather(
+            max_age_seconds=None if cache_minutes is None else cache_minutes * 60
+        )
+        if reading is None or reading['timestamp'] == self.last_reading_time:
+            return reading
         
-        if reading and save_to_db:
+        if save_to_db:
             self.db.save_reading(
                 temperature=reading['temperature'],
                 humidity=reading['humidity'],
                 pressure=reading['pressure'],
-                timestamp=reading['timestamp'].isoformat()
+                timestamp=reading['timestamp'],
+                device_id=self.device_id
             )
-            self.last_reading_time = datetime.now()
+        self.last_reading_time = reading['timestamp']
         
         return reading
     
-    def _add_slight_variation(self, reading, cache_minutes):
+    def get_latest_from_db(self):
+        """Get latest reading for this provider's device from database."""
+        return self.db.get_latest_reading(device_id=self.device_id)
+    
+    def backfill(self, num_readings=40, source='forecast', save_to_db=True):
         """
-        Add slight realistic variation to cached reading.
+        Fetch many readings with a single request and bulk-insert them.
+        
+        Only observations are stored: forecast points lie in the future, so
+        they are returned without being saved, and so is any point the API
+        reports after now. A warning is issued when the source returns fewer
+        readings than requested.
         
         Args:
-            reading (dict): Original reading
-            cache_minutes (int): Minutes since last real API call
+            num_readings (int): Readings wanted (history is hourly, ending
+                now; the forecast holds at most FORECAST_POINTS three-hourly points)
+            source (str): 'forecast' (free tier, not stored) or 'history' (paid plans)
+            save_to_db (bool): Whether to save observed readings to the database
         
         Returns:
-            dict: Reading with slight variation
+            DataFrame: Readings oldest first (empty if the request failed)
         """
-        varied_reading = reading.copy()
+        if source == 'forecast':
+            url, ttl = self.forecast_url, 1800
+            params = {'cnt': FORECAST_POINTS}  # Same cache entry as get_forecast()
+        elif source == 'history':
+            end = int(time.time())
+            url, ttl = self.history_url, None
+            params = {'type': 'hour', 'start': end - num_readings * 3600, 'end': end, 'cnt': num_readings}
+        else:
+            raise ValueError("source must be 'forecast' or 'history'")
+        params.update({'q': self.city, 'appid': self.api_key, 'units': 'metric'})
         
-        # Add small random drift to each metric
-        varied_reading['temperature'] += np.random.normal(0, 0.1)
-        varied_reading['humidity'] += np.random.normal(0, 0.5)
-        varied_reading['pressure'] += np.random.normal(0, 0.1)
+        try:
+            data = self.cache.get_json(self.session, url, params, ttl=ttl)
+            readings = parse_weather_list(data, self.device_id)
+            # The points closest to now
+            readings = readings.head(num_readings) if source == 'forecast' else readings.tail(num_readings)
+        except requests.exceptions.RequestException as e:
+            warnings.warn(f"Failed to fetch {source} data: {str(e)}")
+            return pd.DataFrame()
+        except KeyError as e:
+            warnings.warn(f"Invalid {source} response format: {str(e)}")
+            return pd.DataFrame()
         
-        # Keep in valid ranges
-        varied_reading['temperature'] = np.clip(varied_reading['temperature'], -50, 60)
-        varied_reading['humidity'] = np.clip(varied_reading['humidity'], 0, 100)
-        varied_reading['pressure'] = np.clip(varied_reading['pressure'], 850, 1085)
+        if len(readings) < num_readings:
+            warnings.warn(f"The {source} source returned {len(readings)} of the {num_readings} readings requested")
         
-        return {
-            **varied_reading,
-            'temperature': round(varied_reading['temperature'], 2),
-            'humidity': round(varied_reading['humidity'], 2),
-            'pressure': round(varied_reading['pressure'], 2)
-        }
-    
-    def get_latest_from_db(self):
-        """Get latest reading from database."""
-        return self.db.get_latest_reading()
+        readings = readings[['timestamp', 'device_id', 'temperature', 'humidity', 'pressure']].reset_index(drop=True)
+        if save_to_db and source == 'history':
+            observed = readings[readings['timestamp'] <= datetime.now()]
+            if len(observed) > 0:
+                self.db.bulk_insert(observed)
+        return readings
     
-    def generate_batch(self, num_readings=50, save_to_db=True):
+    def generate_batch(self, num_readings=50, save_to_db=True, source='auto'):
         """
-        Generate batch of weather readings with caching.
+        Generate batch of weather readings for training with one API request.
+        
+        The default tries the hourly history first. Without it (free tier)
+        the batch is the current observation alone; later readings come
+        from polling with get_next_reading().
         
         Args:
             num_readings (int): Number of readings to generate
-            save_to_db (bool): Whether to save to database
+            save_to_db (bool): Whether to save to database (forecast points
+                are never stored)
+            source (str): 'auto', 'history' or 'forecast' (see backfill)
         
         Returns:
-            DataFrame: Historical readings
+            DataFrame: Readings oldest first (empty if nothing could be fetched)
         """
-        readings = []
+        if source != 'auto':
+            return self.backfill(num_readings, source=source, save_to_db=save_to_db)
         
-        for i in range(num_readings):
-            reading = self.get_next_reading(save_to_db=save_to_db, cache_minutes=5)
-            
-            if reading:
-                readings.append({
-                    'timestamp': reading['timestamp'],
-                    'temperature': reading['temperature'],
-                    'humidity': reading['humidity'],
-                    'pressure': reading['pressure']
-                })
-            
-            # Small delay between calls to be respectful to API
-            if i < num_readings - 1:
-                import time
-                time.sleep(0.5)
+        readings = self.backfill(num_readings, source='history', save_to_db=save_to_db)
+        if len(readings) > 0:
+            return readings
         
-        return pd.DataFrame(readings) if readings else pd.DataFrame()
+        warnings.warn("Hourly history is unavailable (paid plans only); starting from the current observation")
+        reading = self.get_next_reading(save_to_db=save_to_db)
+        if reading is None:
+            return pd.DataFrame()
+        return pd.DataFrame([reading])[['timestamp', 'device_id', 'temperature', 'humidity', 'pressure']]
     
     def get_location_info(self):
         """
@@ -225,10 +307,8 @@ class WeatherAPIProvider:
                 'units': 'metric'
             }
             
-            response = requests.get(self.base_url, params=params, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
+            # Shares the current-weather cache entry
+            data = self.cache.get_json(self.session, self.base_url, params)
             
             return {
                 'city': data['name'],
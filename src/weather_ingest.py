@@ -0,0 +1,264 @@
+"""
+Concurrent Weather Ingestion
+Polls current weather for many cities at once instead of one blocking
+request at a time.
+
+Features:
+- Thread pool of workers sharing one keep-alive HTTP session
+- Token-bucket rate limiting per provider (the free tier allows 60 calls/minute)
+- Retries with exponential backoff and full jitter on timeouts, 429 and 5xx
+- Readings stream into the database's write-behind buffer as they arrive
+- Configurable base URL, so the engine can run against a local stub server
+"""
+
+import random
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import DatabaseManager
+from metrics import counter, timer
+from weather_api import parse_current_weather
+
+OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+# Statuses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_FETCH_TIMER = timer('http_fetch_seconds', 'Weather API request time', client='ingest')
+_FETCH_COUNTERS = {
+    result: counter('weather_ingest_fetches_total', 'Weather API requests by outcome', result=result)
+    for result in ('ok', 'retried', 'failed')
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    """
+    
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize a full bucket.
+        
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum tokens held (defaults to one second's worth, at least 1)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available without waiting.
+        
+        Returns:
+            bool: True if the tokens were taken
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+    
+    def acquire(self, tokens=1):
+        """
+        Take tokens, sleeping until they are available.
+        
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class WeatherIngestor:
+    """
+    Polls many cities concurrently and stores their readings.
+    
+    Each city is stored as its own device (the city name, like
+    WeatherAPIProvider). Use as a context manager, or call close(), to
+    release the workers, the HTTP session and the database buffer.
+    """
+    
+    def __init__(self, api_key, cities, db_path="data/sensor_data.db", base_url=OPENWEATHER_BASE_URL,
+                 max_workers=8, rate_per_minute=60, max_retries=3, backoff_seconds=0.5,
+                 max_backoff_seconds=10.0, timeout=5):
+        """
+        Initialize the ingestor.
+        
+        Args:
+            api_key (str): OpenWeatherMap API key
+            cities (list): City names to poll
+            db_path (str): Path to SQLite database
+            base_url (str): API root, e.g. a local stub server for tests
+            max_workers (int): Concurrent requests
+            rate_per_minute (float): Request budget shared by all workers
+            max_retries (int): Retries per city after the first attempt
+            backoff_seconds (float): Base delay of the exponential backoff
+            max_backoff_seconds (float): Upper bound of a single backoff delay
+            timeout (float): Per-request timeout in seconds
+        """
+        self.api_key = api_key
+        self.cities = list(cities)
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_per_minute / 60.0, capacity=max(1, min(max_workers, rate_per_minute)))
+        
+        # One keep-alive connection per worker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.db = DatabaseManager(db_path=db_path, durability='buffered')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather-ingest')
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """Stop the workers, close the HTTP session and flush buffered readings."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        self.db.close()
+    
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter keeps retrying workers from hitting the API in lockstep
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+    
+    def fetch(self, city):
+        """
+        Fetch one city's current weather, retrying transient failures.
+        
+        Args:
+            city (str): City name
+        
+        Returns:
+            dict: Reading, or None if every attempt failed
+        """
+        params = {'q': city, 'appid': self.api_key, 'units': 'metric'}
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                with _FETCH_TIMER.time():
+                    response = self.session.get(f"{self.base_url}/weather", params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    reading = parse_current_weather(response.json(), device_id=city)
+                    _FETCH_COUNTERS['ok'].inc()
+                    return reading
+                error = f"HTTP {response.status_code}"
+                header = response.headers.get('Retry-After', '')
+                retry_after = float(header) if header.isdigit() else None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                _FETCH_COUNTERS['failed'].inc()
+                warnings.warn(f"Failed to fetch weather for {city}: {str(e)}")
+                return None
+            except (KeyError, ValueError) as e:
+                _FETCH_COUNTERS['failed'].inc()
+                warnings.warn(f"Invalid API response for {city}: {str(e)}")
+                return None
+            
+            if attempt < self.max_retries:
+                _FETCH_COUNTERS['retried'].inc()
+                time.sleep(self._backoff(attempt, retry_after))
+        
+        _FETCH_COUNTERS['failed'].inc()
+        warnings.warn(f"Failed to fetch weather for {city} after {self.max_retries + 1} attempts: {error}")
+        return None
+    
+    def poll(self, cities=None):
+        """
+        Fetch every city concurrently and store the readings.
+        
+        Readings are handed to the database's write buffer as each request
+        completes, and flushed once the round is done.
+        
+        Args:
+            cities (list): Cities to poll (None = all configured cities)
+        
+        Returns:
+            DataFrame: Readings fetched this round, in completion order
+        """
+        futures = [self._executor.submit(self.fetch, city) for city in (cities or self.cities)]
+        readings = []
+        for future in as_completed(futures):
+            reading = future.result()
+            if reading is None:
+                continue
+            self.db.save_reading(
+                temperature=reading['temperature'],
+                humidity=reading['humidity'],
+                pressure=reading['pressure'],
+                timestamp=reading['timestamp'],
+                device_id=reading['device_id']
+            )
+            readings.append(reading)
+        self.db.flush()
+        return pd.DataFrame(readings)
+    
+    def run(self, interval=600, rounds=None, stop_event=None):
+        """
+        Poll every `interval` seconds until stopped.
+        
+        Args:
+            interval (float): Seconds between the starts of two rounds
+            rounds (int): Number of rounds (None = until stop_event is set)
+            stop_event (threading.Event): Set to stop after the current round
+        
+        Returns:
+            int: Total readings fetched
+        """
+        stop_event = stop_event or threading.Event()
+        total = 0
+        completed = 0
+        while not stop_event.is_set() and (rounds is None or completed < rounds):
+            started = time.monotonic()
+            total += len(self.poll())
+            completed += 1
+            if rounds is None or completed < rounds:
+                stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+        return total
+
+
+if __name__ == "__main__":
+    import os
+    from weather_api import WeatherConfig
+    
+    with WeatherIngestor(os.environ['OPENWEATHER_API_KEY'], WeatherConfig.SAMPLE_CITIES) as ingestor:
+        print(ingestor.poll())
@@ -15,11 +15,15 @@ print("=" * 60)
 
 try:
     print("\n1️⃣  Testing sensor simulator...")
+    import tempfile
     from sensor_simulator import SensorSimulator
     
-    simulator = SensorSimulator()
+    # Every section writes to scratch databases, never to data/sensor_data.db
+    scratch_dir = Path(tempfile.mkdtemp())
+    simulator = SensorSimulator(db_path=str(scratch_dir / "simulator.db"))
     data = simulator.generate_batch(num_readings=20)
     print(f"   ✓ Generated {len(data)} sensor readings")
+    assert data['anomaly_label'].dtype == bool, "readings carry no ground-truth labels"
     print(f"   ✓ Sample reading:")
     print(f"      Temperature: {data['temperature'].iloc[-1]}°C")
     print(f"      Humidity: {data['humidity'].iloc[-1]}%")
@@ -33,6 +37,10 @@ try:
     print("\n2️⃣  Testing ML model...")
     from ml_model import MonitoringAIModel
     
+    heavy = [name for name in ('tensorflow', 'sklearn.ensemble') if name in sys.modules]
+    assert not heavy, f"ml_model imported {heavy} eagerly"
+    print(f"   ✓ Heavy backends load lazily")
+    
     model = MonitoringAIModel()
     model.train(data)
     print(f"   ✓ Model trained successfully")
@@ -52,6 +60,352 @@ except Exception as e:
     print(f"   ✗ Error: {e}")
     sys.exit(1)
 
+try:
+    print("\n3️⃣  Testing model registry...")
+    import numpy as np
+    from model_registry import ModelRegistry
+    
+    registry = ModelRegistry(tempfile.mkdtemp())
+    registry.save(model, data)
+    restored, loaded = registry.load_or_train(data, train=False, **model.get_config())
+    assert loaded, "saved model was not found"
+    assert np.array_equal(restored.detect_anomalies(data), model.detect_anomalies(data))
+    print(f"   ✓ Saved and reloaded model ({len(registry.list_versions())} version)")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n4️⃣  Testing live producer...")
+    import time
+    from live_feed import LiveProducer
+    
+    producer = LiveProducer(simulator, interval=0.05, anomaly_probability=0.0)
+    producer.start()
+    time.sleep(0.3)
+    producer.stop(timeout=5)
+    assert not producer.running and producer.produced > 0, "producer added no readings"
+    print(f"   ✓ Background producer added {producer.produced} readings")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n5️⃣  Testing concurrent weather ingestion...")
+    import json
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+    from weather_ingest import WeatherIngestor
+    
+    failed_once = set()
+    
+    class StubWeatherAPI(BaseHTTPRequestHandler):
+        def do_GET(self):
+            city = parse_qs(urlparse(self.path).query)['q'][0]
+            # Every city fails once with a retryable error
+            if city not in failed_once:
+                failed_once.add(city)
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = json.dumps({
+                'dt': 1700000000,
+                'main': {'temp': 21.5, 'humidity': 40, 'pressure': 1012}
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWeatherAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cities = ["London", "Paris", "Tokyo", "Sydney"]
+    try:
+        with WeatherIngestor(
+            "test-key",
+            cities,
+            db_path=str(Path(tempfile.mkdtemp()) / "ingest.db"),
+            base_url=f"http://127.0.0.1:{server.server_address[1]}",
+            rate_per_minute=6000,
+            backoff_seconds=0.01
+        ) as ingestor:
+            readings = ingestor.poll()
+            assert sorted(readings['device_id']) == sorted(cities), "not every city was ingested"
+            assert sorted(ingestor.db.get_devices()) == sorted(cities)
+    finally:
+        server.shutdown()
+    print(f"   ✓ Ingested {len(readings)} cities concurrently through retries")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n6️⃣  Testing response cache...")
+    import time
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    from response_cache import ResponseCache
+    
+    hits = []
+    
+    class StubETagAPI(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.headers.get('If-None-Match'))
+            time.sleep(0.1)  # Slow enough for concurrent callers to overlap
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = json.dumps({'dt': 1700000000, 'main': {'temp': 21.5}}).encode()
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubETagAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/weather"
+    try:
+        cache = ResponseCache(ttl_seconds=60, cache_dir=tempfile.mkdtemp())
+        with requests.Session() as session, ThreadPoolExecutor(8) as pool:
+            bodies = list(pool.map(lambda _: cache.get_json(session, url, {'q': 'London'}), range(8)))
+            assert len(hits) == 1 and all(body == bodies[0] for body in bodies), "concurrent fetches were not coalesced"
+            assert cache.get_json(session, url, {'q': 'London'}, ttl=0) == bodies[0]
+            assert hits == [None, '"v1"'], "expired entry was not revalidated"
+            restarted = ResponseCache(ttl_seconds=60, cache_dir=cache.cache_dir)
+            assert restarted.get_json(session, url, {'q': 'London'}) == bodies[0] and len(hits) == 2
+    finally:
+        server.shutdown()
+    print(f"   ✓ 8 concurrent callers shared 1 request; revalidated with ETag; reloaded from disk")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n7️⃣  Testing streaming pipeline...")
+    from datetime import timedelta
+    from database import DatabaseManager
+    from streaming import Pipeline, ReplaySource, SQLiteTailSource, ScoreStage, PersistStage, ForecastStage
+    
+    replay_dir = Path(tempfile.mkdtemp())
+    recorded = SensorSimulator(random_seed=7, db_path=str(replay_dir / "replay.db")).generate_block(500, start='2024-01-01T00:00:00')
+    recorded.to_csv(replay_dir / "replay.csv", index=False)
+    
+    replay_model = MonitoringAIModel(anomaly_mode='streaming')
+    replay_model.train(recorded.head(100))
+    spike = recorded.iloc[[100]].assign(temperature=80.0)
+    assert replay_model.detect_anomalies(spike)[0], "streaming detection ignored the trained baseline"
+    replay_db = DatabaseManager(db_path=str(replay_dir / "replay.db"))
+    forecast = ForecastStage(replay_model, steps_ahead=3)
+    stats = Pipeline(
+        ReplaySource(str(replay_dir / "replay.csv"), batch_size=100),
+        ScoreStage(replay_model),
+        PersistStage(replay_db),
+        forecast
+    ).run()
+    assert stats['readings'] == 500 and len(replay_db.get_scores(model=replay_model.score_key)) == 500
+    assert len(replay_db.get_scores()) == 0, "pipeline scores overwrote the default model's"
+    assert len(forecast.forecasts[None]['temperature']) == 3
+    
+    # A reading inserted after a newer one has been tailed is still delivered
+    newest = recorded['timestamp'].iloc[-1]
+    tail = iter(SQLiteTailSource(replay_db, poll_interval=0.01, idle_polls=200))
+    threading.Timer(0.05, replay_db.bulk_insert, [recorded.tail(1).assign(timestamp=newest + timedelta(hours=1))]).start()
+    assert len(next(tail)) == 1
+    replay_db.bulk_insert(recorded.tail(1).assign(timestamp=newest + timedelta(minutes=30)))
+    assert len(next(tail)) == 1, "late reading with an earlier timestamp was not tailed"
+    print(f"   ✓ Replayed {stats['readings']} readings in {stats['batches']} batches "
+          f"({stats['anomalies']} anomalies)")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n8️⃣  Testing metrics endpoint...")
+    import urllib.request
+    from metrics import REGISTRY, start_http_server
+    
+    # Counts below come only from this section, whatever ran before it
+    REGISTRY.reset()
+    replay_model.ingest(recorded.tail(10))
+    replay_db.bulk_insert(recorded.tail(10).assign(device_id='metrics'))
+    ingested = REGISTRY.counter('model_ingested_readings_total')
+    assert ingested.value == 10, "ingested readings were not counted"
+    REGISTRY.set_enabled(False)
+    replay_model.ingest(recorded.tail(10))
+    REGISTRY.set_enabled(True)
+    assert ingested.value == 10, "disabled metrics recorded a value"
+    
+    metrics_server = start_http_server(port=0)
+    try:
+        exposition = urllib.request.urlopen(
+            f"http://127.0.0.1:{metrics_server.server_address[1]}/metrics"
+        ).read().decode()
+    finally:
+        metrics_server.shutdown()
+    assert 'db_commit_seconds_count{path="bulk"} 1' in exposition
+    assert 'model_ingested_readings_total 10' in exposition
+    print(f"   ✓ Served {len(REGISTRY.snapshot())} metrics at /metrics; disabled metrics recorded nothing")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n9️⃣  Testing storage writes...")
+    import sqlite3
+    import tempfile
+    import threading
+    import warnings
+    import numpy as np
+    import pandas as pd
+    from database import DatabaseManager
+    
+    storage_dir = Path(tempfile.mkdtemp())
+    with DatabaseManager(db_path=str(storage_dir / "pool.db")) as pool_db:
+        other = []
+        worker = threading.Thread(target=lambda: other.append(pool_db.get_connection()))
+        worker.start()
+        worker.join()
+        assert pool_db.get_connection() is pool_db.get_connection(), "connection not reused within a thread"
+        assert other[0] is not pool_db.get_connection(), "threads share a connection"
+        assert pool_db.get_connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    
+    # Buffered readings must survive close(), even when a malformed row
+    # shares their group commit; group commits are visible at once
+    buffered_db = DatabaseManager(db_path=str(storage_dir / "buffered.db"), durability='buffered')
+    for i in range(250):
+        buffered_db.save_reading(20.0, 50.0, 1013.0, timestamp=1_700_000_000_000_000 + i)
+        if i == 100:
+            buffered_db.save_reading('n/a', 50.0, 1013.0, timestamp=1_600_000_000_000_000)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        buffered_db.close()
+    assert len(caught) == 1, "the malformed reading was not reported"
+    group_db = DatabaseManager(db_path=str(storage_dir / "buffered.db"), durability='group')
+    group_db.save_reading(21.0, 51.0, 1014.0, timestamp=1_800_000_000_000_000)
+    with sqlite3.connect(storage_dir / "buffered.db") as raw:
+        assert raw.execute('SELECT COUNT(*) FROM readings').fetchone()[0] == 251, "buffered readings were lost"
+    group_db.close()
+    
+    # Every supported input type, and duplicates skipped on re-insert
+    block = SensorSimulator(random_seed=3, db_path=str(storage_dir / "sim.db")).generate_block(
+        300, start='2024-01-01T00:00:00'
+    )
+    columns = ['timestamp', 'temperature', 'humidity', 'pressure']
+    structured = np.array(
+        list(block[columns].assign(timestamp=block['timestamp'].astype('datetime64[us]').astype(np.int64))
+             .itertuples(index=False, name=None)),
+        dtype=[('timestamp', 'i8'), ('temperature', 'f8'), ('humidity', 'f8'), ('pressure', 'f8')]
+    )
+    with DatabaseManager(db_path=str(storage_dir / "bulk.db")) as bulk_db:
+        inputs = {
+            'frame': block.iloc[:100],
+            'dict': {column: block[column].iloc[100:200].to_numpy() for column in columns},
+            'structured': structured[200:],
+        }
+        for name, data in inputs.items():
+            assert bulk_db.bulk_insert(data, chunk_size=40)['inserted'] == 100, f"{name} input not inserted"
+        assert bulk_db.bulk_insert(block) == {'inserted': 0, 'skipped': 300}, "duplicates were re-inserted"
+        assert len(bulk_db.get_readings()) == 300
+    print(f"   ✓ Per-thread WAL connections; buffered writes survived close(); "
+          f"{len(inputs)} input types bulk-loaded without duplicates")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
+try:
+    print("\n🔟 Testing schema migrations and rollups...")
+    from datetime import datetime, timedelta
+    from database import SCHEMA_VERSION
+    
+    # A database written by the original schema: ISO text timestamps, no devices
+    legacy_path = storage_dir / "legacy.db"
+    legacy_start = datetime(2024, 1, 1)
+    with sqlite3.connect(legacy_path) as legacy:
+        legacy.execute('''
+            CREATE TABLE readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL UNIQUE,
+                temperature REAL NOT NULL,
+                humidity REAL NOT NULL,
+                pressure REAL NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        legacy.execute('''
+            CREATE TABLE anomalies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reading_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                anomaly_type TEXT,
+                severity REAL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        legacy.executemany(
+            'INSERT INTO readings (timestamp, temperature, humidity, pressure) VALUES (?, ?, ?, ?)',
+            [((legacy_start + timedelta(minutes=7 * i)).isoformat(), 20 + i % 5, 50.0, 1013.0) for i in range(500)]
+        )
+        legacy.execute(
+            'INSERT INTO anomalies (reading_id, timestamp, anomaly_type, severity) VALUES (?, ?, ?, ?)',
+            (3, (legacy_start + timedelta(minutes=14)).isoformat(), 'spike', 0.9)
+        )
+    legacy.close()
+    
+    with DatabaseManager(db_path=str(legacy_path)) as migrated:
+        version = migrated.get_connection().execute('PRAGMA user_version').fetchone()[0]
+        assert version == SCHEMA_VERSION, f"migrated to version {version}"
+        assert migrated.get_devices() == ['default']
+        assert len(migrated.get_range(start=legacy_start)) == 500, "readings lost in migration"
+        assert len(migrated.get_anomalies()) == 1, "anomalies lost in migration"
+        
+        # Each model configuration keeps its own score per reading
+        flagged = migrated.get_range(start=legacy_start).head(5).assign(score=5.0, is_anomaly=True)
+        migrated.save_scores(flagged[['timestamp', 'score', 'is_anomaly']], model='streaming-0.1')
+        assert len(migrated.get_anomalies()) == 1, "another model overwrote the default scores"
+        assert len(migrated.get_anomalies(model='streaming-0.1')) == 5
+        
+        # A second device stays separate from the migrated one
+        migrated.bulk_insert(block.assign(device_id='sensor-2'))
+        assert migrated.get_devices() == ['default', 'sensor-2']
+        assert len(migrated.get_readings(device_id='sensor-2')) == len(block)
+        
+        # Rollup buckets must add up to the raw readings they summarize
+        for device in ('default', 'sensor-2'):
+            raw = migrated.get_range(device_id=device)
+            for granularity in ('1m', '1h', '1d'):
+                rollup = migrated.get_rollup(granularity, device_id=device)
+                assert rollup['count'].sum() == len(raw), f"{device} {granularity} count mismatch"
+                for metric in ('temperature', 'humidity', 'pressure'):
+                    total = (rollup[f'{metric}_mean'] * rollup['count']).sum()
+                    assert np.isclose(total, raw[metric].sum()), f"{device} {granularity} {metric} sum mismatch"
+                    assert rollup[f'{metric}_max'].max() == raw[metric].max()
+    print(f"   ✓ Migrated a legacy database to schema v{SCHEMA_VERSION}; "
+          f"rollups match raw readings for 2 devices")
+    
+except Exception as e:
+    print(f"   ✗ Error: {e}")
+    sys.exit(1)
+
 print("\n" + "=" * 60)
 print("✅ ALL TESTS PASSED!")
 print("=" * 60)